@@ -5,7 +5,7 @@ Configuration management for AILLM
 import os
 import multiprocessing
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 import yaml
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
@@ -44,6 +44,8 @@ class LLMProviderConfig(BaseModel):
     cache_enabled: bool = True
     auto_detect_models: bool = False
     recommended_models: Optional[Dict[str, list]] = None
+    # Ollama: время удержания модели в памяти - длительность ("24h") или -1 (int) - навсегда
+    keep_alive: Optional[Union[int, str]] = None
     
     # Распределённая маршрутизация (для Ollama)
     fallback_urls: List[str] = Field(default_factory=list)
@@ -8,33 +8,144 @@ ChatSummarizer - Суммирование длинных чатов для со
 - Добавление summary в system prompt
 
 Формула: summary + последние N сообщений = полный контекст
+
+Производительность: модуль упирается в I/O (вызов LLM) и работу со строками,
+а не в вычисления. Оптимизации - меньше вызовов LLM (кэши), меньше копий
+строк и конкурентность; короткие чаты отсекаются одним сравнением длины.
 """
 
+import asyncio
 import json
+import re
+import threading
 import hashlib
+from collections import OrderedDict as LRUDict
 from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 
 from .logger import get_logger
 
 logger = get_logger(__name__)
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# Быстрая (де)сериализация summaries для Redis через msgspec
+USE_MSGSPEC = MSGSPEC_AVAILABLE
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Оценка без токенизатора (см. ChatMessage.token_estimate)
+CHARS_PER_TOKEN = 4
+
+_token_encoding = None
+
+
+def _get_token_encoding():
+    """Ленивая загрузка токенизатора (None если недоступен)."""
+    global _token_encoding, TIKTOKEN_AVAILABLE
+    if _token_encoding is None and TIKTOKEN_AVAILABLE:
+        try:
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.debug(f"ChatSummarizer: tiktoken encoding unavailable: {e}")
+            TIKTOKEN_AVAILABLE = False
+    return _token_encoding
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст до max_tokens токенов."""
+    # Токен не короче байта, а символ UTF-8 - до 4 байт:
+    # такой текст заведомо помещается без токенизации
+    if len(text) <= max_tokens // 4:
+        return text
+    
+    encoding = _get_token_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+_JSON_DECODER = json.JSONDecoder()
+# JSON в markdown-блоке ```json ... ```
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.S)
+
+# Роли, которые учитываются при проверке порога суммирования
+_RELEVANT_ROLES = frozenset({"user", "assistant"})
+
+# Эвристики _create_simple_summary
+_REQUIREMENT_RE = re.compile(r"(?i)\b(сдела|созда|напиш|добав)")
+_QUESTION_RE = re.compile(r"^([^?]*\?)")
+
+
+def _parse_json(content: str) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает первый JSON-объект из ответа LLM.
+    
+    raw_decode разбирает ровно один объект начиная с первой "{"
+    и устойчив к тексту после JSON.
+    """
+    idx = content.find("{")
+    if idx < 0:
+        return None
+    
+    try:
+        parsed, _ = _JSON_DECODER.raw_decode(content, idx)
+    except json.JSONDecodeError:
+        parsed = None
+        fence = _JSON_FENCE_RE.search(content)
+        if fence:
+            try:
+                parsed = json.loads(fence.group(1))
+            except json.JSONDecodeError:
+                pass
+    
+    return parsed if isinstance(parsed, dict) else None
+
 
-@dataclass
+def _messages_fingerprint(messages: List["ChatMessage"]) -> bytes:
+    """BLAKE2b-отпечаток ролей и содержимого сообщений (ключ кэша)."""
+    h = hashlib.blake2b(digest_size=16)
+    for m in messages:
+        h.update(m.role.encode())
+        h.update(b":")
+        h.update(m.content.encode())
+        h.update(b"\0")
+    return h.digest()
+
+
+@dataclass(slots=True)
 class ChatMessage:
     """Сообщение в чате."""
     role: str  # "user", "assistant", "system"
     content: str
     timestamp: Optional[str] = None
-    metadata: Dict[str, Any] = field(default_factory=dict)
+    # None пока не задано: у большинства сообщений метаданных нет
+    metadata: Optional[Dict[str, Any]] = None
     
     def to_dict(self) -> Dict[str, Any]:
         return {
             "role": self.role,
             "content": self.content,
             "timestamp": self.timestamp,
-            "metadata": self.metadata
+            "metadata": self.metadata if self.metadata is not None else {}
         }
     
     @classmethod
@@ -43,18 +154,18 @@ class ChatMessage:
             role=data.get("role", "user"),
             content=data.get("content", ""),
             timestamp=data.get("timestamp"),
-            metadata=data.get("metadata", {})
+            metadata=data.get("metadata") or None
         )
     
     @property
     def token_estimate(self) -> int:
         """Примерная оценка токенов (1 токен ≈ 4 символа)."""
-        return len(self.content) // 4
+        return len(self.content) // CHARS_PER_TOKEN
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ConversationSummary:
-    """Суммарий разговора."""
+    """Суммарий разговора (неизменяемый: изменения - через dataclasses.replace)."""
     summary_text: str
     messages_summarized: int
     key_topics: List[str] = field(default_factory=list)
@@ -62,6 +173,8 @@ class ConversationSummary:
     user_requirements: List[str] = field(default_factory=list)
     generated_artifacts: List[str] = field(default_factory=list)  # Код, файлы
     timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    # Кэш to_system_prompt (replace() создаёт копию без кэша)
+    _rendered: Optional[str] = field(default=None, init=False, repr=False, compare=False)
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -74,8 +187,23 @@ class ConversationSummary:
             "timestamp": self.timestamp
         }
     
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationSummary":
+        return cls(
+            summary_text=data.get("summary_text", ""),
+            messages_summarized=data.get("messages_summarized", 0),
+            key_topics=list(data.get("key_topics", [])),
+            key_decisions=list(data.get("key_decisions", [])),
+            user_requirements=list(data.get("user_requirements", [])),
+            generated_artifacts=list(data.get("generated_artifacts", [])),
+            timestamp=data.get("timestamp") or datetime.now().isoformat()
+        )
+    
     def to_system_prompt(self) -> str:
         """Генерирует текст для добавления в system prompt."""
+        if self._rendered is not None:
+            return self._rendered
+        
         parts = [
             f"### КОНТЕКСТ ПРЕДЫДУЩЕГО РАЗГОВОРА ({self.messages_summarized} сообщений):\n",
             self.summary_text
@@ -99,7 +227,237 @@ class ConversationSummary:
         
         parts.append("\n### КОНЕЦ КОНТЕКСТА\n")
         
-        return "".join(parts)
+        rendered = "".join(parts)
+        object.__setattr__(self, "_rendered", rendered)
+        return rendered
+
+
+if MSGSPEC_AVAILABLE:
+    class _ConversationSummaryStruct(msgspec.Struct):
+        """msgspec-двойник ConversationSummary (только для сериализации)."""
+        summary_text: str = ""
+        messages_summarized: int = 0
+        key_topics: List[str] = []
+        key_decisions: List[str] = []
+        user_requirements: List[str] = []
+        generated_artifacts: List[str] = []
+        timestamp: Optional[str] = None
+    
+    _summary_encoder = msgspec.json.Encoder()
+    _summary_decoder = msgspec.json.Decoder(_ConversationSummaryStruct)
+
+
+def _encode_summary(summary: ConversationSummary) -> bytes:
+    """Сериализует summary в JSON."""
+    if USE_MSGSPEC:
+        return _summary_encoder.encode(_ConversationSummaryStruct(
+            summary_text=summary.summary_text,
+            messages_summarized=summary.messages_summarized,
+            key_topics=summary.key_topics,
+            key_decisions=summary.key_decisions,
+            user_requirements=summary.user_requirements,
+            generated_artifacts=summary.generated_artifacts,
+            timestamp=summary.timestamp
+        ))
+    return json.dumps(summary.to_dict()).encode()
+
+
+def _decode_summary(data) -> ConversationSummary:
+    """Десериализует summary из JSON."""
+    if USE_MSGSPEC:
+        s = _summary_decoder.decode(data)
+        return ConversationSummary(
+            summary_text=s.summary_text,
+            messages_summarized=s.messages_summarized,
+            key_topics=s.key_topics,
+            key_decisions=s.key_decisions,
+            user_requirements=s.user_requirements,
+            generated_artifacts=s.generated_artifacts,
+            timestamp=s.timestamp or datetime.now().isoformat()
+        )
+    return ConversationSummary.from_dict(json.loads(data))
+
+
+class _SummaryCache:
+    """
+    Кэш summaries по conversation_id.
+    
+    1. Memory LRU (ограниченный размер, без утечек в долгоживущем процессе)
+    2. Redis (опционально, общий для всех воркеров)
+    """
+    
+    KEY_PREFIX = "summary:"
+    # Размер пачки SCAN/DELETE при очистке Redis
+    CLEAR_BATCH_SIZE = 500
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        redis_client=None,
+        ttl: int = 86400
+    ):
+        self.max_entries = max_entries
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self._entries: LRUDict[str, ConversationSummary] = LRUDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, conversation_id: str) -> Optional[ConversationSummary]:
+        """Получает summary (memory, затем Redis)."""
+        summary = self._get_memory(conversation_id)
+        if summary is None and self.redis_client:
+            summary = self._get_redis(conversation_id)
+            if summary is not None:
+                self._set_memory(conversation_id, summary)
+        return summary
+    
+    async def aget(self, conversation_id: str) -> Optional[ConversationSummary]:
+        """get() для async кода: синхронный Redis клиент - в worker-потоке."""
+        summary = self._get_memory(conversation_id)
+        if summary is None and self.redis_client:
+            summary = await asyncio.to_thread(self._get_redis, conversation_id)
+            if summary is not None:
+                self._set_memory(conversation_id, summary)
+        return summary
+    
+    def set(self, conversation_id: str, summary: ConversationSummary):
+        """Сохраняет summary во все уровни кэша."""
+        self._set_memory(conversation_id, summary)
+        if self.redis_client:
+            self._set_redis(conversation_id, summary)
+    
+    async def aset(self, conversation_id: str, summary: ConversationSummary):
+        """set() для async кода: синхронный Redis клиент - в worker-потоке."""
+        self._set_memory(conversation_id, summary)
+        if self.redis_client:
+            await asyncio.to_thread(self._set_redis, conversation_id, summary)
+    
+    def pop(self, conversation_id: str) -> Optional[ConversationSummary]:
+        """Удаляет summary из всех уровней кэша."""
+        summary = self._entries.pop(conversation_id, None)
+        
+        if self.redis_client:
+            try:
+                self.redis_client.delete(f"{self.KEY_PREFIX}{conversation_id}")
+            except Exception as e:
+                logger.debug(f"ChatSummarizer: Failed to delete summary from Redis: {e}")
+        
+        return summary
+    
+    def clear(self):
+        """
+        Очищает кэш.
+        
+        Redis уровень общий для всех воркеров: очищаются summaries всех воркеров.
+        Ключи перебираются SCAN (не блокирует Redis, в отличие от KEYS)
+        и удаляются пачками.
+        """
+        self._entries.clear()
+        
+        if self.redis_client:
+            try:
+                batch = []
+                for key in self.redis_client.scan_iter(
+                    match=f"{self.KEY_PREFIX}*",
+                    count=self.CLEAR_BATCH_SIZE
+                ):
+                    batch.append(key)
+                    if len(batch) >= self.CLEAR_BATCH_SIZE:
+                        self.redis_client.delete(*batch)
+                        batch.clear()
+                if batch:
+                    self.redis_client.delete(*batch)
+            except Exception as e:
+                logger.debug(f"ChatSummarizer: Failed to clear Redis summaries: {e}")
+    
+    def _get_memory(self, conversation_id: str) -> Optional[ConversationSummary]:
+        """Memory LRU: попадание поднимает запись в конец."""
+        summary = self._entries.get(conversation_id)
+        if summary is not None:
+            self._entries.move_to_end(conversation_id)
+        return summary
+    
+    def _get_redis(self, conversation_id: str) -> Optional[ConversationSummary]:
+        """Читает summary из Redis (None при промахе или ошибке)."""
+        try:
+            cached = self.redis_client.get(f"{self.KEY_PREFIX}{conversation_id}")
+            if cached:
+                return _decode_summary(cached)
+        except Exception as e:
+            logger.warning(f"ChatSummarizer: Redis cache error: {e}")
+        return None
+    
+    def _set_redis(self, conversation_id: str, summary: ConversationSummary):
+        """Пишет summary в Redis с TTL."""
+        try:
+            self.redis_client.setex(
+                f"{self.KEY_PREFIX}{conversation_id}",
+                self.ttl,
+                _encode_summary(summary)
+            )
+        except Exception as e:
+            logger.warning(f"ChatSummarizer: Redis set error: {e}")
+    
+    def _set_memory(self, conversation_id: str, summary: ConversationSummary):
+        """Memory LRU: вытесняем самую старую запись при переполнении."""
+        if conversation_id not in self._entries and len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+        self._entries[conversation_id] = summary
+        self._entries.move_to_end(conversation_id)
+
+
+class _SemanticSummaryCache:
+    """
+    Семантический кэш summaries: похожие диалоги переиспользуют summary.
+    
+    Хранит нормализованные эмбеддинги диалогов; совпадение - косинусная
+    близость не ниже порога.
+    """
+    
+    def __init__(self, threshold: float = 0.93, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: List[Any] = []
+        self._summaries: List[Dict[str, Any]] = []
+    
+    def __len__(self) -> int:
+        return len(self._vectors)
+    
+    @staticmethod
+    def _normalize(embedding) -> Optional[Any]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+    
+    def lookup(self, embedding) -> Optional[Dict[str, Any]]:
+        """Возвращает summary ближайшего диалога выше порога."""
+        vector = self._normalize(embedding)
+        if vector is None or not self._vectors:
+            return None
+        
+        similarities = np.stack(self._vectors) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return self._summaries[best]
+        return None
+    
+    def add(self, embedding, summary: ConversationSummary):
+        """Добавляет summary (FIFO вытеснение при переполнении)."""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        
+        if len(self._vectors) >= self.max_entries:
+            self._vectors.pop(0)
+            self._summaries.pop(0)
+        self._vectors.append(vector)
+        self._summaries.append(summary.to_dict())
+    
+    def clear(self):
+        self._vectors.clear()
+        self._summaries.clear()
 
 
 class ChatSummarizer:
@@ -117,13 +475,30 @@ class ChatSummarizer:
     DEFAULT_THRESHOLD = 10  # Порог для начала суммирования
     DEFAULT_KEEP_RECENT = 5  # Сколько последних сообщений сохранять полностью
     DEFAULT_MAX_SUMMARY_TOKENS = 1000  # Максимальный размер summary
+    SIMPLE_SUMMARY_CACHE_SIZE = 256  # Размер кэша эвристических summaries
+    SYSTEM_PROMPT_CACHE_SIZE = 256  # Размер кэша итоговых system prompts
+    DEFAULT_CACHE_MAX_ENTRIES = 1024  # Максимум summaries в памяти
+    DEFAULT_CACHE_TTL = 86400  # TTL summaries в Redis (секунды)
+    DEFAULT_CHUNK_SIZE = 20  # Размер чанка для иерархического суммирования
+    DEFAULT_MAX_CONCURRENT_SUMMARIES = 4  # Параллельных LLM запросов (rate limits)
+    DEFAULT_SEMANTIC_THRESHOLD = 0.93  # Косинусная близость для семантического кэша
+    DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES = 512  # Максимум записей семантического кэша
+    SEMANTIC_DIALOG_MAX_CHARS = 1000  # Размер текста диалога для эмбеддинга
     
     def __init__(
         self,
         llm_manager=None,
         threshold: int = DEFAULT_THRESHOLD,
         keep_recent: int = DEFAULT_KEEP_RECENT,
-        max_summary_tokens: int = DEFAULT_MAX_SUMMARY_TOKENS
+        max_summary_tokens: int = DEFAULT_MAX_SUMMARY_TOKENS,
+        cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        redis_client=None,
+        cache_ttl: int = DEFAULT_CACHE_TTL,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_concurrent_summaries: int = DEFAULT_MAX_CONCURRENT_SUMMARIES,
+        embedder=None,
+        semantic_threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+        semantic_cache_max_entries: int = DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES
     ):
         """
         Инициализация.
@@ -133,23 +508,53 @@ class ChatSummarizer:
             threshold: Порог сообщений для суммирования
             keep_recent: Сколько последних сообщений сохранять
             max_summary_tokens: Максимальный размер summary
+            cache_max_entries: Размер LRU кэша summaries в памяти
+            redis_client: Опциональный Redis клиент для общего кэша воркеров
+            cache_ttl: TTL summaries в Redis
+            chunk_size: Размер чанка для иерархического суммирования
+            max_concurrent_summaries: Лимит параллельных запросов к LLM
+            embedder: Модель эмбеддингов с encode([text]) (например, SentenceTransformer)
+                для семантического кэша; None - кэш отключён
+            semantic_threshold: Порог косинусной близости для семантического кэша
+            semantic_cache_max_entries: Размер семантического кэша
         """
         self.llm_manager = llm_manager
         self.threshold = threshold
         self.keep_recent = keep_recent
         self.max_summary_tokens = max_summary_tokens
+        self.chunk_size = chunk_size
+        self.max_concurrent_summaries = max_concurrent_summaries
+        self._summary_semaphore = asyncio.Semaphore(max_concurrent_summaries)
         
         # Кэш summaries по conversation_id
-        self._summary_cache: Dict[str, ConversationSummary] = {}
+        self._summary_cache = _SummaryCache(
+            max_entries=cache_max_entries,
+            redis_client=redis_client,
+            ttl=cache_ttl
+        )
+        # Семантический кэш (только при наличии embedder и numpy)
+        self.embedder = embedder if NUMPY_AVAILABLE else None
+        self._semantic_cache = _SemanticSummaryCache(
+            threshold=semantic_threshold,
+            max_entries=semantic_cache_max_entries
+        )
+        # LRU кэш _create_simple_summary по отпечатку сообщений
+        self._simple_summary_cache: LRUDict[bytes, Dict[str, Any]] = LRUDict()
+        # _create_simple_summary вызывается из worker-потоков (asyncio.to_thread)
+        self._simple_summary_lock = threading.Lock()
+        # LRU кэш system prompt + summary: (id(summary), system_prompt) -> (summary, prompt)
+        self._system_prompt_cache: LRUDict[Tuple[int, str], Tuple[ConversationSummary, str]] = LRUDict()
     
     def needs_summarization(self, messages: List[ChatMessage]) -> bool:
         """Проверяет, нужно ли суммирование."""
-        # Считаем только user и assistant сообщения
-        relevant_messages = [
-            m for m in messages 
-            if m.role in ("user", "assistant")
-        ]
-        return len(relevant_messages) > self.threshold
+        # Фильтрация по ролям может только уменьшить количество
+        if len(messages) <= self.threshold:
+            return False
+        return self.needs_summarization_count(messages) > self.threshold
+    
+    def needs_summarization_count(self, messages: List[ChatMessage]) -> int:
+        """Количество user и assistant сообщений (учитываются при суммировании)."""
+        return sum(1 for m in messages if m.role in _RELEVANT_ROLES)
     
     async def summarize_if_needed(
         self,
@@ -168,12 +573,17 @@ class ChatSummarizer:
         Returns:
             (messages_to_use, summary) - сообщения для использования и summary
         """
+        # Fast-path для коротких чатов (большинство): len(messages) - верхняя
+        # граница числа user/assistant сообщений, ролевой фильтр не нужен
+        if not force and len(messages) <= self.threshold:
+            return messages, None
+        
         if not force and not self.needs_summarization(messages):
             return messages, None
         
         # Проверяем кэш
-        if conversation_id and conversation_id in self._summary_cache:
-            cached_summary = self._summary_cache[conversation_id]
+        cached_summary = await self._summary_cache.aget(conversation_id) if conversation_id else None
+        if cached_summary:
             # Проверяем актуальность
             if cached_summary.messages_summarized >= len(messages) - self.keep_recent:
                 # Кэш актуален, возвращаем последние сообщения
@@ -184,14 +594,78 @@ class ChatSummarizer:
         messages_to_summarize = messages[:-self.keep_recent]
         recent_messages = messages[-self.keep_recent:]
         
+        # Семантический кэш: похожий диалог уже суммировался
+        embedding = None
+        summary = None
+        if self.embedder is not None:
+            embedding = await self._embed_dialog(messages_to_summarize)
+            if embedding is not None:
+                cached = self._semantic_cache.lookup(embedding)
+                if cached is not None:
+                    summary = ConversationSummary.from_dict({
+                        **cached,
+                        "messages_summarized": len(messages_to_summarize)
+                    })
+        
         # Суммируем старые сообщения
-        summary = await self._create_summary(messages_to_summarize)
+        if summary is None:
+            summary = await self._hierarchical_summary(messages_to_summarize)
+            if summary and embedding is not None:
+                self._semantic_cache.add(embedding, summary)
         
         if summary and conversation_id:
-            self._summary_cache[conversation_id] = summary
+            await self._summary_cache.aset(conversation_id, summary)
         
         return recent_messages, summary
     
+    async def _embed_dialog(self, messages: List[ChatMessage]) -> Optional[Any]:
+        """Эмбеддинг начала диалога для семантического кэша."""
+        dialog_text = self._format_messages_for_summary(
+            messages,
+            max_chars=self.SEMANTIC_DIALOG_MAX_CHARS
+        )
+        try:
+            return (await asyncio.to_thread(self.embedder.encode, [dialog_text]))[0]
+        except Exception as e:
+            logger.debug(f"ChatSummarizer: Failed to embed dialog: {e}")
+            return None
+    
+    async def _hierarchical_summary(
+        self,
+        messages: List[ChatMessage],
+        chunk_size: Optional[int] = None
+    ) -> Optional[ConversationSummary]:
+        """
+        Иерархическое суммирование для очень длинных диалогов.
+        
+        Чанки суммируются параллельно (с ограничением по семафору),
+        затем summaries чанков суммируются ещё раз.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        if not self.llm_manager or len(messages) <= chunk_size * 2:
+            return await self._create_summary(messages)
+        
+        chunks = [
+            messages[i:i + chunk_size]
+            for i in range(0, len(messages), chunk_size)
+        ]
+        
+        async def summarize_chunk(chunk: List[ChatMessage]) -> Optional[ConversationSummary]:
+            async with self._summary_semaphore:
+                return await self._create_summary(chunk)
+        
+        chunk_summaries = await asyncio.gather(*(summarize_chunk(c) for c in chunks))
+        
+        synthetic = [
+            ChatMessage(role="user", content=s.summary_text)
+            for s in chunk_summaries
+            if s and s.summary_text
+        ]
+        summary = await self._create_summary(synthetic)
+        if summary:
+            summary = replace(summary, messages_summarized=len(messages))
+        return summary
+    
     async def _create_summary(
         self,
         messages: List[ChatMessage]
@@ -200,10 +674,95 @@ class ChatSummarizer:
         if not messages:
             return None
         
+        # CPU-работа (форматирование, хэширование, парсинг JSON) выполняется
+        # в потоке, чтобы не блокировать event loop при сотнях сообщений
         if not self.llm_manager:
             # Fallback: простое извлечение ключевых моментов
-            return self._create_simple_summary(messages)
+            return await asyncio.to_thread(self._create_simple_summary, messages)
+        
+        try:
+            request = await asyncio.to_thread(self._build_summary_request, messages)
+            response = await self.llm_manager.generate(
+                messages=request,
+                temperature=0.2,
+                max_tokens=self.max_summary_tokens
+            )
+            return await asyncio.to_thread(
+                self._summary_from_response, response.content, messages
+            )
+            
+        except Exception as e:
+            logger.warning(f"ChatSummarizer: Failed to create summary via LLM: {e}")
+            return await asyncio.to_thread(self._create_simple_summary, messages)
+    
+    async def summarize_many(
+        self,
+        conversations: Dict[str, List[ChatMessage]]
+    ) -> Dict[str, ConversationSummary]:
+        """
+        Пакетное суммирование нескольких разговоров (ночные rollups, миграции).
+        
+        Запросы к LLM идут параллельно (не больше max_concurrent_summaries);
+        ошибка одного запроса даёт простое summary только для его разговора.
         
+        Args:
+            conversations: conversation_id -> сообщения
+            
+        Returns:
+            conversation_id -> summary (только для разговоров, где нужно суммирование)
+        """
+        pending = {
+            conv_id: messages[:-self.keep_recent]
+            for conv_id, messages in conversations.items()
+            if self.needs_summarization(messages)
+        }
+        if not pending:
+            return {}
+        
+        conv_ids = list(pending)
+        
+        if self.llm_manager:
+            async def generate_one(messages: List[ChatMessage]) -> Any:
+                async with self._summary_semaphore:
+                    return await self.llm_manager.generate(
+                        messages=self._build_summary_request(messages),
+                        temperature=0.2,
+                        max_tokens=self.max_summary_tokens
+                    )
+            
+            responses = await asyncio.gather(
+                *(generate_one(pending[c]) for c in conv_ids),
+                return_exceptions=True
+            )
+            
+            def build_summaries() -> List[ConversationSummary]:
+                summaries = []
+                for conv_id, response in zip(conv_ids, responses):
+                    if isinstance(response, BaseException):
+                        logger.warning(f"ChatSummarizer: Failed to summarize {conv_id} via LLM: {response}")
+                        summaries.append(self._create_simple_summary(pending[conv_id]))
+                    else:
+                        summaries.append(self._summary_from_response(response.content, pending[conv_id]))
+                return summaries
+            
+            # Разбор ответов и загрузка токенизатора (tiktoken может скачивать BPE) - вне event loop
+            summaries = await asyncio.to_thread(build_summaries)
+        else:
+            async def summarize_one(messages: List[ChatMessage]) -> Optional[ConversationSummary]:
+                async with self._summary_semaphore:
+                    return await self._create_summary(messages)
+            
+            summaries = await asyncio.gather(*(summarize_one(pending[c]) for c in conv_ids))
+        
+        result = {}
+        for conv_id, summary in zip(conv_ids, summaries):
+            if summary:
+                await self._summary_cache.aset(conv_id, summary)
+                result[conv_id] = summary
+        return result
+    
+    def _build_summary_request(self, messages: List[ChatMessage]) -> List[Any]:
+        """Формирует LLM сообщения для суммирования диалога."""
         from ..llm.base import LLMMessage
         
         # Формируем текст диалога
@@ -228,58 +787,55 @@ class ChatSummarizer:
 - Включи конкретные детали (имена файлов, функций, параметры)
 - Не упускай технические решения и предпочтения пользователя
 """
-
-        try:
-            response = await self.llm_manager.generate(
-                messages=[
-                    LLMMessage(
-                        role="system",
-                        content="Ты - эксперт по анализу диалогов. Создавай точные, информативные резюме. Отвечай только в формате JSON."
-                    ),
-                    LLMMessage(role="user", content=prompt)
-                ],
-                temperature=0.2,
-                max_tokens=self.max_summary_tokens
+        
+        return [
+            LLMMessage(
+                role="system",
+                content="Ты - эксперт по анализу диалогов. Создавай точные, информативные резюме. Отвечай только в формате JSON."
+            ),
+            LLMMessage(role="user", content=prompt)
+        ]
+    
+    def _summary_from_response(
+        self,
+        content: str,
+        messages: List[ChatMessage]
+    ) -> ConversationSummary:
+        """Строит summary из ответа LLM."""
+        # Парсим JSON
+        content = content.strip()
+        # Извлекаем JSON из ответа
+        json_match = _parse_json(content)
+        
+        if json_match:
+            return ConversationSummary(
+                summary_text=json_match.get("summary", ""),
+                messages_summarized=len(messages),
+                key_topics=json_match.get("key_topics", []),
+                key_decisions=json_match.get("key_decisions", []),
+                user_requirements=json_match.get("user_requirements", []),
+                generated_artifacts=json_match.get("generated_artifacts", [])
+            )
+        else:
+            # Fallback: используем весь ответ как summary
+            return ConversationSummary(
+                summary_text=_truncate_to_tokens(content, self.max_summary_tokens),
+                messages_summarized=len(messages)
             )
-            
-            # Парсим JSON
-            content = response.content.strip()
-            # Извлекаем JSON из ответа
-            json_match = None
-            if "{" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                if end > start:
-                    try:
-                        json_match = json.loads(content[start:end])
-                    except json.JSONDecodeError:
-                        pass
-            
-            if json_match:
-                return ConversationSummary(
-                    summary_text=json_match.get("summary", ""),
-                    messages_summarized=len(messages),
-                    key_topics=json_match.get("key_topics", []),
-                    key_decisions=json_match.get("key_decisions", []),
-                    user_requirements=json_match.get("user_requirements", []),
-                    generated_artifacts=json_match.get("generated_artifacts", [])
-                )
-            else:
-                # Fallback: используем весь ответ как summary
-                return ConversationSummary(
-                    summary_text=content[:self.max_summary_tokens * 4],
-                    messages_summarized=len(messages)
-                )
-            
-        except Exception as e:
-            logger.warning(f"ChatSummarizer: Failed to create summary via LLM: {e}")
-            return self._create_simple_summary(messages)
     
     def _create_simple_summary(
         self,
         messages: List[ChatMessage]
     ) -> ConversationSummary:
         """Простое суммирование без LLM."""
+        key = _messages_fingerprint(messages)
+        with self._simple_summary_lock:
+            cached = self._simple_summary_cache.get(key)
+            if cached is not None:
+                self._simple_summary_cache.move_to_end(key)
+        if cached is not None:
+            return ConversationSummary.from_dict(cached)
+        
         # Извлекаем ключевые моменты эвристически
         user_messages = [m for m in messages if m.role == "user"]
         assistant_messages = [m for m in messages if m.role == "assistant"]
@@ -291,9 +847,10 @@ class ChatSummarizer:
         for m in user_messages[:5]:
             # Первые 50 символов
             snippet = m.content[:50].strip()
-            if "?" in snippet:
-                topics.append(snippet.split("?")[0] + "?")
-            elif any(w in snippet.lower() for w in ["сделай", "создай", "напиши", "добавь"]):
+            question = _QUESTION_RE.match(snippet)
+            if question:
+                topics.append(question.group(1))
+            elif _REQUIREMENT_RE.search(snippet):
                 requirements.append(snippet)
         
         # Проверяем на наличие кода в ответах
@@ -311,13 +868,20 @@ class ChatSummarizer:
         if artifacts:
             summary_parts.append(f"Создано: {', '.join(artifacts)}")
         
-        return ConversationSummary(
+        summary = ConversationSummary(
             summary_text=" ".join(summary_parts) or "Диалог из нескольких сообщений.",
             messages_summarized=len(messages),
             key_topics=topics[:5],
             user_requirements=requirements[:5],
             generated_artifacts=artifacts
         )
+        
+        with self._simple_summary_lock:
+            if len(self._simple_summary_cache) >= self.SIMPLE_SUMMARY_CACHE_SIZE:
+                self._simple_summary_cache.popitem(last=False)
+            self._simple_summary_cache[key] = summary.to_dict()
+        
+        return summary
     
     def _format_messages_for_summary(
         self,
@@ -365,7 +929,7 @@ class ChatSummarizer:
             Список сообщений с обновлённым system prompt
         """
         if summary:
-            enhanced_system = system_prompt + "\n\n" + summary.to_system_prompt()
+            enhanced_system = self._get_enhanced_system_prompt(summary, system_prompt)
         else:
             enhanced_system = system_prompt
         
@@ -374,12 +938,37 @@ class ChatSummarizer:
         
         return result
     
+    def _get_enhanced_system_prompt(
+        self,
+        summary: ConversationSummary,
+        system_prompt: str
+    ) -> str:
+        """System prompt с summary (кэшируется между ходами одного разговора)."""
+        key = (id(summary), system_prompt)
+        cached = self._system_prompt_cache.get(key)
+        # Храним ссылку на summary: id не может быть переиспользован, пока запись жива
+        if cached is not None and cached[0] is summary:
+            self._system_prompt_cache.move_to_end(key)
+            return cached[1]
+        
+        enhanced_system = system_prompt + "\n\n" + summary.to_system_prompt()
+        
+        if len(self._system_prompt_cache) >= self.SYSTEM_PROMPT_CACHE_SIZE:
+            self._system_prompt_cache.popitem(last=False)
+        self._system_prompt_cache[key] = (summary, enhanced_system)
+        
+        return enhanced_system
+    
     def clear_cache(self, conversation_id: Optional[str] = None):
         """Очищает кэш summaries."""
         if conversation_id:
-            self._summary_cache.pop(conversation_id, None)
+            self._summary_cache.pop(conversation_id)
         else:
             self._summary_cache.clear()
+            with self._simple_summary_lock:
+                self._simple_summary_cache.clear()
+            self._system_prompt_cache.clear()
+            self._semantic_cache.clear()
     
     def get_cached_summary(
         self,
@@ -11,15 +11,22 @@ CodeTester - Запуск и тестирование сгенерированн
 Замыкает цикл: код → валидация → тест → исправление → готово
 """
 
+import ast
 import asyncio
-import subprocess
+import contextlib
 import tempfile
 import os
+import signal
 import sys
 import json
 import re
+import hashlib
+import functools
+import importlib.util
+import xml.etree.ElementTree as ET
+from collections import OrderedDict as LRUDict
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 from enum import Enum
 
@@ -27,6 +34,81 @@ from .logger import get_logger
 
 logger = get_logger(__name__)
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+# Паттерны разбора вывода pytest/unittest и ответов LLM
+# Формат: test_file.py::test_name PASSED/FAILED
+_PYTEST_LINE_RE = re.compile(r"::(\w+)\s+(PASSED|FAILED|ERROR|SKIPPED)")
+# Формат: 1 failed, 3 passed in 0.12s (порядок счётчиков произвольный)
+_PYTEST_SUMMARY_RE = re.compile(r"(\d+) (passed|failed)\b", re.IGNORECASE)
+# Формат: Ran X tests in Y.YYs
+_UNITTEST_RAN_RE = re.compile(r"Ran (\d+) tests?")
+_UNITTEST_FAIL_RE = re.compile(r"failures?=(\d+)")
+_MD_PREFIX_RE = re.compile(r"^```(?:python)?\n?")
+_MD_SUFFIX_RE = re.compile(r"\n?```$")
+_PY_BLOCK_RE = re.compile(r"```python\n(.*?)```", re.DOTALL)
+_NUMBER_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+# Лимит длины строки при построчном чтении stdout подпроцесса
+_STREAM_LINE_LIMIT = 1024 * 1024
+
+# Сколько байт stderr декодировать: потребители берут лишь первые сотни
+# символов, а для traceback важен конец - хвост сохраняется, остальное отбрасывается
+_MAX_STDERR_BYTES = 64 * 1024
+
+
+def _decode_stderr(data: bytes) -> str:
+    """Декодирует только хвост stderr, не копируя мегабайты в str."""
+    if len(data) > _MAX_STDERR_BYTES:
+        data = data[-_MAX_STDERR_BYTES:]
+    return data.decode("utf-8", errors="replace")
+
+
+def _apply_limits(limits: List[Tuple[int, int]]) -> None:
+    """Устанавливает rlimit'ы текущему процессу (preexec_fn)."""
+    for res, value in limits:
+        resource.setrlimit(res, (value, value))
+
+
+def _limits_preexec(limits: List[Tuple[int, int]]):
+    """
+    preexec_fn для платформ без prlimit.
+    
+    preexec_fn отключает posix_spawn, поэтому на Linux лимиты
+    ставятся через prlimit сразу после запуска (_limit_process).
+    """
+    if limits and not hasattr(resource, "prlimit"):
+        return functools.partial(_apply_limits, limits)
+    return None
+
+
+def _limit_process(pid: int, limits: List[Tuple[int, int]]) -> None:
+    """Применяет rlimit'ы к уже запущенному процессу (Linux)."""
+    if not limits or not hasattr(resource, "prlimit"):
+        return
+    try:
+        for res, value in limits:
+            resource.prlimit(pid, res, (value, value))
+    except ProcessLookupError:
+        pass
+
+
+# Абсолютный путь интерпретатора (без разрешения симлинков - venv остаётся).
+# Выполнение кода (-I, код из stdin) идёт с close_fds=False и без cwd/preexec -
+# через posix_spawn вместо fork+exec. pytest запускается в каталоге тестов
+# и с close_fds=True: с -m pytest рабочий каталог попадает в sys.path
+_PYTHON = os.path.abspath(sys.executable)
+
 
 class TestStatus(Enum):
     """Статус выполнения теста."""
@@ -37,6 +119,21 @@ class TestStatus(Enum):
     SKIPPED = "skipped"
 
 
+_PYTEST_STATUS_MAP = {
+    "PASSED": TestStatus.PASSED,
+    "FAILED": TestStatus.FAILED,
+    "ERROR": TestStatus.ERROR,
+    "SKIPPED": TestStatus.SKIPPED
+}
+
+# Дочерние элементы <testcase> в JUnit XML (отсутствие - тест прошёл)
+_JUNIT_STATUS_MAP = {
+    "failure": TestStatus.FAILED,
+    "error": TestStatus.ERROR,
+    "skipped": TestStatus.SKIPPED
+}
+
+
 @dataclass
 class TestCase:
     """Отдельный тест-кейс."""
@@ -98,6 +195,348 @@ class TestResult:
         return self.tests_passed / self.tests_run
 
 
+# Сколько ждать завершения процесса после SIGKILL
+_REAP_TIMEOUT = 5
+
+
+async def _kill_and_reap(process: asyncio.subprocess.Process) -> None:
+    """
+    Убивает процесс и дожидается его завершения.
+    
+    kill() асинхронен: без wait() остаются зомби и открытые pipes.
+    """
+    if process.returncode is None:
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+    with contextlib.suppress(OSError, asyncio.TimeoutError):
+        await asyncio.shield(asyncio.wait_for(process.wait(), _REAP_TIMEOUT))
+
+
+# Прогретый pytest-воркер: импортирует pytest один раз и форкает чистый
+# дочерний процесс на каждый запуск (изоляция между запусками сохраняется).
+# Протокол: JSON-строка запроса в stdin -> JSON-строка ответа в stdout.
+_PYTEST_WORKER_SCRIPT = r"""
+import contextlib, io, json, os, sys
+import pytest
+
+out = sys.stdout
+for line in sys.stdin:
+    request = json.loads(line)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        stdout_buf, stderr_buf = io.StringIO(), io.StringIO()
+        try:
+            if request.get("limits"):
+                import resource
+                for res, value in request["limits"]:
+                    resource.setrlimit(res, (value, value))
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(stdout_buf), contextlib.redirect_stderr(stderr_buf):
+                returncode = int(pytest.main(request["args"]))
+        except BaseException as e:
+            returncode = -1
+            stderr_buf.write(repr(e))
+        with os.fdopen(write_fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "returncode": returncode,
+                "stdout": stdout_buf.getvalue(),
+                "stderr": stderr_buf.getvalue()
+            }, f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, encoding="utf-8") as f:
+        response = f.read()
+    os.waitpid(pid, 0)
+    if not response:
+        response = json.dumps({"returncode": -1, "stdout": "", "stderr": "pytest worker child exited"})
+    out.write(response + "\n")
+    out.flush()
+"""
+
+
+class _PytestWorker:
+    """
+    Долгоживущий pytest-воркер (POSIX).
+    
+    Экономит старт интерпретатора и импорт pytest/плагинов на каждый запуск.
+    Обслуживает один запуск за раз; при таймауте или падении убивается
+    и перезапускается при следующем запросе.
+    """
+    
+    def __init__(self):
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def busy(self) -> bool:
+        return self._lock is not None and self._lock.locked()
+    
+    async def _ensure_started(self) -> asyncio.subprocess.Process:
+        if self._process is None or self._process.returncode is not None:
+            env = os.environ.copy()
+            env["PYTHONDONTWRITEBYTECODE"] = "1"
+            self._process = await asyncio.create_subprocess_exec(
+                _PYTHON, "-c", _PYTEST_WORKER_SCRIPT,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+                start_new_session=True,
+                limit=_STREAM_LINE_LIMIT * 16
+            )
+        return self._process
+    
+    async def run(
+        self,
+        cwd: str,
+        args: List[str],
+        timeout: float,
+        limits: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[int, str, str]:
+        """
+        Запускает pytest.main(args) в каталоге cwd.
+        
+        limits - rlimit'ы (ресурс, значение), применяемые в дочернем процессе.
+        
+        Returns:
+            (returncode, stdout, stderr)
+        
+        Raises:
+            asyncio.TimeoutError: Превышен таймаут (воркер убит)
+            RuntimeError: Воркер завершился без ответа
+            
+        При любой ошибке воркер убивается; следующий запуск стартует новый.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pipes привязаны к event loop, в котором создан процесс
+            self.kill()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        
+        async with self._lock:
+            process = await self._ensure_started()
+            try:
+                process.stdin.write(json.dumps({"cwd": cwd, "args": args, "limits": limits or []}).encode() + b"\n")
+                await process.stdin.drain()
+                
+                async with asyncio.timeout(timeout):
+                    line = await process.stdout.readline()
+                
+                if not line:
+                    raise RuntimeError("pytest worker exited unexpectedly")
+                
+                data = json.loads(line)
+                return data["returncode"], data["stdout"], data["stderr"]
+            except BaseException:
+                # Любой сбой (таймаут, слишком длинный ответ, битый JSON, отмена):
+                # непрочитанный вывод остался бы в pipe и был бы принят следующим
+                # запуском за свой ответ - воркер выбрасывается
+                await self.terminate()
+                raise
+    
+    async def terminate(self):
+        """Убивает воркер и дожидается его завершения."""
+        process = self._process
+        self.kill()
+        if process is not None:
+            await _kill_and_reap(process)
+    
+    def kill(self):
+        """Убивает воркер вместе с его дочерними процессами."""
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+@functools.lru_cache(maxsize=1)
+def _ramdisk_dir() -> Optional[str]:
+    """tmpfs для временных файлов (Linux), иначе None - системный tempdir."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return None
+
+
+@functools.cache
+def _pytest_installed() -> bool:
+    """
+    Проверяет доступность pytest один раз на процесс.
+    
+    find_spec вместо `python -m pytest --version`: без запуска
+    подпроцесса, блокирующего event loop.
+    """
+    available = importlib.util.find_spec("pytest") is not None
+    if available:
+        logger.info("CodeTester: pytest is available")
+    else:
+        logger.warning("CodeTester: pytest not found, using basic testing")
+    return available
+
+
+# Опасные вызовы для sandbox-проверки по AST
+_DANGEROUS_BUILTINS = frozenset({"eval", "exec", "__import__"})
+_BUILTINS_NAMES = frozenset({"builtins", "__builtins__"})
+_DANGEROUS_QUALNAMES = frozenset({
+    "os.system", "os.remove", "os.rmdir",
+    "subprocess.run", "subprocess.call", "subprocess.Popen",
+    "shutil.rmtree",
+})
+
+
+class _StopWalk(Exception):
+    """Прерывает обход AST на первом нарушении."""
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _qualname(node: ast.AST) -> Optional[str]:
+    """Имя вида `a.b.c` для цепочки атрибутов (None для прочих выражений)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+class _SandboxVisitor(ast.NodeVisitor):
+    """Один проход по AST вместо набора regex; строки и комментарии не считаются."""
+    
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        qualname = _qualname(node)
+        if qualname in _DANGEROUS_QUALNAMES:
+            raise _StopWalk(qualname)
+        self.generic_visit(node)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        # from os import system
+        for alias in node.names:
+            qualname = f"{node.module}.{alias.name}"
+            if qualname in _DANGEROUS_QUALNAMES:
+                raise _StopWalk(qualname)
+    
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Name):
+            if node.func.id in _DANGEROUS_BUILTINS:
+                raise _StopWalk(f"{node.func.id}()")
+            if node.func.id == "open" and self._is_write_mode(node):
+                raise _StopWalk("open() for writing")
+            # getattr(builtins, ...) / getattr(__builtins__, ...) / getattr(x, "exec")
+            if node.func.id == "getattr" and node.args and (
+                self._is_builtins_ref(node.args[0]) or self._names_dangerous_builtin(node.args[1:2])
+            ):
+                raise _StopWalk("getattr() on builtins")
+        elif isinstance(node.func, ast.Attribute):
+            # builtins.exec(...), __builtins__.__import__(...), obj.eval(...)
+            if node.func.attr in _DANGEROUS_BUILTINS:
+                raise _StopWalk(f"{node.func.attr}()")
+        self.generic_visit(node)
+    
+    @staticmethod
+    def _is_builtins_ref(node: ast.AST) -> bool:
+        return isinstance(node, ast.Name) and node.id in _BUILTINS_NAMES
+    
+    @staticmethod
+    def _names_dangerous_builtin(args: List[ast.AST]) -> bool:
+        return any(
+            isinstance(arg, ast.Constant) and arg.value in _DANGEROUS_BUILTINS for arg in args
+        )
+    
+    @staticmethod
+    def _is_write_mode(node: ast.Call) -> bool:
+        mode = node.args[1] if len(node.args) > 1 else next(
+            (kw.value for kw in node.keywords if kw.arg == "mode"), None
+        )
+        return isinstance(mode, ast.Constant) and isinstance(mode.value, str) and "w" in mode.value
+
+
+@functools.lru_cache(maxsize=256)
+def _analyze_code(code: str) -> Tuple[bool, Optional[str], bool]:
+    """
+    Разбирает код один раз для sandbox-проверки и оценки тестируемости.
+    
+    Returns:
+        (parsed, dangerous_reason, has_testable_defs)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False, None, False
+    
+    has_defs = any(
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        for node in tree.body
+    )
+    try:
+        _SandboxVisitor().visit(tree)
+    except _StopWalk as stop:
+        return True, stop.reason, has_defs
+    return True, None, has_defs
+
+
+def _has_testable_defs(code: str) -> bool:
+    """
+    Есть ли в коде функции/классы верхнего уровня.
+    
+    Скрипт без определений нечего покрывать unit-тестами -
+    генерация тестов через LLM и запуск pytest пропускаются.
+    """
+    return _analyze_code(code)[2]
+
+
+def _outputs_match(actual: str, expected: str) -> bool:
+    """Нечёткое сравнение вывода с ожидаемым."""
+    # Нормализуем строки
+    actual_normalized = actual.strip().lower()
+    expected_normalized = expected.strip().lower()
+    
+    # Точное совпадение или содержит ожидаемый текст
+    if expected_normalized in actual_normalized:
+        return True
+    
+    # Проверяем числовые результаты; разное количество чисел - сразу нет
+    actual_numbers = _NUMBER_RE.findall(actual)
+    expected_numbers = _NUMBER_RE.findall(expected)
+    if not actual_numbers or len(actual_numbers) != len(expected_numbers):
+        return False
+    
+    try:
+        if NUMPY_AVAILABLE:
+            return bool(np.allclose(
+                np.asarray(actual_numbers, dtype=np.float64),
+                np.asarray(expected_numbers, dtype=np.float64),
+                rtol=0, atol=1e-4
+            ))
+        return all(
+            abs(float(a) - float(e)) < 0.0001
+            for a, e in zip(actual_numbers, expected_numbers)
+        )
+    except ValueError:
+        return False
+
+
+def _code_cache_key(code: str, task_description: str) -> str:
+    """Ключ кэша по коду и задаче."""
+    return hashlib.blake2b(
+        f"{code}\0{task_description}".encode(),
+        digest_size=16
+    ).hexdigest()
+
+
 class CodeTester:
     """
     Тестировщик кода с безопасным запуском и генерацией тестов.
@@ -113,6 +552,21 @@ class CodeTester:
     EXECUTION_TIMEOUT = 30  # секунд для выполнения кода
     TEST_TIMEOUT = 60  # секунд для тестов
     
+    # Размер кэша сгенерированных тестов
+    GENERATED_TESTS_CACHE_SIZE = 128
+    
+    # Лимиты процессов в sandbox-режиме (POSIX): память и размер файлов в байтах
+    SANDBOX_MEMORY_LIMIT = 512 << 20
+    SANDBOX_FILE_SIZE_LIMIT = 64 << 20
+    
+    # Начиная с какого размера проверки уходят в поток, а не блокируют event loop
+    SANDBOX_OFFLOAD_THRESHOLD = 16384
+    OUTPUT_OFFLOAD_THRESHOLD = 32768
+    
+    # Границы max_tokens для исправления кода (~1.2x длины кода при 4 символах на токен)
+    FIX_MIN_TOKENS = 256
+    FIX_MAX_TOKENS = 4096
+    
     # Запрещённые импорты/паттерны для sandbox
     DANGEROUS_PATTERNS = [
         r"\bos\.system\b",
@@ -120,17 +574,22 @@ class CodeTester:
         r"\beval\s*\(",
         r"\bexec\s*\(",
         r"\b__import__\s*\(",
-        r"\bopen\s*\([^)]*['\"]w['\"]",  # Запись в файлы
+        r"\bopen\s*\([^)\n]{0,200}?['\"]w['\"]",  # Запись в файлы (ограничено против ReDoS)
         r"\bshutil\.rmtree\b",
         r"\bos\.remove\b",
         r"\bos\.rmdir\b",
     ]
+    # Все паттерны одним regex - для кода, который не разбирается в AST
+    _DANGEROUS_RE = re.compile("|".join(
+        f"(?P<p{i}>{pattern})" for i, pattern in enumerate(DANGEROUS_PATTERNS)
+    ))
     
     def __init__(
         self,
         llm_manager=None,
         auto_generate_tests: bool = True,
-        sandbox_mode: bool = True
+        sandbox_mode: bool = True,
+        reuse_pytest_worker: bool = True
     ):
         """
         Инициализация.
@@ -139,30 +598,41 @@ class CodeTester:
             llm_manager: LLM провайдер для генерации тестов
             auto_generate_tests: Автоматически генерировать тесты
             sandbox_mode: Безопасный режим с ограничениями
+            reuse_pytest_worker: Запускать pytest в прогретом воркере (только POSIX)
         """
         self.llm_manager = llm_manager
         self.auto_generate_tests = auto_generate_tests
         self.sandbox_mode = sandbox_mode
         
-        # Проверяем наличие pytest
-        self._pytest_available = self._check_pytest()
+        # Временные файлы в tmpfs (/dev/shm), если доступен
+        self._tmp_dir = _ramdisk_dir()
         
-        if self._pytest_available:
-            logger.info("CodeTester: pytest is available")
-        else:
-            logger.warning("CodeTester: pytest not found, using basic testing")
+        # Кэш сгенерированных тестов: (code, task) -> tests
+        self._gen_cache: LRUDict[str, str] = LRUDict()
+        
+        self._pytest_worker: Optional[_PytestWorker] = None
+        if reuse_pytest_worker and self._pytest_available and hasattr(os, "fork"):
+            self._pytest_worker = _PytestWorker()
     
-    def _check_pytest(self) -> bool:
-        """Проверяет доступность pytest."""
-        try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pytest", "--version"],
-                capture_output=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+    @functools.cached_property
+    def _pytest_available(self) -> bool:
+        """Доступен ли pytest (проверка общая для всех экземпляров)."""
+        return _pytest_installed()
+    
+    def _sandbox_limits(self, timeout: int) -> List[Tuple[int, int]]:
+        """
+        rlimit'ы для запускаемого кода.
+        
+        Бесконечный цикл или выделение памяти ядро прервёт само,
+        не дожидаясь таймаута и не доводя хост до OOM.
+        """
+        if not self.sandbox_mode or not RESOURCE_AVAILABLE:
+            return []
+        return [
+            (resource.RLIMIT_AS, self.SANDBOX_MEMORY_LIMIT),
+            (resource.RLIMIT_CPU, timeout + 5),
+            (resource.RLIMIT_FSIZE, self.SANDBOX_FILE_SIZE_LIMIT),
+        ]
     
     def _check_dangerous_code(self, code: str) -> Tuple[bool, Optional[str]]:
         """
@@ -174,12 +644,24 @@ class CodeTester:
         if not self.sandbox_mode:
             return True, None
         
-        for pattern in self.DANGEROUS_PATTERNS:
-            if re.search(pattern, code):
-                return False, f"Dangerous pattern detected: {pattern}"
+        pattern = self._find_dangerous_pattern(code)
+        if pattern:
+            return False, f"Dangerous pattern detected: {pattern}"
         
         return True, None
     
+    @classmethod
+    def _find_dangerous_pattern(cls, code: str) -> Optional[str]:
+        """Первый найденный опасный вызов (разбор AST кэшируется по коду)."""
+        parsed, reason, _ = _analyze_code(code)
+        if parsed:
+            return reason
+        # Код не разбирается - запасной вариант по regex
+        match = cls._DANGEROUS_RE.search(code)
+        if match:
+            return cls.DANGEROUS_PATTERNS[int(match.lastgroup[1:])]
+        return None
+    
     async def test_code(
         self,
         code: str,
@@ -218,7 +700,11 @@ class CodeTester:
             )
         
         # Проверяем на опасный код
-        is_safe, safety_warning = self._check_dangerous_code(code)
+        # Малый код проверяем inline: передача в поток дороже самой проверки
+        if len(code) > self.SANDBOX_OFFLOAD_THRESHOLD:
+            is_safe, safety_warning = await asyncio.to_thread(self._check_dangerous_code, code)
+        else:
+            is_safe, safety_warning = self._check_dangerous_code(code)
         if not is_safe:
             return TestResult(
                 success=False,
@@ -227,9 +713,21 @@ class CodeTester:
         
         result = TestResult(success=True)
         
+        # Генерация тестов через LLM не зависит от запуска кода:
+        # стартуем её сразу, параллельно с выполнением
+        generation_task: Optional[asyncio.Task] = None
+        if (
+            run_generated_tests and self.auto_generate_tests and self.llm_manager
+            and task_description and _has_testable_defs(code)
+        ):
+            generation_task = asyncio.create_task(self._generate_tests(code, task_description))
+        
+        # Код кодируется один раз - для stdin и для файла тестов
+        code_bytes = code.encode("utf-8")
+        
         try:
             # 1. Пробуем просто выполнить код
-            exec_result = await self._execute_code(code)
+            exec_result = await self._execute_code(code_bytes)
             result.code_ran_successfully = exec_result["success"]
             result.execution_output = exec_result.get("stdout", "")
             result.execution_error = exec_result.get("stderr", "")
@@ -246,10 +744,15 @@ class CodeTester:
             
             # 2. Проверяем ожидаемый вывод
             if expected_output:
-                output_matches = self._check_output(
-                    result.execution_output, 
-                    expected_output
-                )
+                if len(result.execution_output) > self.OUTPUT_OFFLOAD_THRESHOLD:
+                    output_matches = await asyncio.to_thread(
+                        self._check_output, result.execution_output, expected_output
+                    )
+                else:
+                    output_matches = self._check_output(
+                        result.execution_output, 
+                        expected_output
+                    )
                 result.test_cases.append(TestCase(
                     name="expected_output",
                     status=TestStatus.PASSED if output_matches else TestStatus.FAILED,
@@ -262,32 +765,25 @@ class CodeTester:
                     result.tests_passed += 1
                 result.tests_run += 1
             
-            # 3. Запускаем пользовательские тесты
-            if custom_tests:
-                custom_result = await self._run_tests(code, custom_tests)
-                result.test_cases.extend(custom_result.test_cases)
-                result.tests_run += custom_result.tests_run
-                result.tests_passed += custom_result.tests_passed
-                result.tests_failed += custom_result.tests_failed
-                result.tests_error += custom_result.tests_error
+            # 3-4. Пользовательские и сгенерированные тесты - один запуск pytest
+            user_tests = custom_tests if custom_tests and custom_tests.strip() else ""
+            auto_tests = None
             
-            # 4. Генерируем и запускаем автотесты
-            if run_generated_tests and self.auto_generate_tests and self.llm_manager and task_description:
-                generated_tests = await self._generate_tests(code, task_description)
+            if generation_task is not None:
+                generated_tests = await generation_task
                 
                 if generated_tests:
                     result.generated_tests = generated_tests
-                    gen_result = await self._run_tests(code, generated_tests)
-                    
-                    # Добавляем результаты с префиксом
-                    for tc in gen_result.test_cases:
-                        tc.name = f"auto_{tc.name}"
-                        result.test_cases.append(tc)
-                    
-                    result.tests_run += gen_result.tests_run
-                    result.tests_passed += gen_result.tests_passed
-                    result.tests_failed += gen_result.tests_failed
-                    result.tests_error += gen_result.tests_error
+                    # Автотесты получают префикс test_auto_ прямо в коде
+                    auto_tests = self._prefix_generated_tests(generated_tests)
+            
+            if user_tests or auto_tests:
+                tests_result = await self._run_tests(code_bytes, user_tests, auto_tests)
+                result.test_cases.extend(tests_result.test_cases)
+                result.tests_run += tests_result.tests_run
+                result.tests_passed += tests_result.tests_passed
+                result.tests_failed += tests_result.tests_failed
+                result.tests_error += tests_result.tests_error
             
             # Определяем общий успех
             if result.tests_run > 0:
@@ -301,58 +797,52 @@ class CodeTester:
                 success=False,
                 execution_error=str(e)
             )
+        
+        finally:
+            # Код не запустился - сгенерированные тесты не нужны
+            if generation_task is not None and not generation_task.done():
+                generation_task.cancel()
     
-    async def _execute_code(self, code: str) -> Dict[str, Any]:
+    async def _execute_code(self, code: Union[str, bytes]) -> Dict[str, Any]:
         """
         Выполняет Python код в изолированном процессе.
         """
+        source = code.encode("utf-8") if isinstance(code, str) else code
         try:
-            # Создаём временный файл
-            with tempfile.NamedTemporaryFile(
-                mode="w",
-                suffix=".py",
-                delete=False,
-                encoding="utf-8"
-            ) as f:
-                f.write(code)
-                f.flush()
-                temp_path = f.name
-            
             import time
             start_time = time.time()
             
-            # Запускаем в отдельном процессе
-            env = os.environ.copy()
-            # Добавляем ограничения для sandbox
-            if self.sandbox_mode:
-                env["PYTHONDONTWRITEBYTECODE"] = "1"
-            
+            # Код передаётся через stdin: без временного файла и его удаления.
+            # -I - изолированный режим (без user site-packages и PYTHON* из env),
+            # поэтому -B/-u задаются флагами
+            limits = self._sandbox_limits(self.EXECUTION_TIMEOUT)
             process = await asyncio.create_subprocess_exec(
-                sys.executable, temp_path,
+                _PYTHON, "-I", "-B", "-u", "-",
+                stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                env=env
+                close_fds=False,
+                preexec_fn=_limits_preexec(limits)
             )
+            # Код ещё не передан в stdin - лимиты успевают встать до его запуска
+            _limit_process(process.pid, limits)
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.EXECUTION_TIMEOUT
-                )
+                async with asyncio.timeout(self.EXECUTION_TIMEOUT):
+                    stdout, stderr = await process.communicate(source)
                 
                 duration = time.time() - start_time
                 
                 return {
                     "success": process.returncode == 0,
                     "stdout": stdout.decode("utf-8", errors="replace"),
-                    "stderr": stderr.decode("utf-8", errors="replace"),
+                    "stderr": _decode_stderr(stderr),
                     "returncode": process.returncode,
                     "duration": duration
                 }
                 
             except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+                await _kill_and_reap(process)
                 return {
                     "success": False,
                     "stdout": "",
@@ -360,10 +850,6 @@ class CodeTester:
                     "returncode": -1,
                     "duration": self.EXECUTION_TIMEOUT
                 }
-            
-            finally:
-                # Удаляем временный файл
-                Path(temp_path).unlink(missing_ok=True)
                 
         except Exception as e:
             return {
@@ -374,39 +860,46 @@ class CodeTester:
                 "duration": 0
             }
     
-    async def _run_tests(self, code: str, tests: str) -> TestResult:
+    async def _run_tests(
+        self,
+        code: Union[str, bytes],
+        tests: str,
+        generated_tests: Optional[str] = None
+    ) -> TestResult:
         """
         Запускает тесты для кода.
+        
+        Сгенерированные тесты пишутся в отдельный test_auto.py: ошибка
+        импорта в них не ломает сбор пользовательских тестов.
         """
+        source = code.encode("utf-8") if isinstance(code, str) else code
         result = TestResult(success=True)
         
         try:
-            # Создаём временную директорию
-            with tempfile.TemporaryDirectory() as temp_dir:
+            # Создаём временную директорию; ошибки очистки (файлы убитого
+            # по таймауту процесса) не должны превращаться в ошибку тестов
+            with tempfile.TemporaryDirectory(
+                prefix="ct_", dir=self._tmp_dir, ignore_cleanup_errors=True
+            ) as temp_dir:
                 temp_path = Path(temp_dir)
                 
-                # Записываем код
-                code_file = temp_path / "code_under_test.py"
-                code_file.write_text(code, encoding="utf-8")
-                
-                # Записываем тесты
-                test_file = temp_path / "test_code.py"
-                
-                # Добавляем импорт тестируемого кода
-                test_content = f"""import sys
-sys.path.insert(0, r'{temp_dir}')
-from code_under_test import *
-
-{tests}
-"""
-                test_file.write_text(test_content, encoding="utf-8")
+                # Код и тесты в одном модуле: не нужен отдельный файл
+                # и правка sys.path для импорта тестируемого кода
+                test_files: List[Path] = []
+                for name, module_tests in (("test_code.py", tests), ("test_auto.py", generated_tests)):
+                    if not module_tests:
+                        continue
+                    test_file = temp_path / name
+                    # write_bytes: без текстового слоя io и повторного кодирования кода
+                    test_file.write_bytes(b"".join((source, b"\n\n", module_tests.encode("utf-8"), b"\n")))
+                    test_files.append(test_file)
                 
                 if self._pytest_available:
                     # Запускаем pytest
-                    result = await self._run_pytest(temp_path, test_file)
+                    result = await self._run_pytest(temp_path, test_files)
                 else:
                     # Fallback: запускаем unittest
-                    result = await self._run_unittest(temp_path, test_file)
+                    result = await self._run_unittest(temp_path, test_files)
                 
         except Exception as e:
             logger.error(f"Error running tests: {e}")
@@ -420,44 +913,93 @@ from code_under_test import *
         
         return result
     
-    async def _run_pytest(self, temp_dir: Path, test_file: Path) -> TestResult:
-        """Запускает pytest и парсит результаты."""
+    async def _run_pytest(self, temp_dir: Path, test_files: List[Path]) -> TestResult:
+        """
+        Запускает pytest.
+        
+        Результаты берутся из JUnit XML отчёта; разбор текстового вывода -
+        запасной вариант, если отчёт не записан.
+        """
+        report_file = temp_dir / "report.xml"
+        pytest_args = [
+            *map(str, test_files), "-v", "--tb=short",
+            # Ошибка сбора test_auto.py не должна отменять остальные тесты
+            "--continue-on-collection-errors",
+            "-p", "no:cacheprovider", "--import-mode=importlib",
+            f"--rootdir={temp_dir}", f"--junitxml={report_file}"
+        ]
+        
+        limits = self._sandbox_limits(self.TEST_TIMEOUT)
+        
+        # Прогретый воркер; если он занят другим запуском - холодный старт
+        if self._pytest_worker is not None and not self._pytest_worker.busy:
+            try:
+                _, stdout, stderr = await self._pytest_worker.run(
+                    str(temp_dir), pytest_args, self.TEST_TIMEOUT, limits
+                )
+                result = self._parse_junit_report(report_file)
+                if result is None:
+                    return self._parse_pytest_output(stdout, stderr)
+                return self._finalize_pytest_result(result, stdout, stderr)
+            except asyncio.TimeoutError:
+                return self._pytest_timeout_result(TestResult(success=True))
+            except Exception as e:
+                logger.debug(f"CodeTester: pytest worker failed, falling back to cold start: {e}")
+        
         result = TestResult(success=True)
         
         try:
             process = await asyncio.create_subprocess_exec(
-                sys.executable, "-m", "pytest",
-                str(test_file),
-                "-v",
-                "--tb=short",
-                "-q",
+                _PYTHON, "-B", "-m", "pytest",
+                *pytest_args,
+                # Изоляция: без модулей и файлов сервера и без унаследованных fd
                 cwd=str(temp_dir),
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                close_fds=True,
+                preexec_fn=_limits_preexec(limits),
+                limit=_STREAM_LINE_LIMIT
             )
+            _limit_process(process.pid, limits)
+            
+            output_lines: List[str] = []
+            
+            async def read_stdout():
+                # Парсим строки параллельно с работой pytest
+                while True:
+                    try:
+                        raw = await process.stdout.readline()
+                    except ValueError:
+                        # Строка длиннее _STREAM_LINE_LIMIT (огромный repr или print):
+                        # readline уже убрал её из буфера, читаем дальше
+                        output_lines.append("<line too long, skipped>")
+                        continue
+                    if not raw:
+                        break
+                    line = raw.decode("utf-8", errors="replace").rstrip()
+                    output_lines.append(line)
+                    self._scan_pytest_line(line, result)
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.TEST_TIMEOUT
-                )
+                async with asyncio.timeout(self.TEST_TIMEOUT):
+                    _, stderr = await asyncio.gather(read_stdout(), process.stderr.read())
+                    await process.wait()
                 
-                output = stdout.decode("utf-8", errors="replace")
-                errors = stderr.decode("utf-8", errors="replace")
-                
-                # Парсим результаты pytest
-                result = self._parse_pytest_output(output, errors)
+                # Построчный разбор нужен до завершения (частичный результат
+                # при таймауте); итог - по отчёту, если он есть
+                result = self._parse_junit_report(report_file) or result
+                self._finalize_pytest_result(
+                    result,
+                    "\n".join(output_lines),
+                    _decode_stderr(stderr)
+                )
                 
             except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
-                result.success = False
-                result.test_cases.append(TestCase(
-                    name="pytest_timeout",
-                    status=TestStatus.TIMEOUT,
-                    error=f"Tests timed out after {self.TEST_TIMEOUT} seconds"
-                ))
-                result.tests_error = 1
+                self._pytest_timeout_result(result)
+            
+            finally:
+                # Любой выход (таймаут, ошибка чтения, отмена) - без зомби и открытых pipes
+                await _kill_and_reap(process)
                 
         except Exception as e:
             result.success = False
@@ -466,58 +1008,107 @@ from code_under_test import *
                 status=TestStatus.ERROR,
                 error=str(e)
             ))
-            result.tests_error = 1
+            result.tests_error += 1
+        
+        return result
+    
+    def _pytest_timeout_result(self, result: TestResult) -> TestResult:
+        """Отмечает результат как прерванный по таймауту."""
+        result.success = False
+        result.test_cases.append(TestCase(
+            name="pytest_timeout",
+            status=TestStatus.TIMEOUT,
+            error=f"Tests timed out after {self.TEST_TIMEOUT} seconds"
+        ))
+        result.tests_error += 1
+        return result
+    
+    def close(self):
+        """Останавливает pytest-воркер."""
+        if self._pytest_worker is not None:
+            self._pytest_worker.kill()
+    
+    @staticmethod
+    def _parse_junit_report(report_file: Path) -> Optional[TestResult]:
+        """
+        Собирает результат из JUnit XML отчёта pytest (--junitxml).
+        
+        В отличие от вывода -v, имена параметризованных тестов
+        и сообщения об ошибках сохраняются. None - отчёта нет или он битый.
+        """
+        try:
+            root = ET.parse(report_file).getroot()
+        except (OSError, ET.ParseError):
+            return None
+        
+        result = TestResult(success=True)
+        for case in root.iter("testcase"):
+            status, error = TestStatus.PASSED, None
+            for child in case:
+                if child.tag in _JUNIT_STATUS_MAP:
+                    status = _JUNIT_STATUS_MAP[child.tag]
+                    error = child.get("message") or (child.text or "").strip() or None
+                    break
+            
+            result.test_cases.append(TestCase(
+                name=case.get("name", ""),
+                status=status,
+                duration=float(case.get("time") or 0.0),
+                error=error if status != TestStatus.SKIPPED else None
+            ))
+            result.tests_run += 1
+            if status == TestStatus.PASSED:
+                result.tests_passed += 1
+            elif status == TestStatus.FAILED:
+                result.tests_failed += 1
+            elif status == TestStatus.ERROR:
+                result.tests_error += 1
         
         return result
     
     def _parse_pytest_output(self, stdout: str, stderr: str) -> TestResult:
         """Парсит вывод pytest."""
         result = TestResult(success=True)
+        
+        for line in stdout.splitlines():
+            self._scan_pytest_line(line, result)
+        
+        return self._finalize_pytest_result(result, stdout, stderr)
+    
+    @staticmethod
+    def _scan_pytest_line(line: str, result: TestResult) -> None:
+        """Разбирает одну строку вывода pytest (test_file.py::test_name STATUS)."""
+        match = _PYTEST_LINE_RE.search(line)
+        if not match:
+            return
+        
+        status = _PYTEST_STATUS_MAP.get(match.group(2), TestStatus.ERROR)
+        result.test_cases.append(TestCase(
+            name=match.group(1),
+            status=status
+        ))
+        
+        result.tests_run += 1
+        if status == TestStatus.PASSED:
+            result.tests_passed += 1
+        elif status == TestStatus.FAILED:
+            result.tests_failed += 1
+        elif status == TestStatus.ERROR:
+            result.tests_error += 1
+    
+    @staticmethod
+    def _finalize_pytest_result(result: TestResult, stdout: str, stderr: str) -> TestResult:
+        """Дополняет результат summary-строкой pytest и итоговым статусом."""
         result.execution_output = stdout
         result.execution_error = stderr
         
-        # Парсим строки с результатами тестов
-        # Формат: test_file.py::test_name PASSED/FAILED
-        for line in stdout.split("\n"):
-            line = line.strip()
-            
-            # Паттерн для pytest результатов
-            match = re.match(r".*::(\w+)\s+(PASSED|FAILED|ERROR|SKIPPED)", line)
-            if match:
-                test_name = match.group(1)
-                status_str = match.group(2)
-                
-                status_map = {
-                    "PASSED": TestStatus.PASSED,
-                    "FAILED": TestStatus.FAILED,
-                    "ERROR": TestStatus.ERROR,
-                    "SKIPPED": TestStatus.SKIPPED
-                }
-                status = status_map.get(status_str, TestStatus.ERROR)
-                
-                result.test_cases.append(TestCase(
-                    name=test_name,
-                    status=status
-                ))
-                
-                result.tests_run += 1
-                if status == TestStatus.PASSED:
-                    result.tests_passed += 1
-                elif status == TestStatus.FAILED:
-                    result.tests_failed += 1
-                elif status == TestStatus.ERROR:
-                    result.tests_error += 1
-        
-        # Парсим summary строку
-        # Формат: 3 passed, 1 failed in 0.12s
-        summary_match = re.search(
-            r"(\d+)\s+passed.*?(\d+)?\s*failed?",
-            stdout,
-            re.IGNORECASE
-        )
-        if summary_match and result.tests_run == 0:
-            result.tests_passed = int(summary_match.group(1))
-            result.tests_failed = int(summary_match.group(2) or 0)
+        # Summary строка нужна, только если построчный разбор ничего не дал
+        if result.tests_run == 0:
+            for count, outcome in _PYTEST_SUMMARY_RE.findall(stdout):
+                if outcome.lower() == "passed":
+                    result.tests_passed = int(count)
+                else:
+                    result.tests_failed = int(count)
             result.tests_run = result.tests_passed + result.tests_failed
         
         # Определяем успех
@@ -526,25 +1117,26 @@ from code_under_test import *
         
         return result
     
-    async def _run_unittest(self, temp_dir: Path, test_file: Path) -> TestResult:
+    async def _run_unittest(self, temp_dir: Path, test_files: List[Path]) -> TestResult:
         """Fallback на unittest."""
         result = TestResult(success=True)
+        limits = self._sandbox_limits(self.TEST_TIMEOUT)
         
         try:
             process = await asyncio.create_subprocess_exec(
-                sys.executable, "-m", "unittest",
-                str(test_file),
+                _PYTHON, "-B", "-m", "unittest",
+                *(test_file.name for test_file in test_files),
                 "-v",
                 cwd=str(temp_dir),
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                preexec_fn=_limits_preexec(limits)
             )
+            _limit_process(process.pid, limits)
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.TEST_TIMEOUT
-                )
+                async with asyncio.timeout(self.TEST_TIMEOUT):
+                    stdout, stderr = await process.communicate()
                 
                 output = stdout.decode("utf-8", errors="replace")
                 errors = stderr.decode("utf-8", errors="replace")
@@ -556,22 +1148,21 @@ from code_under_test import *
                 
                 # Парсим результат unittest
                 # Формат: Ran X tests in Y.YYs
-                match = re.search(r"Ran (\d+) tests?", errors)
+                match = _UNITTEST_RAN_RE.search(errors)
                 if match:
                     result.tests_run = int(match.group(1))
                 
                 if "OK" in errors:
                     result.tests_passed = result.tests_run
                 elif "FAILED" in errors:
-                    fail_match = re.search(r"failures?=(\d+)", errors)
+                    fail_match = _UNITTEST_FAIL_RE.search(errors)
                     if fail_match:
                         result.tests_failed = int(fail_match.group(1))
                     result.tests_passed = result.tests_run - result.tests_failed
                     result.success = False
                     
             except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+                await _kill_and_reap(process)
                 result.success = False
                 result.tests_error = 1
                 
@@ -589,6 +1180,23 @@ from code_under_test import *
         if not self.llm_manager:
             return None
         
+        key = _code_cache_key(code, task_description)
+        cached = self._gen_cache.get(key)
+        if cached is not None:
+            self._gen_cache.move_to_end(key)
+            return cached
+        
+        tests = await self._request_tests(code, task_description)
+        
+        if tests:
+            if len(self._gen_cache) >= self.GENERATED_TESTS_CACHE_SIZE:
+                self._gen_cache.popitem(last=False)
+            self._gen_cache[key] = tests
+        
+        return tests
+    
+    async def _request_tests(self, code: str, task_description: str) -> Optional[str]:
+        """Запрашивает тесты у LLM."""
         from ..llm.base import LLMMessage
         
         prompt = f"""Generate pytest unit tests for the following Python code.
@@ -630,8 +1238,8 @@ import pytest
             
             # Удаляем markdown обёртку если есть
             if tests.startswith("```"):
-                tests = re.sub(r"^```(?:python)?\n?", "", tests)
-                tests = re.sub(r"\n?```$", "", tests)
+                tests = _MD_PREFIX_RE.sub("", tests)
+                tests = _MD_SUFFIX_RE.sub("", tests)
             
             # Проверяем что есть хотя бы один тест
             if "def test_" in tests:
@@ -643,43 +1251,34 @@ import pytest
             logger.warning(f"Failed to generate tests: {e}")
             return None
     
+    @staticmethod
+    def _prefix_generated_tests(tests: str) -> str:
+        """
+        Переименовывает test_* функции автотестов в test_auto_*.
+        
+        Отличает их от пользовательских тестов в общем запуске pytest
+        и исключает конфликты имён.
+        """
+        try:
+            tree = ast.parse(tests)
+        except SyntaxError:
+            return tests
+        
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and node.name.startswith("test_")
+            ):
+                node.name = "test_auto_" + node.name[len("test_"):]
+        
+        return ast.unparse(tree)
+    
     def _check_output(self, actual: str, expected: str) -> bool:
         """
         Проверяет соответствие вывода ожидаемому.
         Использует нечёткое сравнение.
         """
-        # Нормализуем строки
-        actual_normalized = actual.strip().lower()
-        expected_normalized = expected.strip().lower()
-        
-        # Точное совпадение
-        if actual_normalized == expected_normalized:
-            return True
-        
-        # Содержит ожидаемый текст
-        if expected_normalized in actual_normalized:
-            return True
-        
-        # Проверяем числовые результаты
-        actual_numbers = re.findall(r"[-+]?\d*\.?\d+", actual)
-        expected_numbers = re.findall(r"[-+]?\d*\.?\d+", expected)
-        
-        if actual_numbers and expected_numbers:
-            try:
-                actual_floats = [float(n) for n in actual_numbers]
-                expected_floats = [float(n) for n in expected_numbers]
-                
-                if len(actual_floats) == len(expected_floats):
-                    all_close = all(
-                        abs(a - e) < 0.0001 
-                        for a, e in zip(actual_floats, expected_floats)
-                    )
-                    if all_close:
-                        return True
-            except ValueError:
-                pass
-        
-        return False
+        return _outputs_match(actual, expected)
     
     async def test_and_fix(
         self,
@@ -693,13 +1292,27 @@ import pytest
         Возвращает исправленный код и результат тестов.
         """
         current_code = code
+        # Тесты от LLM генерируются один раз и переиспользуются на следующих
+        # попытках: без лишнего вызова LLM и с одинаковым набором проверок
+        generated_tests: Optional[str] = None
         
         for attempt in range(max_fix_attempts + 1):
-            result = await self.test_code(
-                code=current_code,
-                language="python",
-                task_description=task_description
-            )
+            if generated_tests:
+                result = await self.test_code(
+                    code=current_code,
+                    language="python",
+                    task_description=task_description,
+                    custom_tests=generated_tests,
+                    run_generated_tests=False
+                )
+                result.generated_tests = generated_tests
+            else:
+                result = await self.test_code(
+                    code=current_code,
+                    language="python",
+                    task_description=task_description
+                )
+                generated_tests = result.generated_tests
             
             if result.success:
                 logger.info(f"CodeTester: Tests passed on attempt {attempt + 1}")
@@ -777,12 +1390,12 @@ Fixed code:"""
                     LLMMessage(role="user", content=fix_prompt)
                 ],
                 temperature=0.1,
-                max_tokens=len(code) * 2
+                max_tokens=min(self.FIX_MAX_TOKENS, max(self.FIX_MIN_TOKENS, len(code) // 3))
             )
             
             # Извлекаем код
             fixed = response.content
-            match = re.search(r"```python\n(.*?)```", fixed, re.DOTALL)
+            match = _PY_BLOCK_RE.search(fixed)
             if match:
                 return match.group(1).strip()
             
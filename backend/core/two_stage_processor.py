@@ -3,9 +3,16 @@ TwoStageProcessor - Двухэтапная обработка
 Быстрая модель для предобработки, мощная для финальных решений
 """
 
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List, Set, Tuple
 import asyncio
-from enum import Enum
+import hashlib
+import json
+import os
+import re
+import time
+import weakref
+from collections import OrderedDict
+from enum import StrEnum
 from dataclasses import dataclass
 from .logger import get_logger
 logger = get_logger(__name__)
@@ -13,8 +20,45 @@ logger = get_logger(__name__)
 from ..llm.providers import LLMProviderManager
 from ..llm.base import LLMMessage
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-class ProcessingStage(Enum):
+
+# Кэш списка моделей провайдера: имя провайдера -> (время получения, модели).
+# Набор моделей Ollama меняется редко - без HTTP-запроса к демону на каждый вызов
+MODELS_CACHE_TTL = 300.0
+_MODELS_CACHE: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+_MODELS_CACHE_LOCK = asyncio.Lock()
+
+
+async def _list_models_cached(provider_name: str, provider, ttl: float = MODELS_CACHE_TTL) -> List[Dict[str, Any]]:
+    """
+    Список моделей провайдера в виде [{"name": ..., "size": ...}] с кэшем на ttl секунд.
+    
+    Провайдер может вернуть как имена, так и словари с метаданными.
+    """
+    cached = _MODELS_CACHE.get(provider_name)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    
+    async with _MODELS_CACHE_LOCK:
+        # Пока ждали блокировку, список мог обновить другой вызов
+        cached = _MODELS_CACHE.get(provider_name)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        
+        models = [
+            model if isinstance(model, dict) else {"name": str(model)}
+            for model in (await provider.list_models() or [])
+        ]
+        _MODELS_CACHE[provider_name] = (time.monotonic(), models)
+        return models
+
+
+class ProcessingStage(StrEnum):
     """Этапы обработки"""
     FAST_PREPROCESSING = "fast_preprocessing"
     POWERFUL_PROCESSING = "powerful_processing"
@@ -22,7 +66,7 @@ class ProcessingStage(Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcessingResult:
     """Результат обработки"""
     stage: ProcessingStage
@@ -31,6 +75,248 @@ class ProcessingResult:
     error: Optional[str] = None
 
 
+# Разбор первого JSON-объекта в ответе модели (без поиска '}' с конца строки)
+_JSON_DECODER = json.JSONDecoder()
+
+# LRU кэш результатов быстрого анализа: хэш (провайдер, задача) -> анализ.
+# Повторные задачи (ретраи, регенерации) обходят быстрый этап целиком
+ANALYSIS_CACHE_MAX_ENTRIES = 1024
+_ANALYSIS_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Модели меньше этого размера годятся для быстрого этапа (если не нашлись по паттернам)
+SMALL_MODEL_MAX_SIZE = 10 * 1024 ** 3
+
+def _parse_first_json_object(content: str, exact: bool = False) -> Any:
+    """
+    Первый JSON-объект в ответе модели (None, если его нет или он невалиден).
+    
+    exact - content ровно один объект, выделенный _JsonObjectScanner из stream:
+    его разбирает orjson. Произвольный ответ разбирается raw_decode с первой '{'.
+    """
+    if exact and ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as e:
+            logger.debug(f"Fast preprocessing returned invalid JSON: {e}")
+            return None
+    
+    json_start = content.find('{')
+    if json_start < 0:
+        return None
+    
+    try:
+        return _JSON_DECODER.raw_decode(content, json_start)[0]
+    except json.JSONDecodeError as e:
+        logger.debug(f"Fast preprocessing returned invalid JSON: {e}")
+        return None
+
+
+# Бюджет быстрого этапа: JSON фиксированной схемы с коротким подходом.
+# Каждый лишний токен - полный проход по весам модели при декодировании
+FAST_STAGE_MAX_TOKENS = 128
+
+
+def _analysis_cache_key(provider: str, task: str) -> str:
+    """Ключ кэша анализа; пробелы в задаче нормализуются"""
+    normalized = " ".join(task.split())
+    return hashlib.blake2b(f"{provider}\0{normalized}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Неизменяемые части промптов собираются один раз
+_FAST_SYSTEM_MSG = LLMMessage(
+    role="system",
+    content="Ты - эксперт по анализу задач. Отвечай только в формате JSON."
+)
+_POWERFUL_SYSTEM_MSG = LLMMessage(
+    role="system",
+    content="Ты - опытный AI ассистент. Выполняй задачи качественно и полностью."
+)
+_FAST_PROMPT_TEMPLATE = """Проанализируй задачу и определи:
+1. Тип задачи (coding, analysis, question, etc.)
+2. Сложность (simple, medium, complex)
+3. Ключевые требования
+4. Рекомендуемый подход
+
+Задача: {task}
+
+Ответь только JSON, без пояснений, подход - одной фразой:
+{{
+    "task_type": "тип",
+    "complexity": "сложность",
+    "requirements": ["требование1", "требование2"],
+    "approach": "краткое описание подхода"
+}}"""
+
+_POWERFUL_PROMPT_TEMPLATE = """На основе анализа задачи выполни её.
+
+Анализ задачи:
+- Тип: {task_type}
+- Сложность: {complexity}
+- Требования: {requirements}
+- Подход: {approach}
+
+Задача: {task}
+
+Выполни задачу и предоставь результат."""
+
+# Бюджет мощного этапа по сложности из быстрого анализа: декодирование
+# идёт токен за токеном, простым задачам большой запас не нужен
+POWERFUL_MAX_TOKENS_BY_COMPLEXITY: Dict[str, int] = {
+    "simple": 400,
+    "medium": 800,
+    "complex": 2000
+}
+POWERFUL_DEFAULT_MAX_TOKENS = 800
+
+# Простые задачи выполняет быстрая модель - мощный вызов не нужен
+FAST_TIER_COMPLEXITIES = frozenset({"simple", "trivial"})
+
+
+# Лимиты одновременных вызовов на LLM менеджер. Общий сервер Ollama при
+# множестве параллельных мощных запросов свопает модели или падает по памяти
+MAX_PARALLEL_POWERFUL = int(os.getenv("URBRS_MAX_PARALLEL_POWERFUL", "2"))
+MAX_PARALLEL_FAST = int(os.getenv("URBRS_MAX_PARALLEL_FAST", "8"))
+
+
+class _PowerfulRequestPool:
+    """
+    Общий пул запросов мощного этапа для одного LLM менеджера.
+    
+    - Одинаковые одновременные запросы (те же сообщения и параметры)
+      объединяются в один вызов LLM, результат раздаётся всем ожидающим
+    - Число одновременных вызовов ограничено семафором
+    
+    Нативного batch API у провайдеров нет, поэтому окно накопления
+    запросов не используется - оно лишь добавило бы задержку.
+    """
+    
+    def __init__(self, llm_manager: LLMProviderManager, max_parallel: Optional[int] = None):
+        # Слабая ссылка: пул - значение в _POWERFUL_POOLS и не должен удерживать свой ключ
+        self._llm_manager_ref = weakref.ref(llm_manager)
+        self._semaphore = asyncio.Semaphore(max_parallel or MAX_PARALLEL_POWERFUL)
+        # ключ запроса -> [задача, число ожидающих]
+        self._inflight: Dict[Tuple, List[Any]] = {}
+    
+    async def submit(self, messages: List[LLMMessage], **kwargs):
+        """Выполняет generate(), присоединяясь к такому же запросу в полёте"""
+        key = (
+            tuple((m.role, m.content) for m in messages),
+            tuple(sorted(kwargs.items()))
+        )
+        entry = self._inflight.get(key)
+        if entry is None or entry[0].done():
+            task = asyncio.create_task(self._generate(self._llm_manager_ref(), messages, kwargs))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._forget(key, done))
+        
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общий вызов
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+    
+    def _forget(self, key: Tuple, task: asyncio.Task) -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+    
+    async def _generate(
+        self,
+        llm_manager: LLMProviderManager,
+        messages: List[LLMMessage],
+        kwargs: Dict[str, Any]
+    ):
+        async with self._semaphore:
+            return await llm_manager.generate(messages=messages, **kwargs)
+
+
+# Пулы мощного этапа, общие для всех процессоров одного менеджера
+_POWERFUL_POOLS: "weakref.WeakKeyDictionary[Any, _PowerfulRequestPool]" = weakref.WeakKeyDictionary()
+
+
+def _get_powerful_pool(llm_manager: LLMProviderManager) -> _PowerfulRequestPool:
+    """Пул мощного этапа для менеджера (создаётся при первом обращении)"""
+    pool = _POWERFUL_POOLS.get(llm_manager)
+    if pool is None:
+        pool = _POWERFUL_POOLS[llm_manager] = _PowerfulRequestPool(llm_manager)
+    return pool
+
+
+# Семафоры быстрого этапа, общие для всех процессоров одного менеджера
+_FAST_SEMAPHORES: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_fast_semaphore(llm_manager: LLMProviderManager) -> asyncio.Semaphore:
+    """Семафор быстрого этапа для менеджера (создаётся при первом обращении)"""
+    semaphore = _FAST_SEMAPHORES.get(llm_manager)
+    if semaphore is None:
+        semaphore = _FAST_SEMAPHORES[llm_manager] = asyncio.Semaphore(MAX_PARALLEL_FAST)
+    return semaphore
+
+
+# Прогрев мощной модели Ollama: модель загружается в память, пока идёт
+# быстрый этап, и остаётся там keep_alive провайдера (по умолчанию Ollama - 5m).
+# Повторный прогрев той же модели - не чаще раза в POWERFUL_WARMUP_INTERVAL
+POWERFUL_WARMUP_INTERVAL = 60.0
+# провайдер -> модель -> (время запуска, задача прогрева)
+_POWERFUL_WARMUPS: "weakref.WeakKeyDictionary[Any, Dict[str, Tuple[float, asyncio.Task]]]" = weakref.WeakKeyDictionary()
+
+
+class _JsonObjectScanner:
+    """
+    Находит конец первого JSON-объекта в потоке чанков.
+    
+    Скобки внутри строк (с учётом экранирования) не считаются.
+    """
+    
+    __slots__ = ("_parts", "_depth", "_in_string", "_escape")
+    
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, chunk: str) -> Optional[str]:
+        """Добавляет чанк; возвращает текст объекта, как только он закрыт."""
+        start = 0
+        if self._depth == 0:
+            start = chunk.find("{")
+            if start < 0:
+                return None
+        
+        for i in range(start, len(chunk)):
+            char = chunk[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    return "".join(self._parts)
+        
+        self._parts.append(chunk[start:])
+        return None
+    
+    @property
+    def text(self) -> str:
+        """Накопленный (возможно незакрытый) текст объекта"""
+        return "".join(self._parts)
+
+
 class TwoStageProcessor:
     """
     Двухэтапный процессор:
@@ -50,6 +336,22 @@ class TwoStageProcessor:
         ":34b", ":32b", ":27b", ":22b", ":14b", ":13b", ":12b", ":11b", ":8b", ":7b"
     ]
     
+    # Все паттерны уровня одним regex + ранг паттерна для выбора по приоритету
+    FAST_PATTERN_RE = re.compile("|".join(
+        re.escape(p) for p in sorted(FAST_MODEL_PATTERNS, key=len, reverse=True)
+    ))
+    FAST_PATTERN_RANK = {p: i for i, p in enumerate(FAST_MODEL_PATTERNS)}
+    POWERFUL_PATTERN_RE = re.compile("|".join(
+        re.escape(p) for p in sorted(POWERFUL_MODEL_PATTERNS, key=len, reverse=True)
+    ))
+    POWERFUL_PATTERN_RANK = {p: i for i, p in enumerate(POWERFUL_MODEL_PATTERNS)}
+    
+    # Уведомления о прогрессе: таймаут одного вызова callback и размер очереди,
+    # после которого промежуточные события схлопываются до последнего на этап
+    PROGRESS_CALLBACK_TIMEOUT = 1.0
+    PROGRESS_QUEUE_COALESCE_SIZE = 64
+    TERMINAL_STAGES = frozenset({ProcessingStage.COMPLETED, ProcessingStage.ERROR})
+    
     def __init__(
         self,
         llm_manager: Optional[LLMProviderManager] = None,
@@ -66,11 +368,16 @@ class TwoStageProcessor:
         """
         self.llm_manager = llm_manager
         self.progress_callback = progress_callback
+        # Тип callback фиксирован - определяем один раз, а не на каждое событие
+        self._progress_is_async = (
+            progress_callback is not None and asyncio.iscoroutinefunction(progress_callback)
+        )
         
         # Определяем провайдеры
         if llm_manager:
-            self.fast_provider = fast_provider or self._find_fast_provider()
-            self.powerful_provider = powerful_provider or self._find_powerful_provider()
+            default_fast, default_powerful = self._select_providers()
+            self.fast_provider = fast_provider or default_fast
+            self.powerful_provider = powerful_provider or default_powerful
         else:
             self.fast_provider = None
             self.powerful_provider = None
@@ -78,30 +385,44 @@ class TwoStageProcessor:
         # Кэш для моделей
         self._fast_model_cache: Optional[str] = None
         self._powerful_model_cache: Optional[str] = None
+        
+        # Очередь уведомлений: медленный callback (UI/WebSocket) не тормозит обработку
+        self._progress_queue: Optional[asyncio.Queue] = None
+        self._progress_worker_task: Optional[asyncio.Task] = None
+        
+        # Фоновые прогревы: храним ссылки, чтобы задачи не собрал GC
+        self._background_tasks: Set[asyncio.Task] = set()
     
-    def _find_fast_provider(self) -> Optional[str]:
-        """Находит быстрый провайдер"""
-        if not self.llm_manager:
-            return None
+    def _select_providers(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Выбирает провайдеры обоих этапов за один проход: (быстрый, мощный).
         
-        # Приоритет: ollama (локальные модели быстрее)
-        if "ollama" in self.llm_manager.providers:
-            return "ollama"
-        elif self.llm_manager.providers:
-            return list(self.llm_manager.providers.keys())[0]
-        return None
+        Приоритет у ollama: локальные модели быстрее на первом этапе
+        и могут быть более мощными на втором.
+        """
+        providers = self.llm_manager.providers
+        provider = "ollama" if "ollama" in providers else next(iter(providers), None)
+        return provider, provider
     
-    def _find_powerful_provider(self) -> Optional[str]:
-        """Находит мощный провайдер"""
-        if not self.llm_manager:
-            return None
+    @staticmethod
+    def _best_pattern_match(
+        models: List[Dict[str, Any]],
+        pattern_re: "re.Pattern[str]",
+        ranks: Dict[str, int]
+    ) -> Optional[str]:
+        """
+        Модель с самым приоритетным паттерном в имени (при равенстве - первая в списке).
         
-        # Приоритет: ollama (может использовать более мощные модели)
-        if "ollama" in self.llm_manager.providers:
-            return "ollama"
-        elif self.llm_manager.providers:
-            return list(self.llm_manager.providers.keys())[0]
-        return None
+        Один проход regex по каждому имени вместо вложенного цикла паттерн × модель.
+        """
+        best_name, best_rank = None, len(ranks)
+        for model in models:
+            name = model.get("name", "")
+            for match in pattern_re.finditer(name.lower()):
+                rank = ranks[match.group()]
+                if rank < best_rank:
+                    best_name, best_rank = name, rank
+        return best_name
     
     async def _get_fast_model(self) -> Optional[str]:
         """Находит быструю модель для первого этапа обработки"""
@@ -116,26 +437,26 @@ class TwoStageProcessor:
             if not ollama_provider:
                 return None
             
-            available_models = await ollama_provider.list_models()
+            available_models = await _list_models_cached("ollama", ollama_provider)
             if not available_models:
                 return None
             
             # Ищем маленькую модель по паттернам
-            for pattern in self.FAST_MODEL_PATTERNS:
-                for model in available_models:
-                    name = model.get("name", "").lower()
-                    if pattern in name:
-                        self._fast_model_cache = model.get("name")
-                        logger.info(f"TwoStageProcessor: found fast model: {self._fast_model_cache}")
-                        return self._fast_model_cache
+            best = self._best_pattern_match(available_models, self.FAST_PATTERN_RE, self.FAST_PATTERN_RANK)
+            if best:
+                self._fast_model_cache = best
+                logger.info(f"TwoStageProcessor: found fast model: {self._fast_model_cache}")
+                return self._fast_model_cache
             
             # Ищем по размеру < 10GB
-            for model in available_models:
-                size = model.get("size", 0)
-                if size and size < 10 * 1024 * 1024 * 1024:
-                    self._fast_model_cache = model.get("name")
-                    logger.info(f"TwoStageProcessor: found small model by size: {self._fast_model_cache}")
-                    return self._fast_model_cache
+            small_model = next(
+                (m.get("name") for m in available_models if 0 < (m.get("size") or 0) < SMALL_MODEL_MAX_SIZE),
+                None
+            )
+            if small_model:
+                self._fast_model_cache = small_model
+                logger.info(f"TwoStageProcessor: found small model by size: {self._fast_model_cache}")
+                return self._fast_model_cache
             
             return None
         except Exception as e:
@@ -155,30 +476,21 @@ class TwoStageProcessor:
             if not ollama_provider:
                 return None
             
-            available_models = await ollama_provider.list_models()
+            available_models = await _list_models_cached("ollama", ollama_provider)
             if not available_models:
                 return None
             
             # Ищем большую модель по паттернам (от самых больших)
-            for pattern in self.POWERFUL_MODEL_PATTERNS:
-                for model in available_models:
-                    name = model.get("name", "").lower()
-                    if pattern in name:
-                        self._powerful_model_cache = model.get("name")
-                        logger.info(f"TwoStageProcessor: found powerful model: {self._powerful_model_cache}")
-                        return self._powerful_model_cache
-            
-            # Ищем по размеру > 15GB
-            largest_model = None
-            largest_size = 0
-            for model in available_models:
-                size = model.get("size", 0)
-                if size and size > largest_size:
-                    largest_size = size
-                    largest_model = model.get("name")
+            best = self._best_pattern_match(available_models, self.POWERFUL_PATTERN_RE, self.POWERFUL_PATTERN_RANK)
+            if best:
+                self._powerful_model_cache = best
+                logger.info(f"TwoStageProcessor: found powerful model: {self._powerful_model_cache}")
+                return self._powerful_model_cache
             
-            if largest_model:
-                self._powerful_model_cache = largest_model
+            # Берём самую большую модель
+            largest = max(available_models, key=lambda m: m.get("size") or 0)
+            if largest.get("size") and largest.get("name"):
+                self._powerful_model_cache = largest["name"]
                 logger.info(f"TwoStageProcessor: using largest model: {self._powerful_model_cache}")
                 return self._powerful_model_cache
             
@@ -211,12 +523,20 @@ class TwoStageProcessor:
                 error="LLM manager недоступен"
             )
         
+        if powerful_processing is None and self.powerful_provider == "ollama":
+            # Мощная модель загружается, пока идёт быстрый этап.
+            # Свой мощный этап выбирает модель сам - чужую модель не загружаем
+            warmup = asyncio.create_task(self._warm_powerful_model())
+            self._background_tasks.add(warmup)
+            warmup.add_done_callback(self._background_tasks.discard)
+        
         try:
             # Этап 1: Быстрая предобработка
-            await self._notify_progress(ProcessingStage.FAST_PREPROCESSING, {
-                "message": "Анализирую задачу...",
-                "task": task[:100]
-            })
+            if self.progress_callback:
+                await self._notify_progress(ProcessingStage.FAST_PREPROCESSING, {
+                    "message": "Анализирую задачу...",
+                    "task": task[:100]
+                })
             
             fast_result = await self._fast_preprocessing(
                 task,
@@ -231,10 +551,11 @@ class TwoStageProcessor:
                 )
             
             # Этап 2: Мощная обработка
-            await self._notify_progress(ProcessingStage.POWERFUL_PROCESSING, {
-                "message": "Выполняю задачу...",
-                "analysis": fast_result
-            })
+            if self.progress_callback:
+                await self._notify_progress(ProcessingStage.POWERFUL_PROCESSING, {
+                    "message": "Выполняю задачу...",
+                    "analysis": fast_result
+                })
             
             powerful_result = await self._powerful_processing(
                 task,
@@ -275,6 +596,29 @@ class TwoStageProcessor:
                 error=str(e)
             )
     
+    async def _warm_powerful_model(self) -> None:
+        """Загружает мощную модель Ollama в память (один прогрев на модель)"""
+        try:
+            provider = self.llm_manager.providers.get("ollama")
+            if provider is None or not hasattr(provider, "warm_model"):
+                return
+            model = await self._get_powerful_model()
+            if not model:
+                return
+            
+            warmups = _POWERFUL_WARMUPS.setdefault(provider, {})
+            entry = warmups.get(model)
+            if entry is None or time.monotonic() - entry[0] > POWERFUL_WARMUP_INTERVAL:
+                task = asyncio.create_task(provider.warm_model(model))
+                entry = warmups[model] = (time.monotonic(), task)
+            
+            if not await entry[1]:
+                # Неудачный прогрев повторим при следующем запросе
+                if warmups.get(model) is entry:
+                    del warmups[model]
+        except Exception as e:
+            logger.debug(f"Powerful model warm-up failed: {e}")
+    
     async def _fast_preprocessing(
         self,
         task: str,
@@ -291,64 +635,52 @@ class TwoStageProcessor:
                 "complexity": "medium"
             }
         
+        cache_key = _analysis_cache_key(self.fast_provider, task)
+        cached = _ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            _ANALYSIS_CACHE.move_to_end(cache_key)
+            return dict(cached)
+        
         # Находим быструю модель
         fast_model = await self._get_fast_model()
         
-        # Стандартный анализ задачи
-        prompt = f"""Проанализируй задачу и определи:
-1. Тип задачи (coding, analysis, question, etc.)
-2. Сложность (simple, medium, complex)
-3. Ключевые требования
-4. Рекомендуемый подход
-
-Задача: {task}
-
-Ответ в формате JSON:
-{{
-    "task_type": "тип",
-    "complexity": "сложность",
-    "requirements": ["требование1", "требование2"],
-    "approach": "краткое описание подхода"
-}}"""
-        
         try:
+            # Стандартный анализ задачи
             messages = [
-                LLMMessage(role="system", content="Ты - эксперт по анализу задач. Отвечай только в формате JSON."),
-                LLMMessage(role="user", content=prompt)
+                _FAST_SYSTEM_MSG,
+                LLMMessage(role="user", content=_FAST_PROMPT_TEMPLATE.format(task=task))
             ]
             
             # Генерируем с указанием быстрой модели (если найдена)
             generation_kwargs = {
                 "messages": messages,
                 "provider_name": self.fast_provider,
-                "temperature": 0.2,
-                "max_tokens": 300
+                "temperature": 0.0,
+                "max_tokens": FAST_STAGE_MAX_TOKENS
             }
             if fast_model:
                 generation_kwargs["model"] = fast_model
                 logger.debug(f"Using fast model for preprocessing: {fast_model}")
             
-            response = await asyncio.wait_for(
-                self.llm_manager.generate(**generation_kwargs),
+            content, exact = await asyncio.wait_for(
+                self._generate_fast_analysis(generation_kwargs),
                 timeout=5.0  # Быстрая модель должна отвечать быстро
             )
             
-            if response and response.content:
-                # Парсим JSON из ответа
-                import json
-                content = response.content.strip()
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                
-                if json_start >= 0 and json_end > json_start:
-                    analysis = json.loads(content[json_start:json_end])
-                    return {
+            if content:
+                analysis = _parse_first_json_object(content, exact)
+                if isinstance(analysis, dict):
+                    result = {
                         "task_type": analysis.get("task_type", "unknown"),
                         "complexity": analysis.get("complexity", "medium"),
                         "requirements": analysis.get("requirements", []),
                         "approach": analysis.get("approach", ""),
                         "provider": self.fast_provider
                     }
+                    _ANALYSIS_CACHE[cache_key] = result
+                    if len(_ANALYSIS_CACHE) > ANALYSIS_CACHE_MAX_ENTRIES:
+                        _ANALYSIS_CACHE.popitem(last=False)
+                    return dict(result)
             
             return {
                 "task_type": "unknown",
@@ -366,6 +698,50 @@ class TwoStageProcessor:
                 "complexity": "medium"
             }
     
+    async def _generate_fast_analysis(self, generation_kwargs: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        Получает ответ быстрой модели: (текст, текст - ровно один JSON-объект).
+        
+        Если провайдер умеет stream, генерация обрывается сразу после
+        закрытия JSON-объекта - хвост ответа не генерируется.
+        """
+        provider = self.llm_manager.providers.get(self.fast_provider)
+        async with _get_fast_semaphore(self.llm_manager):
+            if getattr(provider, "stream", None) is not None:
+                try:
+                    content, exact = await self._stream_first_json(provider, generation_kwargs)
+                    if content:
+                        return content, exact
+                except Exception as e:
+                    logger.debug(f"Fast stage streaming failed, using generate: {e}")
+            
+            response = await self.llm_manager.generate(**generation_kwargs)
+            return (response.content if response else None), False
+    
+    @staticmethod
+    async def _stream_first_json(provider, generation_kwargs: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        Читает stream до конца первого JSON-объекта и закрывает его.
+        
+        Возвращает (текст, объект закрыт): незакрытый текст - не ровно один объект.
+        """
+        scanner = _JsonObjectScanner()
+        stream = provider.stream(
+            messages=generation_kwargs["messages"],
+            model=generation_kwargs.get("model"),
+            temperature=generation_kwargs["temperature"],
+            max_tokens=generation_kwargs["max_tokens"]
+        )
+        try:
+            async for chunk in stream:
+                obj = scanner.feed(chunk)
+                if obj is not None:
+                    return obj, True
+        finally:
+            # Закрытие генератора закрывает HTTP-stream и останавливает генерацию
+            await stream.aclose()
+        return scanner.text or None, False
+    
     async def _powerful_processing(
         self,
         task: str,
@@ -383,38 +759,46 @@ class TwoStageProcessor:
             }
         
         # Формируем промпт с учетом анализа быстрой модели
-        prompt = f"""На основе анализа задачи выполни её.
-
-Анализ задачи:
-- Тип: {fast_analysis.get('task_type', 'unknown')}
-- Сложность: {fast_analysis.get('complexity', 'medium')}
-- Требования: {', '.join(fast_analysis.get('requirements', []))}
-- Подход: {fast_analysis.get('approach', '')}
-
-Задача: {task}
-
-Выполни задачу и предоставь результат."""
+        prompt = _POWERFUL_PROMPT_TEMPLATE.format_map({
+            "task_type": fast_analysis.get("task_type", "unknown"),
+            "complexity": fast_analysis.get("complexity", "medium"),
+            "requirements": ", ".join(map(str, fast_analysis.get("requirements") or ())),
+            "approach": fast_analysis.get("approach", ""),
+            "task": task
+        })
+        
+        complexity = fast_analysis.get("complexity", "medium")
+        max_tokens = POWERFUL_MAX_TOKENS_BY_COMPLEXITY.get(complexity, POWERFUL_DEFAULT_MAX_TOKENS)
         
         try:
             messages = [
-                LLMMessage(role="system", content="Ты - опытный AI ассистент. Выполняй задачи качественно и полностью."),
+                _POWERFUL_SYSTEM_MSG,
                 LLMMessage(role="user", content=prompt)
             ]
             
+            if complexity in FAST_TIER_COMPLEXITIES and self.fast_provider:
+                # Простую задачу отдаём быстрой модели
+                provider_name, model = self.fast_provider, await self._get_fast_model()
+            else:
+                provider_name, model = self.powerful_provider, await self._get_powerful_model()
+            
+            generation_kwargs = {
+                "provider_name": provider_name,
+                "temperature": 0.7,
+                "max_tokens": max_tokens
+            }
+            if model:
+                generation_kwargs["model"] = model
+            
             response = await asyncio.wait_for(
-                self.llm_manager.generate(
-                    messages=messages,
-                    provider_name=self.powerful_provider,
-                    temperature=0.7,
-                    max_tokens=2000
-                ),
+                _get_powerful_pool(self.llm_manager).submit(messages=messages, **generation_kwargs),
                 timeout=120.0  # Мощная модель может работать дольше
             )
             
             if response and response.content:
                 return {
                     "result": response.content,
-                    "provider": self.powerful_provider,
+                    "provider": generation_kwargs["provider_name"],
                     "analysis_used": fast_analysis
                 }
             
@@ -431,13 +815,60 @@ class TwoStageProcessor:
             }
     
     async def _notify_progress(self, stage: ProcessingStage, data: Dict[str, Any]):
-        """Уведомляет о прогрессе обработки"""
-        if self.progress_callback:
+        """
+        Ставит уведомление о прогрессе в очередь и сразу возвращается.
+        
+        Callback вызывается фоновой задачей, поэтому его задержки
+        не влияют на обработку.
+        """
+        if not self.progress_callback:
+            return
+        
+        if self._progress_queue is None:
+            self._progress_queue = asyncio.Queue()
+        if self._progress_queue.qsize() >= self.PROGRESS_QUEUE_COALESCE_SIZE:
+            self._coalesce_progress_queue()
+        self._progress_queue.put_nowait((stage, data))
+        
+        if self._progress_worker_task is None or self._progress_worker_task.done():
+            self._progress_worker_task = asyncio.create_task(self._progress_worker())
+    
+    def _coalesce_progress_queue(self):
+        """Оставляет в очереди последнее событие каждого этапа и все финальные"""
+        events = []
+        while not self._progress_queue.empty():
+            events.append(self._progress_queue.get_nowait())
+        
+        latest = {}
+        for index, (stage, _) in enumerate(events):
+            if stage not in self.TERMINAL_STAGES:
+                latest[stage] = index
+        
+        for index, (stage, data) in enumerate(events):
+            if stage in self.TERMINAL_STAGES or latest[stage] == index:
+                self._progress_queue.put_nowait((stage, data))
+    
+    async def _progress_worker(self):
+        """Доставляет уведомления из очереди; завершается, когда очередь пуста"""
+        while not self._progress_queue.empty():
+            stage, data = self._progress_queue.get_nowait()
             try:
-                if asyncio.iscoroutinefunction(self.progress_callback):
-                    await self.progress_callback(stage, data)
+                if self._progress_is_async:
+                    await asyncio.wait_for(
+                        self.progress_callback(stage, data),
+                        timeout=self.PROGRESS_CALLBACK_TIMEOUT
+                    )
                 else:
                     self.progress_callback(stage, data)
+            except asyncio.TimeoutError:
+                logger.warning(f"Progress callback timed out for stage {stage}")
             except Exception as e:
                 logger.warning(f"Progress callback error: {e}")
+    
+    async def aclose(self):
+        """Доставляет оставшиеся уведомления о прогрессе"""
+        task = self._progress_worker_task
+        self._progress_worker_task = None
+        if task is not None and not task.done():
+            await task
 
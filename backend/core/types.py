@@ -6,11 +6,11 @@
 """
 
 from dataclasses import dataclass, field
-from enum import Enum
-from typing import Dict, Any, Optional, List
+from enum import IntEnum, StrEnum
+from typing import Dict, Any, FrozenSet, Optional, List, Tuple
 
 
-class ComplexityLevel(Enum):
+class ComplexityLevel(StrEnum):
     """Уровни сложности задачи"""
     TRIVIAL = "trivial"          # Приветствия, простые вопросы (< 10 сек)
     SIMPLE = "simple"            # Простые задачи (10-30 сек)
@@ -20,14 +20,14 @@ class ComplexityLevel(Enum):
     EXTREME = "extreme"          # Экстремально сложные (30+ мин)
 
 
-class ModelTier(Enum):
+class ModelTier(StrEnum):
     """Уровни моделей по производительности"""
     FAST = "fast"        # Быстрые модели для простых задач
     BALANCED = "balanced"  # Сбалансированные модели
     POWERFUL = "powerful"  # Мощные модели для сложных задач
 
 
-class CostTier(Enum):
+class CostTier(IntEnum):
     """Уровни стоимости провайдеров"""
     FREE = 1        # Бесплатные (локальные Ollama)
     CHEAP = 2       # Дешёвые (GPT-3.5, Claude Haiku)
@@ -35,27 +35,29 @@ class CostTier(Enum):
     PREMIUM = 4     # Премиум (GPT-4, Claude Opus)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ProviderInfo:
-    """Информация о провайдере LLM"""
+    """Информация о провайдере LLM (неизменяемая, хэшируемая)"""
     name: str
     is_local: bool          # Локальный провайдер (Ollama)
     is_private: bool        # Данные не уходят наружу
     cost_tier: CostTier     # Уровень стоимости
-    models_cost_map: Dict[str, CostTier] = field(default_factory=dict)  # Стоимость по моделям
+    models_cost_map: Dict[str, CostTier] = field(default_factory=dict, hash=False)  # Стоимость по моделям
     
     def get_model_cost(self, model: str) -> CostTier:
         """Получить стоимость конкретной модели"""
         return self.models_cost_map.get(model, self.cost_tier)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RoutingPolicy:
     """
     Политика маршрутизации моделей.
     
     Позволяет контролировать выбор модели по трилемме:
     cost (стоимость) / quality (качество) / privacy (приватность)
+    
+    Неизменяемая и хэшируемая: списки провайдеров хранятся кортежами.
     """
     # Приватность
     prefer_local: bool = True           # Предпочитать локальные модели
@@ -70,8 +72,51 @@ class RoutingPolicy:
     prefer_quality: bool = True         # Предпочитать качество скорости
     
     # Дополнительно
-    allowed_providers: Optional[List[str]] = None  # Список разрешённых провайдеров
-    blocked_providers: Optional[List[str]] = None  # Список заблокированных провайдеров
+    allowed_providers: Optional[Tuple[str, ...]] = None  # Список разрешённых провайдеров
+    blocked_providers: Optional[Tuple[str, ...]] = None  # Список заблокированных провайдеров
+    
+    # Кэш to_dict(): политика неизменяема, словарь строится один раз
+    _dict_cache: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False, hash=False
+    )
+    # Множества для O(1) проверки в allows_provider (None - ограничения нет)
+    _allowed_set: Optional[FrozenSet[str]] = field(
+        default=None, init=False, repr=False, compare=False, hash=False
+    )
+    _blocked_set: Optional[FrozenSet[str]] = field(
+        default=None, init=False, repr=False, compare=False, hash=False
+    )
+    # Хэш считается один раз: политика - ключ кэшей роутера на каждый выбор
+    _hash: int = field(default=0, init=False, repr=False, compare=False, hash=False)
+    
+    def __post_init__(self):
+        # Списки из конфига/API приводим к кортежам (frozen - через object.__setattr__)
+        for name in ("allowed_providers", "blocked_providers"):
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, tuple):
+                object.__setattr__(self, name, tuple(value))
+        # Пустой список, как и раньше, означает отсутствие ограничения
+        if self.allowed_providers:
+            object.__setattr__(self, "_allowed_set", frozenset(self.allowed_providers))
+        if self.blocked_providers:
+            object.__setattr__(self, "_blocked_set", frozenset(self.blocked_providers))
+        object.__setattr__(self, "_hash", hash(self.to_hashable()))
+    
+    def __hash__(self) -> int:
+        return self._hash
+    
+    def to_hashable(self) -> Tuple[Any, ...]:
+        """Каноническая форма политики (для ключей кэшей и сравнения)"""
+        return (
+            self.prefer_local,
+            self.require_private,
+            int(self.max_cost_tier),
+            self.prefer_cheap,
+            self.min_quality,
+            self.prefer_quality,
+            self.allowed_providers,
+            self.blocked_providers,
+        )
     
     def allows_provider(self, provider_info: "ProviderInfo") -> bool:
         """Проверяет, разрешён ли провайдер политикой"""
@@ -80,27 +125,33 @@ class RoutingPolicy:
             return False
         
         # Проверка стоимости
-        if provider_info.cost_tier.value > self.max_cost_tier.value:
+        if provider_info.cost_tier > self.max_cost_tier:
             return False
         
         # Проверка списков
-        if self.allowed_providers and provider_info.name not in self.allowed_providers:
+        if self._allowed_set is not None and provider_info.name not in self._allowed_set:
             return False
-        if self.blocked_providers and provider_info.name in self.blocked_providers:
+        if self._blocked_set is not None and provider_info.name in self._blocked_set:
             return False
         
         return True
     
     def to_dict(self) -> Dict[str, Any]:
+        if self._dict_cache is None:
+            object.__setattr__(self, "_dict_cache", self._build_dict())
+        # Копия: вызывающий код может менять словарь
+        return dict(self._dict_cache)
+    
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             "prefer_local": self.prefer_local,
             "require_private": self.require_private,
-            "max_cost_tier": self.max_cost_tier.value,
+            "max_cost_tier": self.max_cost_tier,
             "prefer_cheap": self.prefer_cheap,
             "min_quality": self.min_quality,
             "prefer_quality": self.prefer_quality,
-            "allowed_providers": self.allowed_providers,
-            "blocked_providers": self.blocked_providers,
+            "allowed_providers": list(self.allowed_providers) if self.allowed_providers is not None else None,
+            "blocked_providers": list(self.blocked_providers) if self.blocked_providers is not None else None,
         }
     
     @classmethod
@@ -124,7 +175,7 @@ class RoutingPolicy:
         return cls(prefer_local=True, prefer_quality=True, max_cost_tier=CostTier.STANDARD)
 
 
-@dataclass
+@dataclass(slots=True)
 class ComplexityResult:
     """Результат анализа сложности"""
     level: ComplexityLevel
@@ -139,10 +190,10 @@ class ComplexityResult:
     
     def to_dict(self) -> Dict[str, Any]:
         return {
-            "level": self.level.value,
+            "level": self.level,
             "score": self.score,
             "estimated_minutes": self.estimated_minutes,
-            "recommended_tier": self.recommended_tier.value,
+            "recommended_tier": self.recommended_tier,
             "recommended_temperature": self.recommended_temperature,
             "recommended_max_tokens": self.recommended_max_tokens,
             "factors": self.factors,
@@ -151,7 +202,7 @@ class ComplexityResult:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelSelection:
     """Результат выбора модели"""
     model: str
@@ -166,7 +217,7 @@ class ModelSelection:
         return {
             "model": self.model,
             "provider": self.provider,
-            "tier": self.tier.value,
+            "tier": self.tier,
             "server_url": self.server_url,
             "score": self.score,
             "reason": self.reason,
@@ -32,18 +32,37 @@ UnifiedModelRouter - Единая точка входа для выбора мо
     )
 """
 
+import asyncio
+import hashlib
+import re
+import threading
+from bisect import bisect_right
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, List, Tuple
+
+import httpx
 
 from .logger import get_logger
-from .types import ModelTier, CostTier, ProviderInfo, RoutingPolicy
+from .types import ModelTier, CostTier, ComplexityResult, ProviderInfo, RoutingPolicy
 from .task_complexity_service import get_complexity_service
 from .intelligent_model_router import IntelligentModelRouter, ScoredModel, ModelCapability
 from .model_performance_tracker import get_performance_tracker
 
 logger = get_logger(__name__)
 
+# Адреса облачных API по умолчанию (для проверки доступности)
+CLOUD_DEFAULT_URLS: Dict[str, str] = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+}
+
+# Пустой неизменяемый конфиг провайдера (без нового dict на каждый промах)
+_EMPTY_CONFIG: Mapping[str, Any] = MappingProxyType({})
+
 
 # Предопределённая информация о провайдерах
 PROVIDER_INFO: Dict[str, ProviderInfo] = {
@@ -83,9 +102,19 @@ PROVIDER_INFO: Dict[str, ProviderInfo] = {
 }
 
 
-@dataclass
+# Оценки для явно запрошенной модели (скоринг не выполняется)
+PREFERRED_MODEL_SCORES: Dict[str, float] = {
+    "total": 1.0,
+    "capability": 1.0,
+    "performance": 1.0,
+    "speed": 1.0,
+    "quality": 1.0,
+}
+
+
+@dataclass(slots=True, frozen=True)
 class UnifiedModelSelection:
-    """Результат унифицированного выбора модели"""
+    """Результат унифицированного выбора модели (неизменяемый)"""
     model: str
     server_url: str
     server_name: str
@@ -114,7 +143,18 @@ class UnifiedModelSelection:
     cost_tier: CostTier = CostTier.FREE
     policy_applied: Optional[RoutingPolicy] = None
     
+    # Кэш to_dict(): выбор неизменяем, словарь строится один раз
+    _dict_cache: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
     def to_dict(self) -> Dict[str, Any]:
+        if self._dict_cache is None:
+            object.__setattr__(self, "_dict_cache", self._build_dict())
+        # Копия: вызывающий код может менять словарь
+        return dict(self._dict_cache)
+    
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             "model": self.model,
             "server_url": self.server_url,
@@ -130,7 +170,7 @@ class UnifiedModelSelection:
             },
             "complexity_level": self.complexity_level,
             "reason": self.reason,
-            "fallback_models": self.fallback_models,
+            "fallback_models": list(self.fallback_models),
             "recommended_temperature": self.recommended_temperature,
             "recommended_max_tokens": self.recommended_max_tokens,
             # Новые поля
@@ -174,8 +214,58 @@ class UnifiedModelRouter(IModelRouter):
     - RoutingPolicy для контроля cost/quality/privacy
     """
     
+    # LRU кэш выборов: повторные и шаблонные задачи (ретраи, циклы агентов)
+    # обходят анализ сложности, скоринг провайдеров и поиск fallback
+    SELECTION_CACHE_MAX_ENTRIES = 4096
+    SELECTION_CACHE_TTL = 300.0
+    PROVIDER_ORDER_CACHE_MAX_ENTRIES = 256
+    COMPLEXITY_CACHE_MAX_ENTRIES = 2048
+    
+    # Кэш fallback-списков: рейтинг моделей меняется медленно
+    FALLBACK_CACHE_MAX_ENTRIES = 512
+    FALLBACK_CACHE_TTL = 60.0
+    
+    # Проверка доступности облачных провайдеров при старте
+    CLOUD_PROBE_TIMEOUT = 3.0
+    CLOUD_HEALTH_TTL = 300.0
+    
+    # Классы сложности для корректировки tier, температуры и выбора облачной модели
+    HARD_COMPLEXITIES = frozenset({"complex", "very_complex", "extreme"})
+    EASY_COMPLEXITIES = frozenset({"trivial", "simple"})
+    
+    # Ключевые слова типов задач в порядке приоритета (поиск подстрок)
+    TASK_TYPE_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+        ("code", (
+            "код", "code", "функци", "класс", "python", "javascript",
+            "напиши", "создай", "сгенерируй", "игра", "game", "приложение"
+        )),
+        ("analysis", ("проанализируй", "анализ", "analyze", "изучи", "сравни")),
+        ("research", ("исследуй", "research", "найди информацию", "что такое")),
+        ("reasoning", ("объясни", "почему", "как работает", "логик")),
+        ("simple_chat", ("привет", "здравствуй", "hello", "hi", "как дела")),
+    )
+    # Группа на тип внутри lookahead: находятся и перекрывающиеся совпадения,
+    # поэтому результат совпадает с последовательными проверками по типам
+    TASK_TYPE_RE = re.compile(
+        "(?=" + "|".join(
+            f"(?P<{task_type}>{'|'.join(map(re.escape, keywords))})"
+            for task_type, keywords in TASK_TYPE_KEYWORDS
+        ) + ")",
+        re.IGNORECASE
+    )
+    TASK_TYPE_RANK = {task_type: i for i, (task_type, _) in enumerate(TASK_TYPE_KEYWORDS)}
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        # Разделы конфига извлекаются один раз, а не цепочкой .get() на каждый выбор
+        self._llm_cfg: Mapping[str, Any] = config.get("llm") or _EMPTY_CONFIG
+        self._providers_cfg: Mapping[str, Mapping[str, Any]] = self._llm_cfg.get("providers") or _EMPTY_CONFIG
+        self._provider_urls: Dict[str, str] = {
+            name: cfg.get("base_url") or "" for name, cfg in self._providers_cfg.items()
+        }
+        self._provider_default_model: Dict[str, str] = {
+            name: cfg.get("default_model") or "" for name, cfg in self._providers_cfg.items()
+        }
         self.complexity_service = get_complexity_service()
         self.performance_tracker = get_performance_tracker()
         
@@ -184,6 +274,8 @@ class UnifiedModelRouter(IModelRouter):
         
         # Информация о провайдерах
         self._providers = PROVIDER_INFO.copy()
+        # Порядок провайдеров для политики: политика -> [(имя, информация)] по убыванию приоритета
+        self._provider_order_cache: Dict[RoutingPolicy, List[Tuple[str, ProviderInfo]]] = {}
         self._load_provider_config()
         
         # Загружаем политику по умолчанию из конфига
@@ -211,28 +303,84 @@ class UnifiedModelRouter(IModelRouter):
             "very_complex": 4000,
             "extreme": 6000,
         }
+        # (тип задачи, сложность) -> (температура, токены): корректировка по
+        # сложности применяется один раз, а не на каждый выбор
+        self._params: Dict[Tuple[str, str], Tuple[float, int]] = {
+            (task_type, complexity): (
+                self._get_optimal_temperature(task_type, complexity),
+                self._get_optimal_max_tokens(complexity),
+            )
+            for task_type in self._temperature_map
+            for complexity in self._tokens_map
+        }
+        
+        # Доступность облачных провайдеров: имя -> (доступен, истекает в)
+        self._provider_health: Dict[str, Tuple[bool, float]] = {}
+        # (модель, провайдер, тип задачи, сложность, политика) -> (время, fallback модели)
+        self._fallback_cache: "OrderedDict[Tuple, Tuple[float, List[str]]]" = OrderedDict()
+        # (хэш задачи, тип задачи) -> результат анализа сложности
+        self._complexity_cache: "OrderedDict[Tuple[bytes, Optional[str]], ComplexityResult]" = OrderedDict()
+        # ключ выбора -> (время выбора, выбор)
+        self._selection_cache: "OrderedDict[Tuple, Tuple[float, UnifiedModelSelection]]" = OrderedDict()
         
         self._initialized = False
+        # asyncio.Lock создаётся лениво внутри event loop
+        self._initialize_lock: Optional[asyncio.Lock] = None
+        self._initialize_lock_guard = threading.Lock()
+    
+    def _get_initialize_lock(self) -> asyncio.Lock:
+        """Ленивое создание блокировки инициализации (потокобезопасно)"""
+        with self._initialize_lock_guard:
+            if self._initialize_lock is None:
+                self._initialize_lock = asyncio.Lock()
+        return self._initialize_lock
     
     def _load_provider_config(self) -> None:
         """Загружает кастомные настройки провайдеров из конфига"""
-        llm_config = self.config.get("llm", {})
-        providers_config = llm_config.get("providers", {})
+        self.invalidate_provider_cache()
         
-        for provider_name, provider_cfg in providers_config.items():
+        for provider_name, provider_cfg in self._providers_cfg.items():
             if provider_name in self._providers:
                 # Обновляем cost_tier если указан в конфиге
                 if "cost_tier" in provider_cfg:
                     try:
                         tier = CostTier(provider_cfg["cost_tier"])
-                        self._providers[provider_name].cost_tier = tier
+                        # ProviderInfo неизменяем (и общий с PROVIDER_INFO) - создаём копию
+                        self._providers[provider_name] = replace(self._providers[provider_name], cost_tier=tier)
                     except ValueError:
                         pass
+        
+        # Индексы моделей по (провайдер, максимальная стоимость): карты стоимости
+        # статичны, а tier всего 4 - выбор облачной модели сводится к поиску в dict
+        self._cheapest_under: Dict[Tuple[str, CostTier], str] = {}
+        self._strongest_under: Dict[Tuple[str, CostTier], str] = {}
+        # Парето-фронт (стоимость, качество) по провайдеру: отдельных оценок качества
+        # облачных моделей нет, поэтому качество внутри провайдера растёт со стоимостью
+        # и фронт - по одной модели на каждый tier в порядке возрастания стоимости
+        self._cost_frontier: Dict[str, List[Tuple[CostTier, str]]] = {}
+        # Плоская таблица стоимости моделей: (провайдер, модель) -> tier
+        self._model_costs: Dict[Tuple[str, str], CostTier] = {}
+        for provider_name, info in self._providers.items():
+            frontier: Dict[CostTier, str] = {}
+            for model, tier in info.models_cost_map.items():
+                self._model_costs[(provider_name, model)] = tier
+                # При равной стоимости сохраняется первая модель из карты
+                frontier.setdefault(tier, model)
+            points = sorted(frontier.items())
+            self._cost_frontier[provider_name] = points
+            tiers = [tier for tier, _ in points]
+            for max_tier in CostTier:
+                # PREMIUM не считается дешёвой моделью
+                if points and tiers[0] < CostTier.PREMIUM and tiers[0] <= max_tier:
+                    self._cheapest_under[(provider_name, max_tier)] = points[0][1]
+                # Самая сильная модель в пределах лимита - правая точка фронта
+                best = bisect_right(tiers, max_tier) - 1
+                if best >= 0:
+                    self._strongest_under[(provider_name, max_tier)] = points[best][1]
     
     def _load_default_policy(self) -> RoutingPolicy:
         """Загружает политику маршрутизации по умолчанию из конфига"""
-        llm_config = self.config.get("llm", {})
-        policy_config = llm_config.get("routing_policy", {})
+        policy_config = self._llm_cfg.get("routing_policy", {})
         
         if not policy_config:
             # Политика по умолчанию если не указана в конфиге
@@ -257,6 +405,14 @@ class UnifiedModelRouter(IModelRouter):
             blocked_providers=policy_config.get("blocked_providers"),
         )
     
+    def _provider_base_url(self, provider_name: str) -> str:
+        """base_url провайдера из конфига (пустая строка, если не задан)"""
+        return self._provider_urls.get(provider_name, "")
+    
+    def _provider_cfg(self, provider_name: str) -> Mapping[str, Any]:
+        """Конфиг провайдера (пустой, если провайдер не настроен)"""
+        return self._providers_cfg.get(provider_name) or _EMPTY_CONFIG
+    
     def get_provider_info(self, provider_name: str) -> ProviderInfo:
         """Получить информацию о провайдере"""
         return self._providers.get(
@@ -274,10 +430,54 @@ class UnifiedModelRouter(IModelRouter):
         if self._initialized:
             return
         
-        await self.intelligent_router.discover_servers()
+        # Параллельные первые запросы не должны запускать discovery дважды
+        async with self._get_initialize_lock():
+            if self._initialized:
+                return
+            await self._initialize()
+    
+    async def _initialize(self) -> None:
+        """Поиск серверов и проверка провайдеров (вызывается под блокировкой)"""
+        # Поиск серверов Ollama и проверка облачных провайдеров идут параллельно
+        cloud_providers = [
+            name for name, info in self._providers.items()
+            if not info.is_local and self._provider_cfg(name).get("enabled", False)
+        ]
+        async with httpx.AsyncClient(timeout=self.CLOUD_PROBE_TIMEOUT) as client:
+            results = await asyncio.gather(
+                self.intelligent_router.discover_servers(),
+                *(self._probe_cloud(name, client) for name in cloud_providers),
+                return_exceptions=True
+            )
+        if isinstance(results[0], BaseException):
+            raise results[0]
+        
+        self._selection_cache.clear()
+        self._complexity_cache.clear()
+        self.invalidate_fallbacks()
         self._initialized = True
         logger.info("UnifiedModelRouter initialized")
     
+    async def _probe_cloud(self, name: str, client: httpx.AsyncClient) -> bool:
+        """Проверяет доступность облачного API (любой HTTP ответ - доступен)"""
+        url = self._provider_base_url(name) or CLOUD_DEFAULT_URLS.get(name, "")
+        healthy = False
+        if url:
+            try:
+                await client.get(url)
+                healthy = True
+            except httpx.HTTPError as e:
+                logger.debug(f"Cloud provider {name} unreachable: {e}")
+        self._provider_health[name] = (healthy, time.monotonic() + self.CLOUD_HEALTH_TTL)
+        return healthy
+    
+    def _is_provider_healthy(self, name: str) -> Optional[bool]:
+        """Результат последней проверки (None - не проверялся или устарел)"""
+        health = self._provider_health.get(name)
+        if health is None or time.monotonic() > health[1]:
+            return None
+        return health[0]
+    
     async def select_model(
         self,
         task: str,
@@ -294,7 +494,8 @@ class UnifiedModelRouter(IModelRouter):
             task: Текст задачи
             task_type: Тип задачи (code, chat, research, analysis, etc.)
             complexity: Сложность (trivial, simple, moderate, complex, very_complex, extreme)
-            preferred_model: Предпочитаемая модель (если есть)
+            preferred_model: Предпочитаемая модель ("provider:model" или модель Ollama);
+                если доступна и разрешена политикой - выбирается без скоринга
             quality_requirement: Требование к качеству (fast, balanced, high)
             policy: Политика маршрутизации (cost/quality/privacy)
             
@@ -307,66 +508,74 @@ class UnifiedModelRouter(IModelRouter):
         # Используем политику по умолчанию если не указана
         effective_policy = policy or self.DEFAULT_POLICY
         
+        cache_key = (
+            self._normalized_task_digest(task),
+            task_type, complexity, preferred_model, quality_requirement, effective_policy
+        )
+        cached = self._selection_cache.get(cache_key)
+        if cached is not None:
+            if time.monotonic() - cached[0] < self.SELECTION_CACHE_TTL:
+                self._selection_cache.move_to_end(cache_key)
+                return replace(cached[1], fallback_models=list(cached[1].fallback_models))
+            del self._selection_cache[cache_key]
+        
         # 1. Анализируем сложность через единый сервис
         if not complexity:
-            complexity_result = self.complexity_service.analyze(task, task_type=task_type)
-            complexity = complexity_result.level.value
-        else:
-            self._tokens_map.get(complexity, 2000) / 50  # ~50 tokens/sec
+            complexity = self._analyze_complexity(task, task_type).level.value
         
         # 2. Определяем тип задачи если не указан
         if not task_type:
             task_type = self._infer_task_type(task)
         
-        # 3. Определяем подходящего провайдера с учётом политики
-        provider, provider_info = self._select_provider_by_policy(effective_policy, task_type)
-        
-        # 4. Получаем выбор модели
-        try:
-            if provider == "ollama":
-                # Используем IntelligentModelRouter для локальных моделей
-                scored_model = await self.intelligent_router.select_model(
-                    task=task,
-                    task_type=task_type,
-                    complexity=complexity,
-                    preferred_model=preferred_model
-                )
-                model_name = scored_model.profile.name
-                server_url = scored_model.server_url
-                server_name = scored_model.server_name
-                scores = {
-                    "total": scored_model.total_score,
-                    "capability": scored_model.capability_score,
-                    "performance": scored_model.performance_score,
-                    "speed": scored_model.speed_score,
-                    "quality": scored_model.quality_score,
-                }
-                model_size = scored_model.profile.size_b
-            else:
-                # Для облачных провайдеров выбираем модель по стоимости/качеству
-                model_name, scores = self._select_cloud_model(
-                    provider, effective_policy, task_type, complexity
-                )
-                server_url = self.config.get("llm", {}).get("providers", {}).get(provider, {}).get("base_url", "")
-                server_name = provider
-                model_size = 100.0  # Облачные модели считаем большими
-        except ConnectionError as e:
-            # Если локальные недоступны и политика разрешает облако — fallback
-            if not effective_policy.require_private:
-                logger.warning(f"Local models unavailable, falling back to cloud: {e}")
-                provider, provider_info = self._get_fallback_cloud_provider(effective_policy)
-                if provider:
-                    model_name, scores = self._select_cloud_model(
+        # 3-4. Явно запрошенная модель важнее скоринга (если политика её разрешает)
+        preferred = self._resolve_preferred_model(preferred_model, effective_policy) if preferred_model else None
+        if preferred is not None:
+            provider, provider_info, model_name, server_url, server_name, model_size = preferred
+            scores = dict(PREFERRED_MODEL_SCORES)
+        else:
+            # 3. Определяем подходящего провайдера с учётом политики
+            provider, provider_info = self._select_provider_by_policy(effective_policy, task_type)
+        
+            # 4. Получаем выбор модели
+            try:
+                if provider == "ollama":
+                    # Используем IntelligentModelRouter для локальных моделей
+                    scored_model = await self.intelligent_router.select_model(
+                        task=task,
+                        task_type=task_type,
+                        complexity=complexity,
+                        preferred_model=preferred_model
+                    )
+                    model_name = scored_model.profile.name
+                    server_url = scored_model.server_url
+                    server_name = scored_model.server_name
+                    scores = {
+                        "total": scored_model.total_score,
+                        "capability": scored_model.capability_score,
+                        "performance": scored_model.performance_score,
+                        "speed": scored_model.speed_score,
+                        "quality": scored_model.quality_score,
+                    }
+                    model_size = scored_model.profile.size_b
+                else:
+                    # Для облачных провайдеров выбираем модель по стоимости/качеству
+                    model_name, scores, server_url, server_name, model_size = self._route_cloud(
                         provider, effective_policy, task_type, complexity
                     )
-                    server_url = self.config.get("llm", {}).get("providers", {}).get(provider, {}).get("base_url", "")
-                    server_name = provider
-                    model_size = 100.0
+            except ConnectionError as e:
+                # Если локальные недоступны и политика разрешает облако — fallback
+                if not effective_policy.require_private:
+                    logger.warning(f"Local models unavailable, falling back to cloud: {e}")
+                    provider, provider_info = self._get_fallback_cloud_provider(effective_policy)
+                    if provider:
+                        model_name, scores, server_url, server_name, model_size = self._route_cloud(
+                            provider, effective_policy, task_type, complexity
+                        )
+                    else:
+                        raise
                 else:
+                    logger.error(f"No private models available and policy requires privacy: {e}")
                     raise
-            else:
-                logger.error(f"No private models available and policy requires privacy: {e}")
-                raise
         
         # 5. Определяем tier на основе размера модели
         tier = self._determine_tier(model_size, complexity)
@@ -381,11 +590,10 @@ class UnifiedModelRouter(IModelRouter):
         )
         
         # 7. Определяем оптимальную температуру и токены
-        temperature = self._get_optimal_temperature(task_type, complexity)
-        max_tokens = self._get_optimal_max_tokens(complexity)
+        temperature, max_tokens = self._get_optimal_params(task_type, complexity)
         
         # 8. Получаем стоимость модели
-        cost_tier = provider_info.get_model_cost(model_name)
+        cost_tier = self._model_costs.get((provider, model_name), provider_info.cost_tier)
         
         # 9. Формируем результат
         selection = UnifiedModelSelection(
@@ -411,14 +619,41 @@ class UnifiedModelRouter(IModelRouter):
             policy_applied=effective_policy,
         )
         
+        # loguru форматирует аргументы только если уровень INFO включён
         logger.info(
-            f"UnifiedModelRouter: selected {selection.model} @ {selection.server_name} "
-            f"(score: {selection.total_score:.2f}, tier: {tier.value}, "
-            f"complexity: {complexity}, provider: {provider}, "
-            f"is_private: {selection.is_private}, cost: {cost_tier.name})"
+            "UnifiedModelRouter: selected {} @ {} "
+            "(score: {:.2f}, tier: {}, complexity: {}, provider: {}, "
+            "is_private: {}, cost: {})",
+            selection.model, selection.server_name, selection.total_score, tier,
+            complexity, provider, selection.is_private, cost_tier.name,
         )
         
-        return selection
+        self._selection_cache[cache_key] = (time.monotonic(), selection)
+        if len(self._selection_cache) > self.SELECTION_CACHE_MAX_ENTRIES:
+            self._selection_cache.popitem(last=False)
+        
+        return replace(selection, fallback_models=list(fallbacks))
+    
+    def _analyze_complexity(self, task: str, task_type: Optional[str]) -> ComplexityResult:
+        """Анализ сложности с LRU кэшем по хэшу полного текста задачи"""
+        key = (hashlib.blake2b(task.encode("utf-8"), digest_size=16).digest(), task_type)
+        result = self._complexity_cache.get(key)
+        if result is not None:
+            self._complexity_cache.move_to_end(key)
+            return result
+        
+        # Кэш сервиса ключуется первыми 100 символами задачи - здесь он не нужен
+        result = self.complexity_service.analyze(task, task_type=task_type, use_cache=False)
+        self._complexity_cache[key] = result
+        if len(self._complexity_cache) > self.COMPLEXITY_CACHE_MAX_ENTRIES:
+            self._complexity_cache.popitem(last=False)
+        return result
+    
+    @staticmethod
+    def _normalized_task_digest(task: str) -> bytes:
+        """Хэш задачи без учёта регистра и лишних пробелов"""
+        normalized = " ".join(task.lower().split())
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
     
     def _select_provider_by_policy(
         self,
@@ -426,21 +661,70 @@ class UnifiedModelRouter(IModelRouter):
         task_type: str
     ) -> tuple[str, ProviderInfo]:
         """Выбирает провайдера на основе политики"""
+        order = self._provider_order_cache.get(policy)
+        if order is None:
+            order = self._rank_providers(policy)
+            if len(self._provider_order_cache) >= self.PROVIDER_ORDER_CACHE_MAX_ENTRIES:
+                self._provider_order_cache.clear()
+            self._provider_order_cache[policy] = order
+        
+        if not order:
+            # Если ничего не подходит под политику, используем Ollama как fallback
+            logger.warning("No providers match policy, falling back to ollama")
+            return "ollama", self._providers["ollama"]
+        
+        return order[0]
+    
+    def _resolve_preferred_model(
+        self,
+        preferred_model: str,
+        policy: RoutingPolicy
+    ) -> Optional[Tuple[str, ProviderInfo, str, str, str, float]]:
+        """
+        Разрешает явно запрошенную модель без скоринга.
+        
+        Формат: "provider:model" или имя модели Ollama (может содержать ":").
+        Returns:
+            (провайдер, информация, модель, URL сервера, имя сервера, размер в B)
+            или None, если модель недоступна или не разрешена политикой
+        """
+        prefix, sep, rest = preferred_model.partition(":")
+        if sep and prefix in self._providers:
+            provider, model_name = prefix, rest
+        else:
+            provider, model_name = "ollama", preferred_model
+        
+        provider_info = self._providers.get(provider)
+        if provider_info is None or not policy.allows_provider(provider_info):
+            return None
+        if not self._provider_cfg(provider).get("enabled", False):
+            return None
+        
+        if provider != "ollama":
+            # Облачные модели считаем большими
+            return provider, provider_info, model_name, self._provider_base_url(provider), provider, 100.0
+        
+        for server_name, server_info in self.intelligent_router._servers.items():
+            if server_info.get("is_available") and model_name in server_info.get("models", []):
+                size_b = self.intelligent_router._get_model_profile(model_name).size_b
+                return provider, provider_info, model_name, server_info["url"], server_name, size_b
+        return None
+    
+    def invalidate_provider_cache(self) -> None:
+        """Сбрасывает кэш порядка провайдеров (после изменения конфига провайдеров)"""
+        self._provider_order_cache.clear()
+    
+    def _rank_providers(self, policy: RoutingPolicy) -> List[Tuple[str, ProviderInfo]]:
+        """Включённые провайдеры, разрешённые политикой, по убыванию приоритета"""
         
         # Фильтруем провайдеров по политике
         available_providers = []
         for name, info in self._providers.items():
             if policy.allows_provider(info):
                 # Проверяем что провайдер включён в конфиге
-                provider_config = self.config.get("llm", {}).get("providers", {}).get(name, {})
-                if provider_config.get("enabled", False):
+                if self._provider_cfg(name).get("enabled", False):
                     available_providers.append((name, info))
         
-        if not available_providers:
-            # Если ничего не подходит под политику, используем Ollama как fallback
-            logger.warning("No providers match policy, falling back to ollama")
-            return "ollama", self._providers["ollama"]
-        
         # Сортируем по приоритету
         def provider_score(item: tuple[str, ProviderInfo]) -> float:
             name, info = item
@@ -452,7 +736,7 @@ class UnifiedModelRouter(IModelRouter):
             
             # Приоритет дешёвым если prefer_cheap
             if policy.prefer_cheap:
-                score += (5 - info.cost_tier.value) * 20
+                score += (5 - info.cost_tier) * 20
             
             # Приоритет качеству если prefer_quality (облачные обычно качественнее)
             if policy.prefer_quality and not info.is_local:
@@ -465,9 +749,24 @@ class UnifiedModelRouter(IModelRouter):
             return score
         
         available_providers.sort(key=provider_score, reverse=True)
-        best_provider = available_providers[0]
+        return available_providers
+    
+    def _route_cloud(
+        self,
+        provider: str,
+        policy: RoutingPolicy,
+        task_type: str,
+        complexity: str
+    ) -> Tuple[str, Dict[str, float], str, str, float]:
+        """
+        Полный маршрут облачного провайдера за один вызов.
         
-        return best_provider[0], best_provider[1]
+        Returns:
+            (модель, оценки, URL сервера, имя сервера, размер модели в B)
+        """
+        model_name, scores = self._select_cloud_model(provider, policy, task_type, complexity)
+        # Облачные модели считаем большими
+        return model_name, scores, self._provider_base_url(provider), provider, 100.0
     
     def _select_cloud_model(
         self,
@@ -477,31 +776,25 @@ class UnifiedModelRouter(IModelRouter):
         complexity: str
     ) -> tuple[str, Dict[str, float]]:
         """Выбирает модель облачного провайдера"""
-        provider_config = self.config.get("llm", {}).get("providers", {}).get(provider, {})
-        default_model = provider_config.get("default_model", "")
+        default_model = self._provider_default_model.get(provider, "")
         
         provider_info = self._providers.get(provider)
         if not provider_info:
             return default_model, {"total": 0.7, "capability": 0.7, "performance": 0.7, "speed": 0.7, "quality": 0.7}
         
+        key = (provider, policy.max_cost_tier)
+        
+        # Модель по умолчанию дороже лимита политики - берём лучшую в пределах лимита
+        if self._model_costs.get((provider, default_model), CostTier.FREE) > policy.max_cost_tier:
+            default_model = self._strongest_under.get(key, default_model)
+        
         # Выбираем модель по стоимости
         if policy.prefer_cheap:
-            # Ищем самую дешёвую модель
-            cheapest_model = None
-            cheapest_tier = CostTier.PREMIUM
-            for model, tier in provider_info.models_cost_map.items():
-                if tier.value <= policy.max_cost_tier.value and tier.value < cheapest_tier.value:
-                    cheapest_model = model
-                    cheapest_tier = tier
-            if cheapest_model:
-                default_model = cheapest_model
-        
-        # Для сложных задач предпочитаем мощные модели
-        if complexity in ["complex", "very_complex", "extreme"] and policy.prefer_quality:
-            for model, tier in provider_info.models_cost_map.items():
-                if tier == CostTier.PREMIUM and tier.value <= policy.max_cost_tier.value:
-                    default_model = model
-                    break
+            default_model = self._cheapest_under.get(key, default_model)
+        
+        # Для сложных задач предпочитаем самую сильную модель в пределах лимита
+        if complexity in self.HARD_COMPLEXITIES and policy.prefer_quality:
+            default_model = self._strongest_under.get(key, default_model)
         
         # Базовые скоры для облачных моделей
         scores = {
@@ -518,13 +811,18 @@ class UnifiedModelRouter(IModelRouter):
         self,
         policy: RoutingPolicy
     ) -> tuple[Optional[str], Optional[ProviderInfo]]:
-        """Получает fallback облачного провайдера"""
+        """Получает fallback облачного провайдера (сначала заведомо доступные)"""
+        candidates = []
         for name in ["openai", "anthropic"]:
             info = self._providers.get(name)
             if info and policy.allows_provider(info):
-                provider_config = self.config.get("llm", {}).get("providers", {}).get(name, {})
-                if provider_config.get("enabled", False):
-                    return name, info
+                if self._provider_cfg(name).get("enabled", False):
+                    candidates.append((name, info))
+        
+        # Провайдеры, не прошедшие проверку, - в конце (проверка могла ошибиться)
+        candidates.sort(key=lambda item: self._is_provider_healthy(item[0]) is False)
+        if candidates:
+            return candidates[0]
         return None, None
     
     async def _find_fallbacks_with_policy(
@@ -536,6 +834,31 @@ class UnifiedModelRouter(IModelRouter):
         policy: RoutingPolicy
     ) -> List[str]:
         """Находит резервные модели с учётом политики"""
+        key = (primary_model, primary_provider, task_type, complexity, policy)
+        cached = self._fallback_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.FALLBACK_CACHE_TTL:
+            self._fallback_cache.move_to_end(key)
+            return list(cached[1])
+        
+        fallbacks = self._compute_fallbacks(primary_model, primary_provider, task_type, policy)
+        self._fallback_cache[key] = (time.monotonic(), fallbacks)
+        self._fallback_cache.move_to_end(key)
+        if len(self._fallback_cache) > self.FALLBACK_CACHE_MAX_ENTRIES:
+            self._fallback_cache.popitem(last=False)
+        return list(fallbacks)
+    
+    def invalidate_fallbacks(self) -> None:
+        """Сбрасывает кэш fallback-списков (после обнаружения моделей)"""
+        self._fallback_cache.clear()
+    
+    def _compute_fallbacks(
+        self,
+        primary_model: str,
+        primary_provider: str,
+        task_type: str,
+        policy: RoutingPolicy
+    ) -> List[str]:
+        """Строит список резервных моделей: сначала того же провайдера, затем облачные"""
         fallbacks = []
         
         # Сначала ищем fallback в том же провайдере
@@ -558,9 +881,8 @@ class UnifiedModelRouter(IModelRouter):
                     continue
                 info = self._providers.get(cloud_provider)
                 if info and policy.allows_provider(info):
-                    provider_config = self.config.get("llm", {}).get("providers", {}).get(cloud_provider, {})
-                    if provider_config.get("enabled", False):
-                        default_model = provider_config.get("default_model", "")
+                    if self._provider_cfg(cloud_provider).get("enabled", False):
+                        default_model = self._provider_default_model.get(cloud_provider, "")
                         if default_model:
                             fallbacks.append(f"{cloud_provider}:{default_model}")
                             if len(fallbacks) >= 3:
@@ -602,13 +924,16 @@ class UnifiedModelRouter(IModelRouter):
     async def discover_models(self) -> List[str]:
         """Обнаруживает все доступные модели на всех серверах"""
         await self.intelligent_router.discover_servers()
+        self._selection_cache.clear()
+        self.invalidate_fallbacks()
         
         all_models = []
-        for server_name, server_info in self.intelligent_router._servers.items():
+        for server_info in self.intelligent_router._servers.values():
             if server_info.get("is_available"):
                 all_models.extend(server_info.get("models", []))
         
-        return list(set(all_models))
+        # Дедупликация с сохранением порядка серверов
+        return list(dict.fromkeys(all_models))
     
     async def get_models_ranked(self, task_type: str = "chat") -> List[Dict[str, Any]]:
         """Возвращает все модели с их рейтингами для типа задачи"""
@@ -616,40 +941,16 @@ class UnifiedModelRouter(IModelRouter):
     
     def _infer_task_type(self, task: str) -> str:
         """Определяет тип задачи по тексту"""
-        task_lower = task.lower()
+        # Один проход regex; при нескольких совпадениях побеждает тип с высшим приоритетом
+        best_rank = len(self.TASK_TYPE_KEYWORDS)
+        for match in self.TASK_TYPE_RE.finditer(task):
+            best_rank = min(best_rank, self.TASK_TYPE_RANK[match.lastgroup])
+            if best_rank == 0:
+                break
         
-        # Код
-        if any(kw in task_lower for kw in [
-            "код", "code", "функци", "класс", "python", "javascript",
-            "напиши", "создай", "сгенерируй", "игра", "game", "приложение"
-        ]):
-            return "code"
-        
-        # Анализ
-        if any(kw in task_lower for kw in [
-            "проанализируй", "анализ", "analyze", "изучи", "сравни"
-        ]):
-            return "analysis"
-        
-        # Исследование
-        if any(kw in task_lower for kw in [
-            "исследуй", "research", "найди информацию", "что такое"
-        ]):
-            return "research"
-        
-        # Рассуждения
-        if any(kw in task_lower for kw in [
-            "объясни", "почему", "как работает", "логик"
-        ]):
-            return "reasoning"
-        
-        # Простой чат
-        if any(kw in task_lower for kw in [
-            "привет", "здравствуй", "hello", "hi", "как дела"
-        ]):
-            return "simple_chat"
-        
-        return "general"
+        if best_rank == len(self.TASK_TYPE_KEYWORDS):
+            return "general"
+        return self.TASK_TYPE_KEYWORDS[best_rank][0]
     
     def _determine_tier(self, model_size_b: float, complexity: str) -> ModelTier:
         """Определяет tier модели на основе размера и сложности"""
@@ -662,11 +963,11 @@ class UnifiedModelRouter(IModelRouter):
             base_tier = ModelTier.FAST
         
         # Корректируем по сложности
-        if complexity in ["complex", "very_complex", "extreme"]:
+        if complexity in self.HARD_COMPLEXITIES:
             # Для сложных задач нужны мощные модели
             if base_tier == ModelTier.FAST:
                 return ModelTier.BALANCED
-        elif complexity in ["trivial", "simple"]:
+        elif complexity in self.EASY_COMPLEXITIES:
             # Для простых задач можно использовать быстрые
             if base_tier == ModelTier.POWERFUL:
                 return ModelTier.BALANCED
@@ -684,12 +985,23 @@ class UnifiedModelRouter(IModelRouter):
             primary_model, "ollama", task_type, complexity, self.DEFAULT_POLICY
         )
     
+    def _get_optimal_params(self, task_type: str, complexity: str) -> Tuple[float, int]:
+        """Температура и токены из предрассчитанной таблицы"""
+        params = self._params.get((task_type, complexity))
+        if params is None:
+            # Тип задачи или сложность вне таблицы - считаем напрямую
+            params = (
+                self._get_optimal_temperature(task_type, complexity),
+                self._get_optimal_max_tokens(complexity),
+            )
+        return params
+    
     def _get_optimal_temperature(self, task_type: str, complexity: str) -> float:
         """Определяет оптимальную температуру"""
         base_temp = self._temperature_map.get(task_type, 0.7)
         
         # Для сложных задач чуть снижаем температуру для стабильности
-        if complexity in ["complex", "very_complex", "extreme"]:
+        if complexity in self.HARD_COMPLEXITIES:
             base_temp = max(0.1, base_temp - 0.1)
         
         return base_temp
@@ -727,16 +1039,22 @@ class UnifiedModelRouter(IModelRouter):
 
 # Singleton instance
 _unified_router: Optional[UnifiedModelRouter] = None
+_unified_router_lock = threading.Lock()
 
 
 def get_unified_router(config: Optional[Dict[str, Any]] = None) -> UnifiedModelRouter:
     """Получить singleton экземпляр UnifiedModelRouter"""
     global _unified_router
-    if _unified_router is None:
-        if config is None:
-            raise ValueError("Config required for first initialization")
-        _unified_router = UnifiedModelRouter(config)
-    return _unified_router
+    router = _unified_router
+    if router is not None:
+        return router
+    # Double-checked locking: конструктор создаёт IntelligentModelRouter и не должен выполняться дважды
+    with _unified_router_lock:
+        if _unified_router is None:
+            if config is None:
+                raise ValueError("Config required for first initialization")
+            _unified_router = UnifiedModelRouter(config)
+        return _unified_router
 
 
 async def initialize_unified_router(config: Dict[str, Any]) -> UnifiedModelRouter:
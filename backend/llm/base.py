@@ -126,14 +126,16 @@ class BaseLLMProvider(ABC):
         import hashlib
         import json
         
-        key_data = {
-            "messages": [{"role": m.role, "content": m.content} for m in messages],
-            "model": model or self.default_model,
-            "temperature": temperature,
-            **kwargs
-        }
-        key_str = json.dumps(key_data, sort_keys=True)
-        return hashlib.md5(key_str.encode()).hexdigest()
+        # Hash messages incrementally instead of serializing the whole history to JSON;
+        # length prefixes keep (role, content) boundaries unambiguous
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([model or self.default_model, temperature, kwargs], sort_keys=True).encode())
+        for m in messages:
+            for part in (m.role, m.content):
+                data = part.encode()
+                digest.update(len(data).to_bytes(8, "little"))
+                digest.update(data)
+        return digest.hexdigest()
     
     async def _get_cached(self, cache_key: str) -> Optional[str]:
         """Get cached response"""
@@ -7,7 +7,9 @@ import json
 import re
 import time
 import asyncio
-from typing import List, Optional, AsyncIterator, Dict, Any
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, AsyncIterator, Dict, Any, Tuple, Union
 from ..core.logger import get_logger
 logger = get_logger(__name__)
 
@@ -15,6 +17,145 @@ from .base import BaseLLMProvider, LLMMessage, LLMResponse
 from ..core.exceptions import LLMException
 from ..core.model_performance_tracker import get_performance_tracker
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401 - нужен httpx для http2=True
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Общие httpx клиенты: экземпляры OllamaProvider с одним сервером используют
+# один пул соединений. Соединения пула привязаны к event loop, поэтому он
+# входит в ключ. (base_url, timeout, loop) -> [клиент, число владельцев]
+_CLIENT_REGISTRY: Dict[Tuple[str, float, Optional[asyncio.AbstractEventLoop]], List[Any]] = {}
+
+# Регулярные выражения fallback-разбора ответов (компилируются один раз)
+_RE_MESSAGE_CONTENT = re.compile(r'"message"\s*:\s*\{[^}]*"content"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+_RE_CONTENT = re.compile(r'"content"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+_RE_STREAM_CONTENT = re.compile(r'\{.*"content".*\}', re.DOTALL)
+# Первая строка с текстом (не JSON и не метаданные), длиннее 10 символов после strip
+_RE_FALLBACK_LINE = re.compile(r'^[^\S\n]*(?!\{)(?!.*"(?:model|done)")(\S.{9,}\S)', re.MULTILINE)
+_RE_JSON_OBJECT = re.compile(r'\{[^}]*\}')
+_RE_JSON_CHARS = re.compile(r'["{}]')
+# JSON escape-последовательности в извлечённой regex строке
+_RE_JSON_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.DOTALL)
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", '"': '"', "\\": "\\", "/": "/"}
+
+
+def _unescape_json_string(match: "re.Match[str]") -> str:
+    """Замена для одной escape-последовательности (неизвестные остаются как есть)"""
+    escape = match.group(1)
+    if len(escape) == 5:
+        return chr(int(escape[1:], 16))
+    return _JSON_ESCAPES.get(escape, match.group(0))
+
+
+_RE_THINK_BLOCK = re.compile(r'<think>(.*?)</think>', re.DOTALL | re.IGNORECASE)
+
+# Маркеры рассуждений в тексте ответа (для моделей без структурированного thinking)
+_REASONING_MARKERS = (
+    "Let me think", "Thinking:", "Reasoning:", "Analysis:",
+    "Думаю:", "Рассуждение:", "Анализ:"
+)
+_RE_REASONING_MARKER = re.compile("|".join(map(re.escape, _REASONING_MARKERS)), re.IGNORECASE)
+
+# Модели, которые поддерживают нативный thinking mode в Ollama
+# (обновляется по мере добавления поддержки в Ollama)
+_THINKING_MODELS = (
+    "llama3.3",  # Llama 3.3 и новее поддерживают thinking
+    "llama3.2",  # Llama 3.2 может поддерживать
+    "qwen2.5",   # Qwen 2.5 поддерживает reasoning
+    "deepseek",  # DeepSeek модели поддерживают thinking
+)
+
+
+# Thinking инструкции для системного промпта: минимальные для моделей с нативной
+# поддержкой, расширенная эмуляция через промпт для остальных
+_THINKING_NATIVE_INSTRUCTIONS = """\n\nUse your built-in thinking capabilities to reason through this problem step by step before providing your answer."""
+_THINKING_EMULATED_INSTRUCTIONS = """\n\nIMPORTANT: Use deep reasoning and step-by-step thinking. Before responding, think through:
+1. What is the core problem or question?
+2. What are the key factors to consider?
+3. What are the possible approaches or solutions?
+4. What are the pros and cons of each approach?
+5. What is the best solution and why?
+
+Show your reasoning process clearly. Think deeply before providing your final answer."""
+
+
+@lru_cache(maxsize=256)
+def _supports_native_thinking(model_name: str) -> bool:
+    """Проверка по имени модели (результат кэшируется: набор моделей невелик)"""
+    model_lower = model_name.lower()
+    return any(thinking_model in model_lower for thinking_model in _THINKING_MODELS)
+
+
+def _json_loads(data):
+    """Разбор JSON (orjson если установлен; принимает str и bytes)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Сообщения для частых кодов ошибок (без форматирования на каждый запрос)
+_STATUS_ERRORS = {
+    code: f"Ollama API error: HTTP {code}"
+    for code in (400, 401, 403, 404, 408, 413, 429)
+}
+
+
+def _check_status(response: httpx.Response, failover: bool = False) -> None:
+    """
+    Проверка статуса ответа Ollama.
+    
+    5xx - httpx.HTTPStatusError (повтор с backoff и переход на другой сервер),
+    4xx - LLMException сразу: повтор того же запроса не поможет.
+    404 (нет модели) при failover=True (есть другие серверы) - тоже
+    httpx.HTTPStatusError: модель может быть на другом сервере.
+    """
+    status = response.status_code
+    if status < 400:
+        return
+    if status >= 500 or (status == 404 and failover):
+        response.raise_for_status()
+    raise LLMException(_STATUS_ERRORS.get(status) or f"Ollama API error: HTTP {status}")
+
+
+def _json_body(data: Dict[str, Any]) -> bytes:
+    """Сериализация тела запроса к Ollama"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+async def _aiter_ndjson_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Строки NDJSON ответа как bytes (без декодирования в str).
+    
+    orjson разбирает bytes напрямую, поэтому тело не декодируется целиком
+    и не режется на список строк.
+    """
+    pending = bytearray()
+    async for chunk in response.aiter_bytes():
+        pending += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, tail = pending.split(b"\n")
+        pending = bytearray(tail)
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield bytes(line)
+    line = pending.strip()
+    if line:
+        yield bytes(line)
+
 
 async def retry_with_backoff(
     coroutine_func,
@@ -83,6 +224,13 @@ async def retry_with_backoff(
 class OllamaProvider(BaseLLMProvider):
     """Ollama local models provider with automatic server fallback"""
     
+    # Кэш системных сообщений с инструкциями thinking: системный промпт
+    # повторяется из запроса в запрос
+    MESSAGE_CACHE_MAX_ENTRIES = 1024
+    # NDJSON разбирается построчно по мере чтения; в поток уходит только
+    # fallback-разбор большого неструктурированного ответа
+    FALLBACK_PARSE_THREAD_THRESHOLD = 256 * 1024
+    
     def __init__(self, config: dict):
         super().__init__(config)
         self.base_url = config.get("base_url", "http://localhost:11434")
@@ -90,6 +238,12 @@ class OllamaProvider(BaseLLMProvider):
         self.recommended_models = config.get("recommended_models", {})
         self.client: Optional[httpx.AsyncClient] = None
         self._available_models: List[str] = []
+        # Индексы по списку моделей (перестраиваются в _set_available_models)
+        self._available_set: frozenset = frozenset()
+        self._recommended_exact: Dict[str, str] = {}   # тип задачи -> первая доступная рекомендованная
+        self._recommended_fuzzy: Dict[str, str] = {}   # категория -> первая доступная по вхождению имени
+        # Сколько держать модель в памяти после запроса (None - по умолчанию Ollama, 5m)
+        self.keep_alive: Optional[Union[int, str]] = config.get("keep_alive")
         
         # Fallback URLs для автоматического переключения серверов
         self.fallback_urls = config.get("fallback_urls", [])
@@ -97,6 +251,16 @@ class OllamaProvider(BaseLLMProvider):
         self._all_server_urls: List[str] = self._build_server_list()
         self._current_server_index = 0
         self._working_url: Optional[str] = None  # Последний работающий URL
+        # Клиенты для запросов с явным server_url (distributed routing):
+        # один на сервер, переиспользуются между запросами
+        self._server_clients: Dict[str, httpx.AsyncClient] = {}
+        # Ссылки этого провайдера на общие клиенты: клиент -> сколько раз получен
+        self._client_refs: Dict[httpx.AsyncClient, int] = {}
+        # Выполняющиеся generate по ключу кэша: одинаковые параллельные запросы объединяются
+        # ключ кэша -> [задача, число ожидающих]
+        self._inflight: Dict[str, List[Any]] = {}
+        # (исходный системный промпт, нативный thinking) -> системное сообщение с инструкциями
+        self._thinking_system_messages: "OrderedDict[Tuple[Optional[str], bool], LLMMessage]" = OrderedDict()
     
     def _build_server_list(self) -> List[str]:
         """Строит список всех серверов для fallback"""
@@ -150,9 +314,8 @@ class OllamaProvider(BaseLLMProvider):
         for idx, server_url in enumerate(self._all_server_urls):
             logger.info(f"Trying Ollama server {idx + 1}/{len(self._all_server_urls)}: {server_url}")
             
+            client = self._acquire_client(server_url)
             try:
-                client = await self._create_client(server_url)
-                
                 # Test connection
                 response = await client.get("/api/tags", timeout=5.0)
                 if response.status_code == 200:
@@ -160,93 +323,126 @@ class OllamaProvider(BaseLLMProvider):
                     models = [model["name"] for model in data.get("models", [])]
                     
                     if models:  # Сервер работает и имеет модели
+                        if self.client is not None:
+                            # Повторная инициализация: закрываем прежний пул
+                            await self._release_client(self.client)
                         self.client = client
                         self.base_url = server_url
                         self._working_url = server_url
                         self._current_server_index = idx
-                        self._available_models = models
+                        self._set_available_models(models)
                         connected = True
                         logger.info(f"✅ Connected to Ollama at {server_url} with {len(models)} models")
                         break
                     else:
                         logger.warning(f"Server {server_url} has no models, trying next...")
-                        await client.aclose()
+                        await self._release_client(client)
                 else:
                     logger.warning(f"Server {server_url} returned status {response.status_code}")
-                    await client.aclose()
+                    await self._release_client(client)
                     
             except Exception as e:
                 last_error = e
                 logger.debug(f"Failed to connect to {server_url}: {e}")
+                # Не оставляем открытым пул соединений неработающего сервера
+                await self._release_client(client)
                 continue
         
         if not connected:
             logger.warning(f"Could not connect to any Ollama server. Last error: {last_error}")
             # Создаем клиент для base_url как fallback (может заработать позже)
-            self.client = await self._create_client(self.base_url)
-            self._available_models = []
+            if self.client is not None:
+                await self._release_client(self.client)
+            self.client = self._acquire_client(self.base_url)
+            self._set_available_models([])
         
         # Выбираем дефолтную модель
         self._select_default_model()
     
-    async def _create_client(self, base_url: str) -> httpx.AsyncClient:
-        """Создаёт httpx клиент с оптимальными настройками"""
+    def _build_client(self, base_url: str) -> httpx.AsyncClient:
+        """Создаёт httpx клиент с оптимальными настройками (HTTP/2 если установлен h2)"""
+        return httpx.AsyncClient(
+            base_url=base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_keepalive_connections=50,
+                max_connections=100,
+                keepalive_expiry=30.0
+            ),
+            http2=HTTP2_AVAILABLE
+        )
+    
+    def _acquire_client(self, base_url: str) -> httpx.AsyncClient:
+        """Общий клиент для сервера (создаётся при первом запросе, счётчик владельцев +1)"""
         try:
-            return httpx.AsyncClient(
-                base_url=base_url,
-                timeout=self.timeout,
-                limits=httpx.Limits(
-                    max_keepalive_connections=50,
-                    max_connections=100,
-                    keepalive_expiry=30.0
-                ),
-                http2=True
+            loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        key = (base_url, self.timeout, loop)
+        entry = _CLIENT_REGISTRY.get(key)
+        if entry is None or entry[0].is_closed:
+            # Клиенты завершённых loop'ов (провайдер не был остановлен) уже
+            # нельзя ни использовать, ни закрыть - просто забываем их
+            for stale in [k for k in _CLIENT_REGISTRY if k[2] is not None and k[2].is_closed()]:
+                del _CLIENT_REGISTRY[stale]
+            entry = _CLIENT_REGISTRY[key] = [self._build_client(base_url), 0]
+        entry[1] += 1
+        client = entry[0]
+        self._client_refs[client] = self._client_refs.get(client, 0) + 1
+        return client
+    
+    async def _release_client(self, client: httpx.AsyncClient) -> None:
+        """Освобождает ссылку провайдера на общий клиент; закрывает его, когда владельцев не осталось"""
+        refs = self._client_refs.get(client)
+        if refs is None:
+            # Клиент из реестра без нашей ссылки (уже освобождён) принадлежит
+            # другим провайдерам; клиент не из реестра задан извне и закрывается
+            if not any(entry[0] is client for entry in _CLIENT_REGISTRY.values()):
+                await client.aclose()
+            return
+        if refs > 1:
+            self._client_refs[client] = refs - 1
+        else:
+            del self._client_refs[client]
+        
+        for key, entry in _CLIENT_REGISTRY.items():
+            if entry[0] is client:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del _CLIENT_REGISTRY[key]
+                break
+        await client.aclose()
+    
+    def _set_available_models(self, models: List[str]) -> None:
+        """Сохраняет список моделей и один раз сопоставляет с ним recommended_models"""
+        self._available_models = models
+        self._available_set = frozenset(models)
+        self._recommended_exact = {}
+        self._recommended_fuzzy = {}
+        for category, recommended_list in (self.recommended_models or {}).items():
+            exact = next((rec for rec in recommended_list if rec in self._available_set), None)
+            if exact:
+                self._recommended_exact[category] = exact
+            # Рекомендация может быть префиксом/частью полного имени (llama3 -> llama3:8b)
+            fuzzy = next(
+                (available for rec in recommended_list for available in models if rec in available),
+                None
             )
-        except Exception as e:
-            if "h2" in str(e).lower() or "http2" in str(e).lower():
-                logger.debug("HTTP/2 not available, using HTTP/1.1")
-                return httpx.AsyncClient(
-                    base_url=base_url,
-                    timeout=self.timeout,
-                    limits=httpx.Limits(
-                        max_keepalive_connections=50,
-                        max_connections=100,
-                        keepalive_expiry=30.0
-                    ),
-                    http2=False
-                )
-            raise
+            if fuzzy:
+                self._recommended_fuzzy[category] = fuzzy
     
     def _select_default_model(self) -> None:
         """Выбирает дефолтную модель из доступных"""
-        if not self.default_model or self.default_model not in self._available_models:
+        if not self.default_model or self.default_model not in self._available_set:
             if self._available_models:
-                fallback_model = None
-                
-                # Приоритет: recommended_models.chat
-                if self.recommended_models and "chat" in self.recommended_models:
-                    for recommended in self.recommended_models["chat"]:
-                        for available in self._available_models:
-                            if recommended in available or available.startswith(recommended):
-                                fallback_model = available
-                                break
-                        if fallback_model:
-                            break
-                
-                # Затем другие категории
-                if not fallback_model and self.recommended_models:
-                    for category, models in self.recommended_models.items():
-                        if category == "chat":
-                            continue
-                        for recommended in models:
-                            for available in self._available_models:
-                                if recommended in available or available.startswith(recommended):
-                                    fallback_model = available
-                                    break
-                            if fallback_model:
-                                break
-                        if fallback_model:
-                            break
+                # Приоритет: recommended_models.chat, затем другие категории
+                fallback_model = self._recommended_fuzzy.get("chat")
+                if not fallback_model:
+                    fallback_model = next(
+                        (model for category, model in self._recommended_fuzzy.items() if category != "chat"),
+                        None
+                    )
                 
                 # Если не нашли в рекомендуемых - первая доступная
                 if not fallback_model:
@@ -347,7 +543,19 @@ class OllamaProvider(BaseLLMProvider):
     async def shutdown(self) -> None:
         """Shutdown Ollama client"""
         if self.client:
-            await self.client.aclose()
+            await self._release_client(self.client)
+            self.client = None
+        for client in self._server_clients.values():
+            await self._release_client(client)
+        self._server_clients.clear()
+    
+    def _get_server_client(self, server_url: str) -> httpx.AsyncClient:
+        """Клиент для конкретного сервера (создаётся один раз, пул соединений сохраняется)"""
+        client = self._server_clients.get(server_url)
+        if client is None or client.is_closed:
+            client = self._acquire_client(server_url)
+            self._server_clients[server_url] = client
+        return client
     
     async def _try_next_server(self) -> bool:
         """Пробует подключиться к следующему серверу из списка
@@ -369,8 +577,8 @@ class OllamaProvider(BaseLLMProvider):
             server_url = self._all_server_urls[self._current_server_index]
             logger.info(f"🔄 Trying fallback server: {server_url}")
             
+            client = self._acquire_client(server_url)
             try:
-                client = await self._create_client(server_url)
                 response = await client.get("/api/tags", timeout=5.0)
                 
                 if response.status_code == 200:
@@ -378,25 +586,26 @@ class OllamaProvider(BaseLLMProvider):
                     models = [model["name"] for model in data.get("models", [])]
                     
                     if models:
-                        # Закрываем старый клиент
+                        # Освобождаем старый клиент
                         if self.client:
-                            await self.client.aclose()
+                            await self._release_client(self.client)
                         
                         self.client = client
                         self.base_url = server_url
                         self._working_url = server_url
-                        self._available_models = models
+                        self._set_available_models(models)
                         self._select_default_model()
                         
                         logger.info(f"✅ Switched to fallback server {server_url} with {len(models)} models")
                         return True
                     else:
-                        await client.aclose()
+                        await self._release_client(client)
                 else:
-                    await client.aclose()
+                    await self._release_client(client)
                     
             except Exception as e:
                 logger.debug(f"Fallback server {server_url} failed: {e}")
+                await self._release_client(client)
                 continue
         
         logger.warning("All fallback servers exhausted")
@@ -426,16 +635,15 @@ class OllamaProvider(BaseLLMProvider):
         if not self._available_models:
             return self.default_model
         
-        # Умный выбор на основе типа задачи
-        if task_type and self.recommended_models:
-            recommended = self.recommended_models.get(task_type, [])
-            for rec_model in recommended:
-                if rec_model in self._available_models:
-                    logger.debug(f"Selected recommended model '{rec_model}' for task type '{task_type}'")
-                    return rec_model
+        # Умный выбор на основе типа задачи (рекомендации сопоставлены заранее)
+        if task_type:
+            rec_model = self._recommended_exact.get(task_type)
+            if rec_model:
+                logger.debug(f"Selected recommended model '{rec_model}' for task type '{task_type}'")
+                return rec_model
         
         # Fallback: используем первую доступную или default
-        if self.default_model in self._available_models:
+        if self.default_model in self._available_set:
             return self.default_model
         
         return self._available_models[0]
@@ -450,26 +658,66 @@ class OllamaProvider(BaseLLMProvider):
         Returns:
             True если модель поддерживает thinking mode
         """
-        # Модели, которые поддерживают нативный thinking mode в Ollama
-        # (обновляется по мере добавления поддержки в Ollama)
-        thinking_models = [
-            "llama3.3",  # Llama 3.3 и новее поддерживают thinking
-            "llama3.2",  # Llama 3.2 может поддерживать
-            "qwen2.5",   # Qwen 2.5 поддерживает reasoning
-            "deepseek",  # DeepSeek модели поддерживают thinking
-        ]
-        
-        # Проверяем, содержит ли имя модели ключевые слова
-        model_lower = model_name.lower()
-        return any(thinking_model.lower() in model_lower for thinking_model in thinking_models)
+        return _supports_native_thinking(model_name)
+    
+    @staticmethod
+    def _collect_frame_content(obj: Dict[str, Any], content_parts: List[str]) -> None:
+        """Добавляет content одного NDJSON фрейма Ollama"""
+        if "message" in obj and isinstance(obj["message"], dict):
+            msg_content = obj["message"].get("content", "")
+            if msg_content:
+                content_parts.append(msg_content)
+        elif "content" in obj:
+            content_parts.append(obj["content"])
+    
+    @staticmethod
+    def _merge_ndjson_frames(content_parts: List[str], final_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Склеивает content фреймов в последний фрейм (в нём метаданные: done, eval_count и т.д.)"""
+        if content_parts and final_data:
+            combined_content = "".join(content_parts)
+            if "message" in final_data and isinstance(final_data["message"], dict):
+                final_data["message"]["content"] = combined_content
+            else:
+                final_data["message"] = {"content": combined_content}
+            logger.debug(f"Parsed {len(content_parts)} NDJSON chunks")
+        return final_data
+    
+    async def _read_ndjson_stream(self, response: httpx.Response) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        Читает NDJSON ответ Ollama по мере поступления строк.
+        
+        Тело ответа целиком не накапливается: content фреймов собирается по частям,
+        сохраняются только строки, которые не удалось разобрать (для fallback).
+        
+        Returns:
+            (объединённый ответ или None, неразобранные строки)
+        """
+        content_parts: List[str] = []
+        final_data = None
+        unparsed_lines: List[str] = []
+        
+        async for line in _aiter_ndjson_lines(response):
+            try:
+                obj = _json_loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                unparsed_lines.append(line.decode("utf-8", "replace"))
+                continue
+            if isinstance(obj, dict):
+                self._collect_frame_content(obj, content_parts)
+                final_data = obj
+                if obj.get("done") is True:
+                    # Терминальный фрейм: остаток тела не читаем
+                    break
+        
+        return self._merge_ndjson_frames(content_parts, final_data), unparsed_lines
     
-    def _parse_ndjson_response(self, response_text: str) -> Optional[Dict[str, Any]]:
+    def _parse_ndjson_response(self, response_bytes: bytes) -> Optional[Dict[str, Any]]:
         """
         Parse NDJSON (Newline Delimited JSON) response from Ollama.
         Ollama streaming responses contain multiple JSON objects separated by newlines.
         
         Args:
-            response_text: Raw response text containing NDJSON
+            response_bytes: Raw response body containing NDJSON
             
         Returns:
             Merged response dict with combined content, or None if parsing fails
@@ -477,41 +725,35 @@ class OllamaProvider(BaseLLMProvider):
         content_parts = []
         final_data = None
         
-        for line in response_text.strip().split('\n'):
-            line = line.strip()
-            if not line:
+        # Строки разбираются как bytes: тело не декодируется целиком
+        for line in response_bytes.split(b'\n'):
+            if not line or line.isspace():
                 continue
             
             try:
-                obj = json.loads(line)
+                obj = _json_loads(line)
                 if isinstance(obj, dict):
-                    # Extract content from message
-                    if "message" in obj and isinstance(obj["message"], dict):
-                        msg_content = obj["message"].get("content", "")
-                        if msg_content:
-                            content_parts.append(msg_content)
-                    elif "content" in obj:
-                        content_parts.append(obj["content"])
+                    self._collect_frame_content(obj, content_parts)
                     # Keep the last object for metadata (done, model, eval_count, etc.)
                     final_data = obj
-            except json.JSONDecodeError:
+                    if obj.get("done") is True:
+                        break
+            except (json.JSONDecodeError, UnicodeDecodeError):
                 continue
         
-        if content_parts and final_data:
-            # Combine all content parts
-            combined_content = "".join(content_parts)
-            if "message" in final_data and isinstance(final_data["message"], dict):
-                final_data["message"]["content"] = combined_content
-            else:
-                final_data["message"] = {"content": combined_content}
-            logger.debug(f"Parsed {len(content_parts)} NDJSON chunks")
-            return final_data
-        
         if final_data:
-            return final_data
+            return self._merge_ndjson_frames(content_parts, final_data)
         
         # Fallback: try regex extraction for malformed responses
-        return self._extract_content_regex(response_text)
+        return self._extract_content_regex(response_bytes.decode("utf-8", "replace"))
+    
+    def _parse_unstructured_response(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """Разбор ответа, который не является NDJSON: цельный JSON, затем regex"""
+        try:
+            return _json_loads(response_text)
+        except json.JSONDecodeError as json_error:
+            logger.debug(f"Response is not JSON, trying regex extraction: {json_error}")
+            return self._extract_content_regex(response_text)
     
     def _extract_content_regex(self, text: str) -> Optional[Dict[str, Any]]:
         """
@@ -523,18 +765,11 @@ class OllamaProvider(BaseLLMProvider):
         Returns:
             Dict with extracted content or None
         """
-        patterns = [
-            r'"message"\s*:\s*\{[^}]*"content"\s*:\s*"((?:[^"\\]|\\.)*)"',
-            r'"content"\s*:\s*"((?:[^"\\]|\\.)*)"',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.DOTALL)
+        for pattern in (_RE_MESSAGE_CONTENT, _RE_CONTENT):
+            match = pattern.search(text)
             if match:
-                content = match.group(1)
-                # Decode escape sequences
-                content = content.replace('\\n', '\n').replace('\\t', '\t')
-                content = content.replace('\\"', '"').replace('\\\\', '\\')
+                # Decode escape sequences за один проход (экранированный слеш перед n - не перевод строки)
+                content = _RE_JSON_ESCAPE.sub(_unescape_json_string, match.group(1))
                 logger.debug("Extracted content using regex fallback")
                 return {"message": {"content": content}}
         
@@ -560,41 +795,50 @@ class OllamaProvider(BaseLLMProvider):
         
         # Проверяем поддержку нативного thinking mode
         supports_native_thinking = self._check_thinking_support(model_name)
-        
         if supports_native_thinking:
-            # Минимальные инструкции для моделей с нативной поддержкой
-            thinking_instructions = """\n\nUse your built-in thinking capabilities to reason through this problem step by step before providing your answer."""
             logger.debug(f"Model {model_name} supports native thinking mode")
         else:
-            # Расширенная эмуляция для моделей без нативной поддержки
-            thinking_instructions = """\n\nIMPORTANT: Use deep reasoning and step-by-step thinking. Before responding, think through:
-1. What is the core problem or question?
-2. What are the key factors to consider?
-3. What are the possible approaches or solutions?
-4. What are the pros and cons of each approach?
-5. What is the best solution and why?
-
-Show your reasoning process clearly. Think deeply before providing your final answer."""
             logger.debug(f"Model {model_name} does not support native thinking, using emulation")
         
         enhanced_messages = []
+        has_system = False
         for msg in messages:
             if msg.role == "system":
                 # Добавляем thinking инструкции к системному промпту
-                enhanced_content = msg.content + thinking_instructions
-                enhanced_messages.append(LLMMessage(role=msg.role, content=enhanced_content))
+                has_system = True
+                enhanced_messages.append(self._thinking_system_message(msg.content, supports_native_thinking))
             else:
                 enhanced_messages.append(msg)
         
         # Если нет системного сообщения, добавляем его
-        if not any(msg.role == "system" for msg in messages):
-            enhanced_messages.insert(0, LLMMessage(
-                role="system",
-                content=f"You are an AI assistant with exceptional reasoning capabilities.{thinking_instructions}"
-            ))
+        if not has_system:
+            enhanced_messages.insert(0, self._thinking_system_message(None, supports_native_thinking))
         
         return enhanced_messages
     
+    def _thinking_system_message(self, content: Optional[str], native: bool) -> LLMMessage:
+        """
+        Системное сообщение с thinking инструкциями.
+        
+        Кэшируется по (исходный промпт, режим): тот же системный промпт в каждом
+        ходе диалога даёт тот же объект, без повторной склейки длинных инструкций.
+        None - сообщение по умолчанию, когда системного промпта нет.
+        """
+        key = (content, native)
+        cached = self._thinking_system_messages.get(key)
+        if cached is not None:
+            self._thinking_system_messages.move_to_end(key)
+            return cached
+        
+        instructions = _THINKING_NATIVE_INSTRUCTIONS if native else _THINKING_EMULATED_INSTRUCTIONS
+        if content is None:
+            content = "You are an AI assistant with exceptional reasoning capabilities."
+        message = LLMMessage(role="system", content=content + instructions)
+        self._thinking_system_messages[key] = message
+        if len(self._thinking_system_messages) > self.MESSAGE_CACHE_MAX_ENTRIES:
+            self._thinking_system_messages.popitem(last=False)
+        return message
+    
     async def generate(
         self,
         messages: List[LLMMessage],
@@ -616,19 +860,67 @@ Show your reasoning process clearly. Think deeply before providing your final an
             **kwargs: Additional parameters including:
                 - server_url: Override server URL for this request only (thread-safe)
                 - task_type: Type of task for smart model selection
+        
+        Одинаковые запросы, пришедшие пока первый ещё выполняется, не отправляются
+        повторно, а ждут его результат (при включённом кэше).
         """
         if not self.client:
             raise LLMException("Ollama client not initialized")
         
+        if not self.cache_enabled or kwargs.get("_retry_count"):
+            return await self._generate(messages, model, temperature, max_tokens, thinking_mode, **kwargs)
+        
+        key = self._get_cache_key(
+            messages, model, temperature, max_tokens=max_tokens, thinking_mode=thinking_mode, **kwargs
+        )
+        entry = self._inflight.get(key)
+        coalesced = entry is not None and not entry[0].done()
+        if not coalesced:
+            task = asyncio.ensure_future(
+                self._generate(messages, model, temperature, max_tokens, thinking_mode, **kwargs)
+            )
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+        
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общий запрос
+            response = await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # Ушёл последний ожидающий - запрос больше никому не нужен
+                task.cancel()
+        if coalesced:
+            return response.model_copy(update={"metadata": {**(response.metadata or {}), "coalesced": True}})
+        return response
+    
+    def _forget_inflight(self, key: str, task: "asyncio.Future[LLMResponse]") -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+    
+    async def _generate(
+        self,
+        messages: List[LLMMessage],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        thinking_mode: bool = False,
+        **kwargs
+    ) -> LLMResponse:
+        """Запрос к /api/chat (с кэшем, fallback серверами и повторами)"""
         # Performance tracking
         tracker = get_performance_tracker()
         start_time = time.time()
         
         # Extract server_url override (thread-safe: uses separate client for request)
         server_url_override = kwargs.pop("server_url", None)
+        keep_alive = kwargs.pop("keep_alive", self.keep_alive)
         
-        # Check cache
-        cache_key = self._get_cache_key(messages, model, temperature, **kwargs)
+        # Check cache (ключ не считаем, если кэш выключен)
+        cache_key = self._get_cache_key(messages, model, temperature, **kwargs) if self.cache_enabled else ""
         cached = await self._get_cached(cache_key)
         if cached:
             return LLMResponse(
@@ -644,8 +936,8 @@ Show your reasoning process clearly. Think deeply before providing your final an
         # Подготавливаем промпты для thinking mode
         # Используем нативную поддержку если доступна, иначе эмуляцию
         enhanced_messages = self._enhance_prompt_for_thinking(messages, thinking_mode, model_name)
+        supports_native = self._check_thinking_support(model_name)
         if thinking_mode:
-            supports_native = self._check_thinking_support(model_name)
             mode_type = "native" if supports_native else "emulated"
             logger.debug(f"Using {mode_type} thinking mode for Ollama model {model_name}")
         
@@ -668,7 +960,7 @@ Show your reasoning process clearly. Think deeply before providing your final an
             
             # Добавляем нативный thinking mode параметр, если модель поддерживает
             # Ollama API может поддерживать параметр "thinking" для моделей с нативной поддержкой
-            if thinking_mode and self._check_thinking_support(model_name):
+            if thinking_mode and supports_native:
                 # Пробуем добавить нативный thinking параметр
                 # Формат может варьироваться в зависимости от версии Ollama API
                 thinking_budget = kwargs.get("thinking_budget_tokens", 4096)
@@ -689,83 +981,76 @@ Show your reasoning process clearly. Think deeply before providing your final an
             
             if max_tokens:
                 request_data["options"]["num_predict"] = max_tokens
+            if keep_alive is not None:
+                # keep_alive - параметр запроса, а не options
+                request_data["keep_alive"] = keep_alive
             
             # Determine which client to use (thread-safe server override)
             client_to_use = self.client
-            temp_client = None
             effective_url = self.base_url
             
             if server_url_override and server_url_override != self.base_url:
-                # Create temporary client for this request only (thread-safe)
+                # Per-server client reused across requests (keeps TCP connections alive)
                 effective_url = server_url_override
-                temp_client = httpx.AsyncClient(
-                    base_url=server_url_override,
-                    timeout=self.timeout,
-                    limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-                )
-                client_to_use = temp_client
-                logger.debug(f"Using temporary client for server: {server_url_override}")
+                client_to_use = self._get_server_client(server_url_override)
+                logger.debug(f"Using client for server: {server_url_override}")
             
             logger.debug(f"Making Ollama request to {effective_url}/api/chat for model {model_name}")
-            response = await client_to_use.post("/api/chat", json=request_data)
-            logger.debug(f"Ollama response received: status={response.status_code}")
-            response.raise_for_status()
-            
-            # Безопасный парсинг JSON с обработкой ошибок
-            response_text = response.text
+            # Ollama отвечает потоком NDJSON: разбираем фреймы по мере поступления
+            async with client_to_use.stream(
+                "POST", "/api/chat", content=_json_body(request_data), headers=_JSON_HEADERS
+            ) as response:
+                logger.debug(f"Ollama response received: status={response.status_code}")
+                _check_status(response, failover=len(self._all_server_urls) > 1)
+                data, unparsed_lines = await self._read_ndjson_stream(response)
             
-            # Инициализируем переменные
-            data = None
+            # Неразобранный остаток (не NDJSON): многострочный JSON или произвольный текст
+            response_text = "\n".join(unparsed_lines)
             content = ""
+            if data is None and response_text:
+                if len(response_text) > self.FALLBACK_PARSE_THREAD_THRESHOLD:
+                    # Большой неразобранный ответ: JSON/regex разбор не блокирует event loop
+                    data = await asyncio.to_thread(self._parse_unstructured_response, response_text)
+                else:
+                    data = self._parse_unstructured_response(response_text)
             
-            try:
-                # Try standard parsing first
-                data = response.json()
-            except json.JSONDecodeError as json_error:
-                # Ollama returns NDJSON (Newline Delimited JSON) for streaming-like responses
-                # Optimized parsing using efficient NDJSON approach
-                logger.debug(f"Standard JSON failed, parsing as NDJSON: {json_error}")
-                
-                data = self._parse_ndjson_response(response_text)
+            # Типы проверяются один раз: дальше frame и message - всегда словари
+            frame: Dict[str, Any] = data if isinstance(data, dict) else {}
+            message = frame.get("message")
+            has_message = isinstance(message, dict)
+            if not has_message:
+                message = {}
             
             # Извлекаем content с дополнительной проверкой
-            if data:
+            if has_message:
                 # Стандартный путь: message.content
-                if isinstance(data, dict):
-                    if "message" in data and isinstance(data["message"], dict):
-                        content = data["message"].get("content", "")
-                    elif "content" in data:
-                        content = data["content"]
-                    else:
-                        # Ищем content в любой вложенной структуре
-                        for key, value in data.items():
-                            if isinstance(value, dict) and "content" in value:
-                                content = value["content"]
-                                break
-                            elif isinstance(value, str) and len(value) > 10 and key != "model":
-                                # Используем строковое значение как контент, если оно достаточно длинное
-                                content = value
-                                break
+                content = message.get("content", "")
+            elif "content" in frame:
+                content = frame["content"]
+            else:
+                # Ищем content в любой вложенной структуре
+                for key, value in frame.items():
+                    if isinstance(value, dict) and "content" in value:
+                        content = value["content"]
+                        break
+                    elif isinstance(value, str) and len(value) > 10 and key != "model":
+                        # Используем строковое значение как контент, если оно достаточно длинное
+                        content = value
+                        break
             
             # Если все еще нет content, используем fallback методы
             if not content or len(content) < 5:
                 logger.warning("Could not extract meaningful content from Ollama response, using fallback")
                 # Пробуем извлечь любой осмысленный текст из response_text
-                lines = response_text.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    # Пропускаем JSON структуру и метаданные
-                    if (line and not line.startswith('{') and 
-                        '"model"' not in line and 
-                        '"done"' not in line and
-                        len(line) > 10):
-                        content = line
-                        break
+                # (пропуская JSON структуру и метаданные)
+                line_match = _RE_FALLBACK_LINE.search(response_text)
+                if line_match:
+                    content = line_match.group(1)
                 
                 if not content:
                     # Последняя попытка - используем весь текст, очищенный от JSON
-                    cleaned_text = re.sub(r'\{[^}]*\}', '', response_text)
-                    cleaned_text = re.sub(r'["{}]', '', cleaned_text).strip()
+                    cleaned_text = _RE_JSON_OBJECT.sub('', response_text)
+                    cleaned_text = _RE_JSON_CHARS.sub('', cleaned_text).strip()
                     if cleaned_text and len(cleaned_text) > 5:
                         content = cleaned_text
                     else:
@@ -777,60 +1062,50 @@ Show your reasoning process clearly. Think deeply before providing your final an
             
             # Формируем usage в правильном формате (словарь, а не число)
             usage_dict = None
-            if data and isinstance(data, dict):
-                eval_count = data.get("eval_count", 0)
-                prompt_eval_count = data.get("prompt_eval_count", 0)
-                if eval_count or prompt_eval_count:
-                    usage_dict = {
-                        "prompt_tokens": int(prompt_eval_count) if prompt_eval_count else 0,
-                        "completion_tokens": int(eval_count) if eval_count else 0,
-                        "total_tokens": int(prompt_eval_count + eval_count) if (prompt_eval_count or eval_count) else 0
-                    }
+            eval_count = frame.get("eval_count", 0)
+            prompt_eval_count = frame.get("prompt_eval_count", 0)
+            if eval_count or prompt_eval_count:
+                usage_dict = {
+                    "prompt_tokens": int(prompt_eval_count) if prompt_eval_count else 0,
+                    "completion_tokens": int(eval_count) if eval_count else 0,
+                    "total_tokens": int(prompt_eval_count + eval_count)
+                }
             
             # Извлекаем thinking content из ответа
             thinking_content = None
-            supports_native = self._check_thinking_support(model_name)
             
             if thinking_mode:
                 # Для моделей с нативной поддержкой thinking mode
                 # Ollama может возвращать thinking в отдельном поле ответа
-                if data and isinstance(data, dict):
+                if frame:
                     # Проверяем наличие thinking в ответе
-                    if "thinking" in data:
-                        thinking_content = data["thinking"]
-                    elif "message" in data and isinstance(data["message"], dict):
-                        if "thinking" in data["message"]:
-                            thinking_content = data["message"]["thinking"]
+                    if "thinking" in frame:
+                        thinking_content = frame["thinking"]
+                    elif "thinking" in message:
+                        thinking_content = message["thinking"]
                     
                     # Если thinking не найден в структурированном ответе,
                     # пытаемся извлечь из content (для DeepSeek-R1 и других моделей)
                     if not thinking_content and content:
                         # Сначала проверяем теги <think>...</think> (DeepSeek-R1 формат)
-                        import re
-                        think_pattern = re.compile(r'<think>(.*?)</think>', re.DOTALL | re.IGNORECASE)
-                        think_match = think_pattern.search(content)
+                        think_match = _RE_THINK_BLOCK.search(content)
                         
                         if think_match:
                             thinking_content = think_match.group(1).strip()
                             # Удаляем thinking блок из основного content
-                            content = think_pattern.sub('', content).strip()
+                            content = _RE_THINK_BLOCK.sub('', content).strip()
                             logger.debug(f"Extracted thinking from <think> tags: {len(thinking_content)} chars")
                         else:
-                            # Fallback: ищем другие маркеры reasoning
-                            reasoning_markers = [
-                                "Let me think", "Thinking:", "Reasoning:", "Analysis:",
-                                "Думаю:", "Рассуждение:", "Анализ:"
-                            ]
-                            for marker in reasoning_markers:
-                                if marker.lower() in content.lower():
-                                    marker_pos = content.lower().find(marker.lower())
-                                    # Берем до двойного переноса строки
-                                    next_para = content.find("\n\n", marker_pos)
-                                    if next_para > marker_pos:
-                                        thinking_content = content[marker_pos:next_para].strip()
-                                    else:
-                                        thinking_content = content[marker_pos:marker_pos + 500].strip()
-                                    break
+                            # Fallback: ищем другие маркеры reasoning (один проход, первое вхождение)
+                            marker_match = _RE_REASONING_MARKER.search(content)
+                            if marker_match:
+                                marker_pos = marker_match.start()
+                                # Берем до двойного переноса строки
+                                next_para = content.find("\n\n", marker_pos)
+                                if next_para > marker_pos:
+                                    thinking_content = content[marker_pos:next_para].strip()
+                                else:
+                                    thinking_content = content[marker_pos:marker_pos + 500].strip()
             
             # Record successful request metrics
             duration = time.time() - start_time
@@ -847,10 +1122,10 @@ Show your reasoning process clearly. Think deeply before providing your final an
                 content=content,
                 model=model_name,
                 usage=usage_dict,
-                finish_reason=data.get("done_reason") if data and isinstance(data, dict) else None,
+                finish_reason=frame.get("done_reason"),
                 metadata={
                     "provider": "ollama",
-                    "done": data.get("done", False) if data and isinstance(data, dict) else False,
+                    "done": frame.get("done", False),
                     "thinking_mode": thinking_mode,
                     "thinking_native": supports_native,  # Указываем, используется ли нативный thinking
                     "thinking_emulated": thinking_mode and not supports_native,  # Эмуляция только если не нативный
@@ -860,6 +1135,30 @@ Show your reasoning process clearly. Think deeply before providing your final an
                 has_thinking=thinking_content is not None
             )
         except (httpx.HTTPError, httpx.ConnectError, httpx.TimeoutException) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+                # Модели нет на этом сервере: сразу переходим на следующий, без backoff
+                retry_count = kwargs.get("_retry_count", 0)
+                if retry_count < len(self._all_server_urls) - 1 and await self._try_next_server():
+                    logger.info(f"Model not found, switched to fallback server: {self.base_url}")
+                    return await self._generate(
+                        messages=messages,
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        thinking_mode=thinking_mode,
+                        keep_alive=keep_alive,
+                        **{**kwargs, "_retry_count": retry_count + 1}
+                    )
+                tracker.record_request(
+                    provider="ollama",
+                    model=model or self.default_model,
+                    duration=time.time() - start_time,
+                    tokens=0,
+                    success=False,
+                    error_type="HTTPStatusError"
+                )
+                raise LLMException(_STATUS_ERRORS[404]) from e
+            
             # Пробуем fallback сервер при ошибках подключения с exponential backoff
             logger.warning(f"Ollama request failed: {e}. Trying fallback server with exponential backoff...")
             
@@ -889,12 +1188,13 @@ Show your reasoning process clearly. Think deeply before providing your final an
                     logger.info(f"Switched to fallback server: {self.base_url}")
                 
                 try:
-                    return await self.generate(
+                    return await self._generate(
                         messages=messages,
                         model=model,
                         temperature=temperature,
                         max_tokens=max_tokens,
                         thinking_mode=thinking_mode,
+                        keep_alive=keep_alive,
                         _retry_count=retry_count + 1,
                         **kwargs
                     )
@@ -912,6 +1212,17 @@ Show your reasoning process clearly. Think deeply before providing your final an
                 error_type="HTTPError"
             )
             raise LLMException(f"Ollama API error after {retry_count + 1} attempts: {e}") from e
+        except LLMException:
+            # Ошибка запроса (4xx): без повторов
+            tracker.record_request(
+                provider="ollama",
+                model=model or self.default_model,
+                duration=time.time() - start_time,
+                tokens=0,
+                success=False,
+                error_type="HTTPStatusError"
+            )
+            raise
         except Exception as e:
             # Для других ошибок также пробуем fallback с exponential backoff
             if "connect" in str(e).lower() or "timeout" in str(e).lower():
@@ -940,12 +1251,13 @@ Show your reasoning process clearly. Think deeply before providing your final an
                         logger.info(f"Switched to fallback server: {self.base_url}")
                     
                     try:
-                        return await self.generate(
+                        return await self._generate(
                             messages=messages,
                             model=model,
                             temperature=temperature,
                             max_tokens=max_tokens,
                             thinking_mode=thinking_mode,
+                            keep_alive=keep_alive,
                             _retry_count=retry_count + 1,
                             **kwargs
                         )
@@ -963,13 +1275,6 @@ Show your reasoning process clearly. Think deeply before providing your final an
                 error_type=type(e).__name__
             )
             raise LLMException(f"Ollama error after retries: {e}") from e
-        finally:
-            # Always close temporary client to prevent resource leaks
-            if temp_client is not None:
-                try:
-                    await temp_client.aclose()
-                except Exception as close_error:
-                    logger.debug(f"Error closing temporary client: {close_error}")
     
     async def stream(
         self,
@@ -985,6 +1290,7 @@ Show your reasoning process clearly. Think deeply before providing your final an
             raise LLMException("Ollama client not initialized")
         
         model_name = model or self.default_model
+        keep_alive = kwargs.pop("keep_alive", self.keep_alive)
         
         try:
             ollama_messages = [
@@ -1004,22 +1310,26 @@ Show your reasoning process clearly. Think deeply before providing your final an
             
             if max_tokens:
                 request_data["options"]["num_predict"] = max_tokens
+            if keep_alive is not None:
+                request_data["keep_alive"] = keep_alive
             
-            async with self.client.stream("POST", "/api/chat", json=request_data) as response:
-                response.raise_for_status()
+            async with self.client.stream(
+                "POST", "/api/chat", content=_json_body(request_data), headers=_JSON_HEADERS
+            ) as response:
+                _check_status(response)
                 async for line in response.aiter_lines():
                     if line:
                         try:
                             # Пробуем парсить как JSON
-                            data = json.loads(line)
+                            data = _json_loads(line)
                             if "message" in data and "content" in data["message"]:
                                 yield data["message"]["content"]
                         except json.JSONDecodeError:
                             # Если не JSON, пробуем извлечь текст
-                            json_match = re.search(r'\{.*"content".*\}', line, re.DOTALL)
+                            json_match = _RE_STREAM_CONTENT.search(line)
                             if json_match:
                                 try:
-                                    data = json.loads(json_match.group())
+                                    data = _json_loads(json_match.group())
                                     if "message" in data and "content" in data["message"]:
                                         yield data["message"]["content"]
                                 except (json.JSONDecodeError, KeyError, TypeError):
@@ -1032,9 +1342,38 @@ Show your reasoning process clearly. Think deeply before providing your final an
                                 continue
         except httpx.HTTPError as e:
             raise LLMException(f"Ollama streaming error: {e}") from e
+        except LLMException:
+            raise
         except Exception as e:
             raise LLMException(f"Ollama streaming error: {e}") from e
     
+    async def warm_model(self, model: str, keep_alive: Optional[Union[int, str]] = None) -> bool:
+        """
+        Загружает модель в память без генерации.
+        
+        Запрос /api/generate без prompt только загружает модель, поэтому
+        следующий generate() не ждёт её загрузки (десятки секунд для больших моделей).
+        """
+        if not self.client:
+            return False
+        
+        request_data: Dict[str, Any] = {"model": model}
+        keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+        if keep_alive is not None:
+            request_data["keep_alive"] = keep_alive
+        
+        try:
+            response = await self.client.post(
+                "/api/generate", content=_json_body(request_data), headers=_JSON_HEADERS
+            )
+            if response.status_code >= 400:
+                logger.debug(f"Failed to warm Ollama model {model}: HTTP {response.status_code}")
+                return False
+            return True
+        except httpx.HTTPError as e:
+            logger.debug(f"Failed to warm Ollama model {model}: {e}")
+            return False
+    
     async def list_models(self) -> List[str]:
         """List available Ollama models"""
         if not self.client:
@@ -1047,7 +1386,7 @@ Show your reasoning process clearly. Think deeply before providing your final an
             response = await self.client.get("/api/tags")
             if response.status_code == 200:
                 data = response.json()
-                self._available_models = [model["name"] for model in data.get("models", [])]
+                self._set_available_models([model["name"] for model in data.get("models", [])])
                 return self._available_models
         except Exception as e:
             logger.warning(f"Failed to list Ollama models: {e}")
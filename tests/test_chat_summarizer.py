@@ -47,6 +47,13 @@ class TestChatMessage:
         assert msg.role == "user"
         assert msg.content == "Test message"
     
+    def test_slots(self):
+        """Test that messages carry no per-instance __dict__."""
+        msg = ChatMessage(role="user", content="Hi")
+        assert not hasattr(msg, "__dict__")
+        assert msg.metadata is None
+        assert msg.to_dict()["metadata"] == {}
+    
     def test_token_estimate(self):
         """Test token estimation."""
         msg = ChatMessage(role="user", content="a" * 100)
@@ -86,6 +93,35 @@ class TestConversationSummary:
         assert "API" in prompt
         assert "FastAPI endpoint" in prompt
         assert "PostgreSQL" in prompt
+    
+    def test_to_system_prompt_memoized(self):
+        """Test that rendered prompt is reused."""
+        summary = ConversationSummary(summary_text="Cached", messages_summarized=2)
+        assert summary.to_system_prompt() is summary.to_system_prompt()
+    
+    def test_frozen_copy_rerenders(self):
+        """Test that a replaced summary does not reuse the stale rendered prompt."""
+        import dataclasses
+        
+        summary = ConversationSummary(summary_text="Cached", messages_summarized=2)
+        summary.to_system_prompt()
+        
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            summary.messages_summarized = 9
+        updated = dataclasses.replace(summary, messages_summarized=9)
+        
+        assert "(9 сообщений)" in updated.to_system_prompt()
+        assert "(2 сообщений)" in summary.to_system_prompt()
+    
+    def test_from_dict_roundtrip(self):
+        """Test deserialization."""
+        summary = ConversationSummary(
+            summary_text="Roundtrip",
+            messages_summarized=3,
+            key_topics=["A"]
+        )
+        restored = ConversationSummary.from_dict(summary.to_dict())
+        assert restored == summary
 
 
 class TestChatSummarizer:
@@ -127,6 +163,15 @@ class TestChatSummarizer:
         ]
         assert summarizer.needs_summarization(messages) is True
     
+    def test_needs_summarization_ignores_system(self, summarizer):
+        """Test that system messages don't count towards the threshold."""
+        messages = [ChatMessage(role="system", content="Rules")] * 4 + [
+            ChatMessage(role="user", content=f"Message {i}")
+            for i in range(5)
+        ]
+        assert summarizer.needs_summarization_count(messages) == 5
+        assert summarizer.needs_summarization(messages) is False
+    
     @pytest.mark.asyncio
     async def test_summarize_short_history(self, summarizer):
         """Test that short history is not summarized."""
@@ -170,6 +215,132 @@ class TestChatSummarizer:
         assert "Python" in summary.key_topics
         assert summary.summary_text == "Discussion about Python programming"
     
+    @pytest.mark.asyncio
+    async def test_summarize_with_llm_trailing_text(self, summarizer_with_llm):
+        """Test JSON extraction when LLM adds prose after the object."""
+        summarizer_with_llm.llm_manager.generate.return_value = MagicMock(
+            content='Вот резюме: {"summary": "Nested {braces}", "key_topics": ["X"]} Готово {end}'
+        )
+        messages = [
+            ChatMessage(role="user", content=f"User message {i}")
+            for i in range(10)
+        ]
+        
+        _, summary = await summarizer_with_llm.summarize_if_needed(messages)
+        
+        assert summary.summary_text == "Nested {braces}"
+        assert summary.key_topics == ["X"]
+    
+    @pytest.mark.asyncio
+    async def test_hierarchical_summary(self, summarizer_with_llm):
+        """Test that very long dialogs are summarized chunk by chunk."""
+        summarizer_with_llm.chunk_size = 20
+        messages = [
+            ChatMessage(role="user", content=f"User message {i}")
+            for i in range(50)
+        ]
+        
+        _, summary = await summarizer_with_llm.summarize_if_needed(messages)
+        
+        # 47 сообщений -> 3 чанка + финальное суммирование
+        assert summarizer_with_llm.llm_manager.generate.await_count == 4
+        assert summary.messages_summarized == 47
+    
+    @pytest.mark.asyncio
+    async def test_summarize_many(self, summarizer_with_llm):
+        """Test that several conversations are summarized with one LLM call each."""
+        llm = summarizer_with_llm.llm_manager
+        
+        async def generate(messages, **kwargs):
+            if "c3 0" in messages[-1].content:
+                raise RuntimeError("model overloaded")
+            name = "First" if "c1 0" in messages[-1].content else "Second"
+            return MagicMock(content=f'{{"summary": "{name}"}}')
+        
+        llm.generate = AsyncMock(side_effect=generate)
+        conversations = {
+            conv_id: [ChatMessage(role="user", content=f"{conv_id} {i}") for i in range(10)]
+            for conv_id in ("c1", "c2", "c3")
+        }
+        conversations["short"] = [ChatMessage(role="user", content="Hi")]
+        
+        summaries = await summarizer_with_llm.summarize_many(conversations)
+        
+        assert llm.generate.await_count == 3
+        assert summaries["c1"].summary_text == "First"
+        assert summaries["c2"].messages_summarized == 7
+        assert summaries["c3"].messages_summarized == 7
+        assert "short" not in summaries
+        assert summarizer_with_llm.get_cached_summary("c2").summary_text == "Second"
+    
+    @pytest.mark.asyncio
+    async def test_semantic_cache_hit(self, summarizer_with_llm):
+        """Test that similar dialogs reuse a summary without calling LLM."""
+        embedder = MagicMock()
+        embedder.encode.side_effect = lambda texts: [[1.0, 0.0, 0.1]]
+        summarizer_with_llm.embedder = embedder
+        llm = summarizer_with_llm.llm_manager
+        
+        first = [ChatMessage(role="user", content=f"Question {i}") for i in range(10)]
+        second = [ChatMessage(role="user", content=f"Вопрос {i}") for i in range(12)]
+        
+        _, summary1 = await summarizer_with_llm.summarize_if_needed(first)
+        _, summary2 = await summarizer_with_llm.summarize_if_needed(second)
+        
+        assert llm.generate.await_count == 1
+        assert summary2.summary_text == summary1.summary_text
+        assert summary2.messages_summarized == 9
+    
+    @pytest.mark.asyncio
+    async def test_non_json_response_truncated(self, summarizer_with_llm):
+        """Test that plain-text LLM output is truncated to the token budget."""
+        summarizer_with_llm.max_summary_tokens = 10
+        summarizer_with_llm.llm_manager.generate.return_value = MagicMock(
+            content="word " * 500
+        )
+        messages = [
+            ChatMessage(role="user", content=f"User message {i}")
+            for i in range(10)
+        ]
+        
+        _, summary = await summarizer_with_llm.summarize_if_needed(messages)
+        
+        assert 0 < len(summary.summary_text) < 100
+    
+    def test_truncate_counts_multitoken_chars(self, monkeypatch):
+        """Test that short text of multi-token characters is still truncated."""
+        from backend.core import chat_summarizer
+        
+        encoding = MagicMock()
+        encoding.encode.side_effect = lambda text: [ord(ch) for ch in text for _ in range(3)]
+        encoding.decode.side_effect = lambda tokens: "".join(chr(t) for t in tokens[::3])
+        monkeypatch.setattr(chat_summarizer, "_token_encoding", encoding)
+        
+        assert chat_summarizer._truncate_to_tokens("日本語" * 4, 12) == "日本語日"
+        assert chat_summarizer._truncate_to_tokens("ok", 12) == "ok"
+    
+    @pytest.mark.asyncio
+    async def test_summarize_many_parses_off_loop(self, summarizer_with_llm, monkeypatch):
+        """Test that batch responses are parsed in a worker thread, not on the event loop."""
+        import threading
+        
+        threads = []
+        parse = summarizer_with_llm._summary_from_response
+        
+        def tracking_parse(content, messages):
+            threads.append(threading.current_thread())
+            return parse(content, messages)
+        
+        monkeypatch.setattr(summarizer_with_llm, "_summary_from_response", tracking_parse)
+        conversations = {
+            "c1": [ChatMessage(role="user", content=f"Message {i}") for i in range(10)]
+        }
+        
+        summaries = await summarizer_with_llm.summarize_many(conversations)
+        
+        assert summaries["c1"].summary_text == "Discussion about Python programming"
+        assert threads and threading.main_thread() not in threads
+    
     @pytest.mark.asyncio
     async def test_caching(self, summarizer):
         """Test that summaries are cached."""
@@ -195,13 +366,93 @@ class TestChatSummarizer:
     
     def test_clear_cache(self, summarizer):
         """Test cache clearing."""
-        summarizer._summary_cache["test"] = ConversationSummary(
+        summarizer._summary_cache.set("test", ConversationSummary(
             summary_text="Test",
             messages_summarized=1
-        )
+        ))
         
         summarizer.clear_cache("test")
-        assert "test" not in summarizer._summary_cache
+        assert summarizer.get_cached_summary("test") is None
+    
+    def test_summary_cache_lru_eviction(self):
+        """Test that summary cache is bounded."""
+        summarizer = ChatSummarizer(cache_max_entries=2)
+        for conv_id in ("a", "b", "c"):
+            summarizer._summary_cache.set(conv_id, ConversationSummary(
+                summary_text=conv_id,
+                messages_summarized=1
+            ))
+        
+        assert len(summarizer._summary_cache) == 2
+        assert summarizer.get_cached_summary("a") is None
+        assert summarizer.get_cached_summary("c") is not None
+    
+    def test_summary_cache_redis_tier(self):
+        """Test that summaries are shared through Redis."""
+        redis_client = MagicMock()
+        writer = ChatSummarizer(redis_client=redis_client)
+        writer._summary_cache.set("conv", ConversationSummary(
+            summary_text="Shared",
+            messages_summarized=4
+        ))
+        key, ttl, payload = redis_client.setex.call_args[0]
+        assert key == "summary:conv"
+        
+        redis_client.get.return_value = payload
+        reader = ChatSummarizer(redis_client=redis_client)
+        summary = reader.get_cached_summary("conv")
+        
+        assert summary.summary_text == "Shared"
+        assert summary.messages_summarized == 4
+    
+    def test_summary_cache_clear_scans_redis(self):
+        """Test that clearing Redis uses SCAN with batched deletes, not KEYS."""
+        redis_client = MagicMock()
+        redis_client.scan_iter.return_value = iter(f"summary:{i}" for i in range(5))
+        summarizer = ChatSummarizer(redis_client=redis_client)
+        summarizer._summary_cache.CLEAR_BATCH_SIZE = 2
+        
+        summarizer.clear_cache()
+        
+        redis_client.keys.assert_not_called()
+        assert redis_client.scan_iter.call_args.kwargs["match"] == "summary:*"
+        assert [c.args for c in redis_client.delete.call_args_list] == [
+            ("summary:0", "summary:1"), ("summary:2", "summary:3"), ("summary:4",)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_summary_cache_redis_read_off_loop(self):
+        """Test that async paths read Redis from a worker thread."""
+        import threading
+        
+        threads = []
+        redis_client = MagicMock()
+        redis_client.get.side_effect = lambda key: threads.append(threading.current_thread())
+        summarizer = ChatSummarizer(redis_client=redis_client, threshold=5, keep_recent=3)
+        messages = [ChatMessage(role="user", content=f"Message {i}") for i in range(10)]
+        
+        await summarizer.summarize_if_needed(messages, conversation_id="conv")
+        
+        assert threads and threading.main_thread() not in threads
+        assert redis_client.setex.called
+    
+    @pytest.mark.parametrize("use_msgspec", [False, True])
+    def test_summary_serialization_roundtrip(self, monkeypatch, use_msgspec):
+        """Test Redis payload encoding with and without msgspec."""
+        import backend.core.chat_summarizer as module
+        if use_msgspec and not module.MSGSPEC_AVAILABLE:
+            pytest.skip("msgspec not installed")
+        monkeypatch.setattr(module, "USE_MSGSPEC", use_msgspec)
+        
+        summary = ConversationSummary(
+            summary_text="Roundtrip",
+            messages_summarized=7,
+            key_decisions=["Use Redis"]
+        )
+        payload = module._encode_summary(summary)
+        
+        assert json.loads(payload)["messages_summarized"] == 7
+        assert module._decode_summary(payload) == summary
     
     def test_prepare_messages_with_summary(self, summarizer):
         """Test preparing messages with summary."""
@@ -228,6 +479,17 @@ class TestChatSummarizer:
         # Other messages should follow
         assert len(result) == 3
     
+    def test_prepare_messages_reuses_system_prompt(self, summarizer):
+        """Test that enhanced system prompt is cached per summary."""
+        summary = ConversationSummary(summary_text="Greetings", messages_summarized=5)
+        
+        first = summarizer.prepare_messages_with_summary([], summary, "System")
+        second = summarizer.prepare_messages_with_summary([], summary, "System")
+        other = summarizer.prepare_messages_with_summary([], summary, "Other")
+        
+        assert first[0].content is second[0].content
+        assert other[0].content.startswith("Other")
+    
     def test_simple_summary_extraction(self, summarizer):
         """Test heuristic summary without LLM."""
         messages = [
@@ -243,6 +505,33 @@ class TestChatSummarizer:
         assert len(summary.key_topics) > 0 or len(summary.user_requirements) > 0
         # Should detect code artifacts
         assert "код" in summary.generated_artifacts
+    
+    def test_simple_summary_requirements(self, summarizer):
+        """Test requirement detection by verb stems."""
+        messages = [
+            ChatMessage(role="user", content="Добавьте логирование. Как это работает?"),
+            ChatMessage(role="user", content="Напишите README"),
+            ChatMessage(role="user", content="Просто комментарий"),
+        ]
+        
+        summary = summarizer._create_simple_summary(messages)
+        
+        assert summary.key_topics == ["Добавьте логирование. Как это работает?"]
+        assert summary.user_requirements == ["Напишите README"]
+    
+    def test_simple_summary_cached(self, summarizer):
+        """Test that heuristic summary is memoized by message fingerprint."""
+        messages = [ChatMessage(role="user", content="Как создать API?")]
+        
+        first = summarizer._create_simple_summary(messages)
+        second = summarizer._create_simple_summary(messages)
+        
+        assert first == second
+        assert first is not second
+        assert len(summarizer._simple_summary_cache) == 1
+        
+        summarizer.clear_cache()
+        assert len(summarizer._simple_summary_cache) == 0
 
 
 class TestGetChatSummarizer:
@@ -126,6 +126,45 @@ print("Hello")
             assert result.success is False
             assert "sandbox" in result.execution_error.lower() or "rejected" in result.execution_error.lower()
     
+    def test_dangerous_pattern_reported(self, tester):
+        """Test that the matched pattern is reported."""
+        is_safe, warning = tester._check_dangerous_code("import shutil\nshutil.rmtree('/tmp/x')")
+        assert is_safe is False
+        assert "rmtree" in warning
+        
+        is_safe, _ = tester._check_dangerous_code("f = open('out.txt', 'w')")
+        assert is_safe is False
+        
+        is_safe, warning = tester._check_dangerous_code("data = open('in.txt').read()")
+        assert is_safe is True
+        assert warning is None
+    
+    def test_dangerous_code_ast_scan(self, tester):
+        """Test that the AST scan ignores strings and catches aliased imports."""
+        is_safe, _ = tester._check_dangerous_code("# os.system is dangerous\nmsg = 'eval(x)'")
+        assert is_safe is True
+        
+        is_safe, warning = tester._check_dangerous_code("from os import system\nsystem('ls')")
+        assert is_safe is False
+        assert "os.system" in warning
+        
+        is_safe, _ = tester._check_dangerous_code("f = open('out.txt', mode='w')")
+        assert is_safe is False
+    
+    @pytest.mark.parametrize("code", [
+        "import builtins; builtins.exec('print(1)')",
+        "__builtins__.__import__('os').system('id')",
+        "import builtins as b\nb.eval('1')",
+        "getattr(builtins, 'exec')('print(1)')",
+        "getattr(__builtins__, name)('x')",
+        "f = getattr(obj, '__import__')",
+    ])
+    def test_dangerous_builtins_via_attribute_blocked(self, tester, code):
+        """Test that eval/exec/__import__ reached through attributes or getattr are blocked."""
+        is_safe, warning = tester._check_dangerous_code(code)
+        assert is_safe is False
+        assert warning
+    
     @pytest.mark.asyncio
     async def test_non_python_language(self, tester):
         """Test that non-Python languages return gracefully."""
@@ -150,6 +189,401 @@ console.log("Hello");
         """Test output checking - numeric comparison."""
         assert tester._check_output("result: 3.14159", "3.14159") is True
         assert tester._check_output("x=3.14, y=2.71", "3.14, 2.71") is True
+    
+    def test_check_output_numeric_tolerance(self, tester):
+        """Test numeric tolerance and count mismatch."""
+        assert tester._check_output("1.00001 2.0", "1.0 2.00002") is True
+        assert tester._check_output("1.0 2.0", "1.0 2.1") is False
+        assert tester._check_output("1.0 2.0 3.0", "1.5 2.0") is False
+    
+    @pytest.mark.asyncio
+    async def test_custom_tests_run(self, tester):
+        """Test running custom pytest tests against the code."""
+        if not tester._pytest_available:
+            pytest.skip("pytest not available")
+        code = """
+def add(a, b):
+    return a + b
+"""
+        tests = """
+def test_add():
+    assert add(1, 2) == 3
+
+def test_add_wrong():
+    assert add(1, 1) == 3
+"""
+        result = await tester.test_code(code=code, language="python", custom_tests=tests)
+        
+        assert result.tests_run == 2
+        assert result.tests_passed == 1
+        assert result.tests_failed == 1
+        assert result.success is False
+    
+    @pytest.mark.asyncio
+    async def test_custom_and_generated_tests_single_run(self, tester_with_llm):
+        """Test that custom and generated tests share one pytest run."""
+        code = "def add(a, b):\n    return a + b\n"
+        custom = "def test_add():\n    assert add(2, 2) == 4\n"
+        
+        with patch.object(tester_with_llm, "_run_tests", wraps=tester_with_llm._run_tests) as run_tests:
+            result = await tester_with_llm.test_code(
+                code=code,
+                task_description="Add two numbers",
+                custom_tests=custom
+            )
+        
+        assert run_tests.await_count == 1
+        names = [tc.name for tc in result.test_cases]
+        if tester_with_llm._pytest_available:
+            assert names == ["test_add", "test_auto_add", "test_auto_add_negative"]
+            assert result.success is True
+    
+    @pytest.mark.asyncio
+    async def test_generated_import_error_keeps_custom_results(self, tester_with_llm):
+        """Test that a broken import in generated tests doesn't hide custom tests."""
+        tester_with_llm.llm_manager.generate.return_value = MagicMock(
+            content="from solution import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+        )
+        code = "def add(a, b):\n    return a + b\n"
+        custom = "def test_add():\n    assert add(2, 2) == 4\n"
+        
+        result = await tester_with_llm.test_code(
+            code=code,
+            task_description="Add two numbers",
+            custom_tests=custom
+        )
+        
+        if tester_with_llm._pytest_available:
+            passed = [tc.name for tc in result.test_cases if tc.status == TestStatus.PASSED]
+            assert passed == ["test_add"]
+            assert result.tests_passed == 1
+            assert result.success is False
+        
+    @pytest.mark.asyncio
+    async def test_generation_overlaps_execution(self, tester_with_llm):
+        """Test that test generation starts before code execution finishes."""
+        events = []
+        
+        async def slow_execute(code):
+            events.append("execute_start")
+            await asyncio.sleep(0.05)
+            events.append("execute_end")
+            return {"success": False, "stderr": "boom"}
+        
+        async def generate(code, task):
+            events.append("generate_start")
+            await asyncio.sleep(1)
+            events.append("generate_end")
+        
+        with patch.object(tester_with_llm, "_execute_code", side_effect=slow_execute), \
+                patch.object(tester_with_llm, "_generate_tests", side_effect=generate):
+            result = await tester_with_llm.test_code(code="def f():\n    return 1", task_description="Task")
+            await asyncio.sleep(0)
+        
+        assert result.code_ran_successfully is False
+        assert events.index("generate_start") < events.index("execute_end")
+        # Генерация отменена после неудачного запуска
+        assert "generate_end" not in events
+    
+    @pytest.mark.asyncio
+    async def test_script_without_defs_skips_generation(self, tester_with_llm):
+        """Test that straight-line scripts don't trigger test generation."""
+        result = await tester_with_llm.test_code(
+            code="print(1 + 2)",
+            task_description="Print a sum"
+        )
+        
+        assert result.success is True
+        assert result.generated_tests is None
+        tester_with_llm.llm_manager.generate.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_execute_code_via_stdin_isolated(self, tester):
+        """Test that code runs from stdin in isolated mode."""
+        result = await tester._execute_code(
+            "import sys\nprint(sys.flags.isolated, sys.argv[0])"
+        )
+        
+        assert result["success"] is True
+        assert result["stdout"].strip() == "1 -"
+    
+    def test_pytest_probe_shared(self):
+        """Test that the pytest probe runs once per process."""
+        from backend.core.code_tester import _pytest_installed
+        
+        first = CodeTester(reuse_pytest_worker=False)
+        second = CodeTester(reuse_pytest_worker=False)
+        
+        assert first._pytest_available == second._pytest_available
+        assert _pytest_installed.cache_info().misses == 1
+    
+    @pytest.mark.asyncio
+    async def test_test_and_fix_reuses_generated_tests(self, tester_with_llm):
+        """Test that fix attempts rerun the first generated tests."""
+        first = TestResult(success=False, generated_tests="def test_x():\n    assert f() == 2")
+        second = TestResult(success=True)
+        
+        with patch.object(tester_with_llm, "test_code", AsyncMock(side_effect=[first, second])) as test_code, \
+                patch.object(tester_with_llm, "_fix_failing_code", AsyncMock(return_value="def f():\n    return 2")):
+            code, result = await tester_with_llm.test_and_fix("def f():\n    return 1", "Return two")
+        
+        assert code == "def f():\n    return 2"
+        assert result.success is True
+        retry_kwargs = test_code.await_args_list[1].kwargs
+        assert retry_kwargs["custom_tests"] == first.generated_tests
+        assert retry_kwargs["run_generated_tests"] is False
+    
+    @pytest.mark.asyncio
+    async def test_run_tests_leaves_no_files(self, tester, tmp_path):
+        """Test that test runs clean up their temp directory and bytecode."""
+        tester._tmp_dir = str(tmp_path)
+        
+        await tester._run_tests("def f():\n    return 1", "def test_f():\n    assert f() == 1")
+        await tester._execute_code("print(1)")
+        
+        assert list(tmp_path.iterdir()) == []
+    
+    @pytest.mark.asyncio
+    async def test_execute_code_uses_posix_spawn(self, tester):
+        """Test that code execution avoids fork+exec where posix_spawn is available."""
+        import os
+        import subprocess
+        if not subprocess._USE_POSIX_SPAWN:
+            pytest.skip("posix_spawn not used on this platform")
+        
+        with patch("os.posix_spawn", wraps=os.posix_spawn) as spawn:
+            result = await tester._execute_code("print('ok')")
+        
+        assert result["stdout"].strip() == "ok"
+        spawn.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_cold_pytest_runs_in_temp_dir(self):
+        """Test that a cold pytest run can't see the server's working directory."""
+        tester = CodeTester(reuse_pytest_worker=False)
+        if not tester._pytest_available:
+            pytest.skip("pytest not available")
+        tests = (
+            "import os\n\n"
+            "def test_cwd_is_temp_dir():\n"
+            "    assert os.getcwd() == os.path.dirname(os.path.abspath(__file__))\n\n"
+            "def test_server_modules_hidden():\n"
+            "    import importlib.util\n"
+            "    assert importlib.util.find_spec('backend') is None\n"
+        )
+        
+        result = await tester._run_tests("x = 1\n", tests)
+        
+        assert result.tests_passed == 2
+        assert result.success is True
+    
+    @pytest.mark.asyncio
+    async def test_fix_max_tokens_clamped(self, tester_with_llm):
+        """Test that the fix request budget scales with code size within bounds."""
+        generate = tester_with_llm.llm_manager.generate
+        generate.return_value = MagicMock(content="```python\ndef f():\n    return 2\n```")
+        failed = TestResult(success=False, execution_error="AssertionError")
+        
+        fixed = await tester_with_llm._fix_failing_code("def f():\n    return 1", failed, "Return two")
+        assert fixed == "def f():\n    return 2"
+        assert generate.await_args.kwargs["max_tokens"] == CodeTester.FIX_MIN_TOKENS
+        
+        await tester_with_llm._fix_failing_code("x = 1\n" * 10000, failed, "Task")
+        assert generate.await_args.kwargs["max_tokens"] == CodeTester.FIX_MAX_TOKENS
+    
+    @pytest.mark.asyncio
+    async def test_run_tests_accepts_encoded_code(self, tester):
+        """Test that pre-encoded non-ASCII code is written and tested as UTF-8."""
+        code = "def greet():\n    return 'привет'\n".encode("utf-8")
+        
+        result = await tester._run_tests(code, "def test_greet():\n    assert greet() == 'привет'")
+        exec_result = await tester._execute_code(code + b"print(greet())\n")
+        
+        assert result.success is True
+        assert exec_result["stdout"].strip() == "привет"
+    
+    @pytest.mark.asyncio
+    async def test_large_code_checked_off_loop(self, tester):
+        """Test that only large code is sandbox-checked in a worker thread."""
+        with patch("asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+            await tester.test_code(code="eval('1')")
+            to_thread.assert_not_called()
+            
+            big = "x = 1\n" * (CodeTester.SANDBOX_OFFLOAD_THRESHOLD // 6 + 1) + "eval('1')"
+            result = await tester.test_code(code=big)
+        
+        assert result.success is False
+        assert to_thread.call_args.args[0] == tester._check_dangerous_code
+    
+    @pytest.mark.asyncio
+    async def test_large_stderr_keeps_tail(self, tester):
+        """Test that oversized stderr is cut to its tail, keeping the traceback."""
+        from backend.core.code_tester import _MAX_STDERR_BYTES
+        
+        result = await tester._execute_code(
+            "import sys\nsys.stderr.write('x' * 200000)\nraise ValueError('boom')"
+        )
+        
+        assert len(result["stderr"]) <= _MAX_STDERR_BYTES
+        assert "ValueError: boom" in result["stderr"]
+    
+    @pytest.mark.asyncio
+    async def test_sandbox_memory_limit(self, tester):
+        """Test that sandboxed code and tests cannot allocate past the memory limit."""
+        from backend.core.code_tester import RESOURCE_AVAILABLE
+        if not RESOURCE_AVAILABLE:
+            pytest.skip("resource module not available")
+        
+        exec_result = await tester._execute_code("data = bytearray(1 << 30)")
+        assert exec_result["success"] is False
+        assert "MemoryError" in exec_result["stderr"]
+        
+        result = await tester._run_tests(
+            "def allocate():\n    return bytearray(1 << 30)",
+            "def test_allocate():\n    assert allocate()"
+        )
+        assert result.success is False
+        
+        unrestricted = CodeTester(sandbox_mode=False, reuse_pytest_worker=False)
+        assert unrestricted._sandbox_limits(unrestricted.EXECUTION_TIMEOUT) == []
+    
+    @pytest.mark.asyncio
+    async def test_pytest_output_line_over_limit(self):
+        """Test that an over-long pytest output line doesn't break result parsing."""
+        tester = CodeTester(reuse_pytest_worker=False)
+        if not tester._pytest_available:
+            pytest.skip("pytest not available")
+        tests = (
+            "def test_ok():\n    assert f() == 1\n\n"
+            "def test_noisy():\n    print('x' * (2 * 1024 * 1024))\n    assert False\n"
+        )
+        
+        result = await tester._run_tests("def f():\n    return 1\n", tests)
+        
+        assert result.tests_passed == 1
+        assert result.tests_failed == 1
+        assert result.tests_error == 0
+    
+    def test_prefix_generated_tests(self):
+        """Test renaming of generated test functions."""
+        tests = "import pytest\n\ndef helper():\n    pass\n\ndef test_one():\n    assert True\n"
+        renamed = CodeTester._prefix_generated_tests(tests)
+        
+        assert "def test_auto_one" in renamed
+        assert "def helper" in renamed
+    
+    @pytest.mark.asyncio
+    async def test_generated_tests_cached(self, tester_with_llm):
+        """Test that generated tests are reused for identical code and task."""
+        code = "def add(a, b):\n    return a + b\n"
+        
+        first = await tester_with_llm._generate_tests(code, "Add numbers")
+        second = await tester_with_llm._generate_tests(code, "Add numbers")
+        await tester_with_llm._generate_tests(code, "Other task")
+        
+        assert first == second
+        assert tester_with_llm.llm_manager.generate.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_pytest_worker_reused(self, tester):
+        """Test that the warm pytest worker serves consecutive runs."""
+        if tester._pytest_worker is None:
+            pytest.skip("pytest worker not supported")
+        code = "def add(a, b):\n    return a + b\n"
+        tests = "def test_add():\n    assert add(1, 2) == 3\n"
+        
+        try:
+            first = await tester._run_tests(code, tests)
+            pid = tester._pytest_worker._process.pid
+            second = await tester._run_tests(code, tests)
+            
+            assert first.tests_passed == second.tests_passed == 1
+            assert tester._pytest_worker._process.pid == pid
+        finally:
+            tester.close()
+    
+    @pytest.mark.asyncio
+    async def test_pytest_worker_timeout(self, tester):
+        """Test that a hanging test kills the worker and reports timeout."""
+        if tester._pytest_worker is None:
+            pytest.skip("pytest worker not supported")
+        tester.TEST_TIMEOUT = 1
+        tests = "import time\n\ndef test_hang():\n    time.sleep(30)\n"
+        
+        try:
+            result = await tester._run_tests("x = 1\n", tests)
+            
+            assert result.test_cases[-1].status == TestStatus.TIMEOUT
+            assert tester._pytest_worker._process is None
+        finally:
+            tester.close()
+    
+    @pytest.mark.asyncio
+    async def test_pytest_worker_discarded_on_bad_reply(self, tester):
+        """Test that an unreadable worker reply kills the worker before the cold fallback."""
+        if tester._pytest_worker is None:
+            pytest.skip("pytest worker not supported")
+        from backend.core import code_tester
+        code = "def add(a, b):\n    return a + b\n"
+        tests = "def test_add():\n    assert add(1, 2) == 3\n"
+        
+        try:
+            await tester._run_tests(code, tests)
+            process = tester._pytest_worker._process
+            with patch.object(code_tester.json, "loads", side_effect=ValueError("partial line")):
+                result = await tester._run_tests(code, tests)
+        
+            assert result.tests_passed == 1
+            assert process.returncode is not None
+            assert tester._pytest_worker._process is None
+        finally:
+            tester.close()
+    
+    def test_parse_pytest_output(self, tester):
+        """Test parsing of verbose pytest output."""
+        stdout = (
+            "test_code.py::test_ok PASSED                    [ 50%]\n"
+            "test_code.py::test_bad FAILED                   [100%]\n"
+            "1 failed, 1 passed in 0.01s\n"
+        )
+        result = tester._parse_pytest_output(stdout, "")
+        
+        assert result.tests_run == 2
+        assert result.tests_passed == 1
+        assert result.tests_failed == 1
+        assert [tc.name for tc in result.test_cases] == ["test_ok", "test_bad"]
+        assert result.success is False
+    
+    @pytest.mark.asyncio
+    async def test_junit_report_keeps_params_and_messages(self, tester):
+        """Test that results come from the JUnit report with parametrized names and errors."""
+        if not tester._pytest_available:
+            pytest.skip("pytest not available")
+        tests = """import pytest
+
+@pytest.mark.parametrize("n", [1, 2])
+def test_square(n):
+    assert square(n) == n * n
+
+def test_square_wrong():
+    assert square(3) == 10, "square(3) mismatch"
+"""
+        result = await tester._run_tests("def square(x):\n    return x * x\n", tests)
+        
+        assert result.tests_run == 3
+        assert result.tests_passed == 2
+        assert result.tests_failed == 1
+        assert [tc.name for tc in result.test_cases][:2] == ["test_square[1]", "test_square[2]"]
+        assert "square(3) mismatch" in result.test_cases[2].error
+    
+    def test_parse_pytest_summary_fallback(self, tester):
+        """Test the summary line fallback when no per-test lines are present."""
+        result = tester._parse_pytest_output("===== 1 failed, 3 passed in 0.12s =====", "")
+        
+        assert result.tests_run == 4
+        assert result.tests_passed == 3
+        assert result.tests_failed == 1
+        assert result.success is False
 
 
 class TestTestResult:
@@ -3,7 +3,7 @@ Tests for configuration system
 """
 
 import pytest
-from backend.config import load_config, get_config, Config
+from backend.config import load_config, get_config, Config, LLMProviderConfig
 
 
 def test_load_config():
@@ -30,6 +30,13 @@ def test_llm_config():
     assert hasattr(config.llm, 'providers')
 
 
+def test_keep_alive_accepts_int_and_duration():
+    """Test Ollama keep_alive: -1 stays an int, durations stay strings"""
+    assert LLMProviderConfig(keep_alive=-1).keep_alive == -1
+    assert LLMProviderConfig(keep_alive="24h").keep_alive == "24h"
+    assert LLMProviderConfig().keep_alive is None
+
+
 def test_agents_config():
     """Test agents configuration"""
     config = get_config()
@@ -64,3 +64,539 @@ async def test_generate_message():
     
     await manager.shutdown()
 
+
+@pytest.mark.asyncio
+async def test_ollama_server_clients_reused():
+    """Test that per-server clients are created once and closed on shutdown"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    first = provider._get_server_client("http://gpu-2:11434")
+    second = provider._get_server_client("http://gpu-2:11434")
+    
+    assert first is second
+    
+    await provider.shutdown()
+    assert first.is_closed
+    assert provider._server_clients == {}
+
+
+@pytest.mark.asyncio
+async def test_ollama_warm_model_sends_keep_alive():
+    """Test that warm_model loads the model with keep_alive at the request level"""
+    import json
+    import httpx
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    requests = []
+    
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"done": True})
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434", "keep_alive": "10m"})
+    provider.client = httpx.AsyncClient(base_url=provider.base_url, transport=httpx.MockTransport(handler))
+    
+    assert await provider.warm_model("llama3.1:70b")
+    assert await provider.warm_model("llama3.1:70b", keep_alive="24h")
+    
+    assert requests[0].url.path == "/api/generate"
+    assert json.loads(requests[0].content) == {"model": "llama3.1:70b", "keep_alive": "10m"}
+    assert json.loads(requests[1].content)["keep_alive"] == "24h"
+    
+    await provider.client.aclose()
+
+
+def make_ollama_provider(handler, **config):
+    """OllamaProvider over a mock transport (no server is contacted)"""
+    import httpx
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434", "default_model": "llama3.1:8b", **config})
+    provider.client = httpx.AsyncClient(base_url=provider.base_url, transport=httpx.MockTransport(handler))
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_ollama_generate_parses_ndjson_frames():
+    """Test that generate sends a JSON body and joins the NDJSON content frames"""
+    import json
+    import httpx
+    
+    bodies = []
+    frames = [
+        {"message": {"role": "assistant", "content": "Hello, "}, "done": False},
+        {"message": {"role": "assistant", "content": "world!"}, "done": False},
+        {"message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+         "eval_count": 3, "prompt_eval_count": 5},
+    ]
+    
+    def handler(request):
+        bodies.append(json.loads(request.content))
+        assert request.headers["content-type"] == "application/json"
+        return httpx.Response(200, content="\n".join(json.dumps(f) for f in frames).encode())
+    
+    provider = make_ollama_provider(handler)
+    response = await provider.generate([LLMMessage(role="user", content="Hi")], max_tokens=16)
+    
+    assert response.content == "Hello, world!"
+    assert response.finish_reason == "stop"
+    assert response.usage == {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}
+    assert bodies[0]["model"] == "llama3.1:8b"
+    assert bodies[0]["options"]["num_predict"] == 16
+    
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_generate_falls_back_for_non_ndjson_body():
+    """Test that a pretty-printed JSON body (not NDJSON) is still parsed"""
+    import json
+    import httpx
+    
+    body = json.dumps({"message": {"content": "Pretty printed answer"}, "done": True}, indent=2)
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=body.encode()))
+    
+    response = await provider.generate([LLMMessage(role="user", content="Hi")])
+    
+    assert response.content == "Pretty printed answer"
+    await provider.client.aclose()
+
+
+def test_ollama_recommended_models_indexed():
+    """Test that recommended models are resolved against the available list once"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({
+        "base_url": "http://localhost:11434",
+        "default_model": "missing:1b",
+        "recommended_models": {
+            "code": ["deepseek-coder:6.7b", "qwen2.5-coder:7b"],
+            "chat": ["llama3.1"],
+        },
+    })
+    provider._set_available_models(["mistral:7b", "qwen2.5-coder:7b", "llama3.1:8b"])
+    
+    assert provider._select_best_model(task_type="code") == "qwen2.5-coder:7b"
+    assert provider._select_best_model(task_type="chat") == "mistral:7b"
+    
+    provider._select_default_model()
+    assert provider.default_model == "llama3.1:8b"
+    assert provider._select_best_model(task_type="analysis") == "llama3.1:8b"
+
+
+def test_ollama_extract_content_regex():
+    """Test the regex fallback for malformed Ollama responses"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    
+    text = '{"model": "x", "message": {"role": "assistant", "content": "line\\nnext"}, "done": tru'
+    assert provider._extract_content_regex(text) == {"message": {"content": "line\nnext"}}
+    assert provider._extract_content_regex("no json here") is None
+
+
+@pytest.mark.asyncio
+async def test_ollama_thinking_extracted_from_reasoning_marker():
+    """Test that the earliest reasoning marker starts the extracted thinking block"""
+    import json
+    import httpx
+    
+    text = "Intro line.\nанализ: сравниваем варианты\n\nОтвет: вариант Б. Reasoning: short"
+    frame = {"message": {"content": text}, "done": True}
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=json.dumps(frame).encode()))
+    
+    response = await provider.generate([LLMMessage(role="user", content="Hi")], thinking_mode=True)
+    
+    assert response.thinking == "анализ: сравниваем варианты"
+    assert response.has_thinking
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_ndjson_lines_split_across_chunks():
+    """Test that NDJSON lines are reassembled from arbitrary byte chunks"""
+    import httpx
+    from backend.llm.ollama_provider import OllamaProvider, _aiter_ndjson_lines
+    
+    body = '{"message": {"content": "При"}}\n\n{"message": {"content": "вет"}, "done": true}'.encode()
+    
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+    
+    lines = [line async for line in _aiter_ndjson_lines(httpx.Response(200, content=chunks()))]
+    assert len(lines) == 2
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    assert provider._parse_ndjson_response(body)["message"]["content"] == "Привет"
+
+
+def test_cache_key_distinguishes_message_boundaries():
+    """Test that the cache key covers every message and its role/content split"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434", "default_model": "llama3.1:8b"})
+    history = [LLMMessage(role="system", content="Be brief"), LLMMessage(role="user", content="Hi")]
+    
+    key = provider._get_cache_key(history, None, 0.7)
+    assert key == provider._get_cache_key(list(history), "llama3.1:8b", 0.7)
+    assert key != provider._get_cache_key([LLMMessage(role="system", content="Be briefuser"),
+                                            LLMMessage(role="", content="Hi")], None, 0.7)
+    assert key != provider._get_cache_key([LLMMessage(role="user", content="Hi")], None, 0.7)
+    assert key != provider._get_cache_key(history, None, 0.2)
+
+
+@pytest.mark.asyncio
+async def test_ollama_concurrent_identical_generate_coalesced():
+    """Test that identical in-flight generate calls share one Ollama request"""
+    import asyncio
+    import json
+    import httpx
+    
+    calls = []
+    
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=json.dumps({"message": {"content": "shared answer"}, "done": True}).encode())
+    
+    provider = make_ollama_provider(handler)
+    messages = [LLMMessage(role="user", content="Hi")]
+    
+    first, second, other = await asyncio.gather(
+        provider.generate(messages),
+        provider.generate(messages),
+        provider.generate(messages, temperature=0.1),
+    )
+    
+    assert len(calls) == 2
+    assert first.content == second.content == other.content == "shared answer"
+    assert second.metadata["coalesced"]
+    assert provider._inflight == {}
+    await provider.client.aclose()
+
+
+def test_ollama_thinking_support_memoized():
+    """Test native thinking detection by model name and its memoization"""
+    from backend.llm.ollama_provider import OllamaProvider, _supports_native_thinking
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    _supports_native_thinking.cache_clear()
+    
+    assert provider._check_thinking_support("DeepSeek-R1:70b")
+    assert provider._check_thinking_support("qwen2.5-coder:7b")
+    assert not provider._check_thinking_support("mistral:7b")
+    assert provider._check_thinking_support("DeepSeek-R1:70b")
+    assert _supports_native_thinking.cache_info().hits == 1
+
+
+def test_ollama_regex_fallback_unescapes_in_one_pass():
+    """Test JSON escape decoding in the regex fallback, including escaped backslashes"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    text = r'{"content": "path C:\\new\tq\"x\" \u041f\u0440\u0438 \/ \q"'
+    
+    assert provider._extract_content_regex(text)["message"]["content"] == 'path C:\\new\tq"x" При / \\q'
+
+
+@pytest.mark.asyncio
+async def test_ollama_initialize_closes_failed_clients(tmp_path, monkeypatch):
+    """Test that clients of unreachable servers are closed during initialization"""
+    import httpx
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    def handler(request):
+        if request.url.host == "down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"models": [{"name": "llama3.1:8b"}]})
+    
+    provider = OllamaProvider({
+        "base_url": "http://down:11434",
+        "fallback_urls": ["http://up:11434"],
+        "cache": {"disk_cache_dir": str(tmp_path)},
+    })
+    clients = []
+    
+    def build_client(base_url):
+        clients.append(httpx.AsyncClient(base_url=base_url, transport=httpx.MockTransport(handler)))
+        return clients[-1]
+    
+    monkeypatch.setattr(provider, "_build_client", build_client)
+    await provider.initialize()
+    
+    assert [c.is_closed for c in clients] == [True, False]
+    assert provider.client is clients[1]
+    assert provider.default_model == "llama3.1:8b"
+    await provider.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ollama_clients_shared_between_providers():
+    """Test that providers for the same server share one reference-counted client"""
+    from backend.llm.ollama_provider import OllamaProvider, _CLIENT_REGISTRY
+    
+    first = OllamaProvider({"base_url": "http://localhost:11434"})
+    second = OllamaProvider({"base_url": "http://localhost:11434"})
+    first.client = first._acquire_client(first.base_url)
+    second.client = second._acquire_client(second.base_url)
+    
+    assert first.client is second.client
+    assert second._get_server_client("http://localhost:11434") is first.client
+    
+    shared = second.client
+    await first.shutdown()
+    assert first.client is None
+    assert not shared.is_closed
+    
+    await second.shutdown()
+    assert shared.is_closed
+    assert not any(key[0] == "http://localhost:11434" for key in _CLIENT_REGISTRY)
+
+
+def test_ollama_shared_client_not_reused_across_loops():
+    """Test that a client left open in a finished loop isn't handed to the next loop"""
+    import asyncio
+    from backend.llm.ollama_provider import OllamaProvider, _CLIENT_REGISTRY
+    
+    async def acquire():
+        provider = OllamaProvider({"base_url": "http://localhost:11434"})
+        return provider._acquire_client(provider.base_url)
+    
+    first = asyncio.run(acquire())
+    second = asyncio.run(acquire())
+    
+    assert second is not first
+    assert not any(entry[0] is first for entry in _CLIENT_REGISTRY.values())
+    _CLIENT_REGISTRY.clear()
+
+
+@pytest.mark.asyncio
+async def test_ollama_repeated_shutdown_keeps_shared_client():
+    """Test that a provider releases only its own references to a shared client"""
+    from backend.llm.ollama_provider import OllamaProvider
+    
+    first = OllamaProvider({"base_url": "http://localhost:11434"})
+    second = OllamaProvider({"base_url": "http://localhost:11434"})
+    stale = first.client = first._acquire_client(first.base_url)
+    second.client = second._acquire_client(second.base_url)
+    
+    await first.shutdown()
+    await first.shutdown()
+    await first._release_client(stale)
+    assert not second.client.is_closed
+    
+    shared = second.client
+    await second.shutdown()
+    assert shared.is_closed
+
+
+@pytest.mark.asyncio
+async def test_ollama_generate_plain_text_fallback_line():
+    """Test that a non-JSON body yields its first meaningful text line"""
+    import httpx
+    
+    body = '{"model": "x", "done": fal\n  short  \n  "done" text line here  \n   Plain answer text here.  \nmore'
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=body.encode()))
+    
+    response = await provider.generate([LLMMessage(role="user", content="Hi")])
+    
+    assert response.content == "Plain answer text here."
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_client_error_not_retried():
+    """Test that a 4xx response fails fast without backoff retries"""
+    import httpx
+    from backend.core.exceptions import LLMException
+    
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404, json={"error": "model not found"})
+    
+    provider = make_ollama_provider(handler)
+    
+    with pytest.raises(LLMException, match="HTTP 404"):
+        await provider.generate([LLMMessage(role="user", content="Hi")], model="missing:1b")
+    assert len(calls) == 1
+    assert not await provider.warm_model("missing:1b")
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_model_not_found_fails_over():
+    """Test that a 404 moves to a fallback server that has the model, without backoff"""
+    import asyncio
+    import httpx
+    
+    calls = []
+    
+    def handler(request):
+        calls.append((request.url.host, request.url.path))
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": "big:70b"}]})
+        if request.url.host == "localhost":
+            return httpx.Response(404, json={"error": "model not found"})
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "ok"}, "done": True})
+    
+    provider = make_ollama_provider(handler, fallback_urls=["http://backup:11434"], cache_enabled=False)
+    provider._build_client = lambda base_url: httpx.AsyncClient(
+        base_url=base_url, transport=httpx.MockTransport(handler)
+    )
+    
+    response = await asyncio.wait_for(
+        provider.generate([LLMMessage(role="user", content="Hi")], model="big:70b"),
+        timeout=0.5
+    )
+    
+    assert response.content == "ok"
+    assert calls == [("localhost", "/api/chat"), ("backup", "/api/tags"), ("backup", "/api/chat")]
+    await provider.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ollama_large_fallback_parsed_off_loop(monkeypatch):
+    """Test that large non-NDJSON bodies are parsed in a worker thread"""
+    import asyncio
+    import json
+    import httpx
+    
+    offloaded = []
+    to_thread = asyncio.to_thread
+    
+    async def spy(func, *args):
+        offloaded.append(func.__name__)
+        return await to_thread(func, *args)
+    
+    monkeypatch.setattr(asyncio, "to_thread", spy)
+    body = json.dumps({"message": {"content": "x" * 100}, "done": True}, indent=2)
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=body.encode()))
+    provider.FALLBACK_PARSE_THREAD_THRESHOLD = 64
+    
+    response = await provider.generate([LLMMessage(role="user", content="Hi")])
+    
+    assert response.content == "x" * 100
+    assert offloaded == ["_parse_unstructured_response"]
+    await provider.client.aclose()
+
+
+def test_ollama_thinking_system_message_reused():
+    """Test that thinking instructions are appended once per system prompt and mode"""
+    from backend.llm.ollama_provider import OllamaProvider, _THINKING_EMULATED_INSTRUCTIONS
+    
+    provider = OllamaProvider({"base_url": "http://localhost:11434"})
+    system = LLMMessage(role="system", content="Be precise.")
+    user = LLMMessage(role="user", content="Why?")
+    
+    first = provider._enhance_prompt_for_thinking([system, user], True, "mistral:7b")
+    second = provider._enhance_prompt_for_thinking([LLMMessage(role="system", content="Be precise."), user], True, "mistral:7b")
+    
+    assert first[0] is second[0]
+    assert first[0].content == "Be precise." + _THINKING_EMULATED_INSTRUCTIONS
+    assert first[1] is user
+    
+    no_system = provider._enhance_prompt_for_thinking([user], True, "deepseek-r1:7b")
+    assert no_system[0].role == "system"
+    assert "built-in thinking" in no_system[0].content
+    assert provider._enhance_prompt_for_thinking([user], False, "mistral:7b") == [user]
+
+
+@pytest.mark.asyncio
+async def test_ollama_ndjson_stops_at_done_frame():
+    """Test that parsing stops at the terminal done frame"""
+    import json
+    import httpx
+    
+    body = "\n".join([
+        json.dumps({"message": {"content": "final"}, "done": True, "eval_count": 1}),
+        "trailing keepalive garbage that is not a frame",
+        json.dumps({"message": {"content": " ignored"}}),
+    ])
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=body.encode()))
+    
+    response = await provider.generate([LLMMessage(role="user", content="Hi")])
+    
+    assert response.content == "final"
+    assert provider._parse_ndjson_response(body.encode())["message"]["content"] == "final"
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_native_thinking_field_from_frames():
+    """Test that a native thinking field on the message is returned with the answer"""
+    import json
+    import httpx
+    
+    frame = {"message": {"content": "42", "thinking": "6 * 7"}, "done": True, "done_reason": "stop"}
+    provider = make_ollama_provider(lambda request: httpx.Response(200, content=json.dumps(frame).encode()))
+    
+    response = await provider.generate(
+        [LLMMessage(role="user", content="Answer?")], model="deepseek-r1:7b", thinking_mode=True
+    )
+    
+    assert response.thinking == "6 * 7"
+    assert response.metadata["done"] and response.metadata["thinking_native"]
+    assert response.finish_reason == "stop"
+    assert response.usage is None
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_coalesced_request_survives_first_caller_cancel():
+    """Test that cancelling the first caller does not cancel the shared request"""
+    import asyncio
+    import json
+    import httpx
+    
+    release = asyncio.Event()
+    
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200, content=json.dumps({"message": {"content": "shared answer"}, "done": True}).encode())
+    
+    provider = make_ollama_provider(handler)
+    messages = [LLMMessage(role="user", content="Hi")]
+    
+    first = asyncio.create_task(provider.generate(messages))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(provider.generate(messages))
+    await asyncio.sleep(0)
+    
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    
+    assert (await second).content == "shared answer"
+    assert first.cancelled()
+    await provider.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_shared_request_cancelled_when_all_callers_leave():
+    """Test that the shared request is cancelled once no caller is waiting"""
+    import asyncio
+    import httpx
+    
+    started = asyncio.Event()
+    
+    async def handler(request):
+        started.set()
+        await asyncio.sleep(10)
+    
+    provider = make_ollama_provider(handler)
+    caller = asyncio.create_task(provider.generate([LLMMessage(role="user", content="Hi")]))
+    await started.wait()
+    
+    (task, waiters), = provider._inflight.values()
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)  # done-callback
+    assert provider._inflight == {}
+    await provider.client.aclose()
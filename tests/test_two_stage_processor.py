@@ -0,0 +1,450 @@
+"""
+Tests for TwoStageProcessor
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from backend.core import two_stage_processor
+from backend.core.two_stage_processor import FAST_STAGE_MAX_TOKENS, ProcessingStage, TwoStageProcessor
+
+
+@pytest.fixture(autouse=True)
+def clear_models_cache():
+    """Reset the module-level caches between tests"""
+    two_stage_processor._MODELS_CACHE.clear()
+    two_stage_processor._ANALYSIS_CACHE.clear()
+    two_stage_processor._POWERFUL_WARMUPS.clear()
+    yield
+    two_stage_processor._MODELS_CACHE.clear()
+    two_stage_processor._ANALYSIS_CACHE.clear()
+
+
+def make_manager(models):
+    """LLM manager mock with a single ollama provider"""
+    ollama = MagicMock()
+    ollama.list_models = AsyncMock(return_value=models)
+    del ollama.stream
+    manager = MagicMock()
+    manager.providers = {"ollama": ollama}
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_models_listed_once_for_both_stages():
+    """Test that fast and powerful model lookups share one list_models call"""
+    manager = make_manager(["qwen2.5:1.5b", "llama3.1:70b"])
+    
+    processor = TwoStageProcessor(llm_manager=manager)
+    assert await processor._get_fast_model() == "qwen2.5:1.5b"
+    assert await processor._get_powerful_model() == "llama3.1:70b"
+    
+    # Новый экземпляр использует тот же кэш
+    other = TwoStageProcessor(llm_manager=manager)
+    assert await other._get_fast_model() == "qwen2.5:1.5b"
+    
+    manager.providers["ollama"].list_models.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_size_fallback_when_no_pattern_matches():
+    """Test fast/powerful model selection by size for unknown model names"""
+    gb = 1024 ** 3
+    manager = make_manager([
+        {"name": "custom-big", "size": 40 * gb},
+        {"name": "custom-mid", "size": 12 * gb},
+        {"name": "custom-tiny", "size": 2 * gb},
+        {"name": "custom-unknown"},
+    ])
+    
+    processor = TwoStageProcessor(llm_manager=manager)
+    assert await processor._get_fast_model() == "custom-tiny"
+    assert await processor._get_powerful_model() == "custom-big"
+
+
+def make_generating_manager(fast_content):
+    """LLM manager mock answering the fast stage with fast_content"""
+    manager = make_manager([])
+    calls = []
+    
+    async def generate(messages, **kwargs):
+        prompt = messages[-1].content
+        calls.append(prompt)
+        if prompt.startswith("Проанализируй"):
+            return MagicMock(content=fast_content)
+        return MagicMock(content=f"result for: {prompt.splitlines()[3]}")
+    
+    manager.generate = generate
+    return manager, calls
+
+
+@pytest.mark.asyncio
+async def test_fast_stage_uses_small_deterministic_budget():
+    """Test that the fast stage asks for a short deterministic answer"""
+    manager, _ = make_generating_manager('{"task_type": "coding", "complexity": "simple"}')
+    seen = {}
+    fast_generate = manager.generate
+    
+    async def generate(messages, **kwargs):
+        if messages[-1].content.startswith("Проанализируй"):
+            seen.update(kwargs)
+        return await fast_generate(messages, **kwargs)
+    
+    manager.generate = generate
+    processor = TwoStageProcessor(llm_manager=manager)
+    await processor._fast_preprocessing("Напиши парсер")
+    
+    assert seen["max_tokens"] == FAST_STAGE_MAX_TOKENS
+    assert seen["temperature"] == 0.0
+
+
+def test_best_pattern_match_respects_priority():
+    """Test that pattern priority wins over model order and match position"""
+    models = [{"name": "tinyllama:1b"}, {"name": "qwen2.5:0.5b"}, {"name": "Phi3-Mini"}]
+    
+    assert TwoStageProcessor._best_pattern_match(
+        models, TwoStageProcessor.FAST_PATTERN_RE, TwoStageProcessor.FAST_PATTERN_RANK
+    ) == "qwen2.5:0.5b"
+    assert TwoStageProcessor._best_pattern_match(
+        [{"name": "llama3:8b"}, {"name": "mixtral:72b"}, {"name": "llama3:70b"}],
+        TwoStageProcessor.POWERFUL_PATTERN_RE, TwoStageProcessor.POWERFUL_PATTERN_RANK
+    ) == "llama3:70b"
+    assert TwoStageProcessor._best_pattern_match(
+        [{"name": "codellama"}], TwoStageProcessor.FAST_PATTERN_RE, TwoStageProcessor.FAST_PATTERN_RANK
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_fast_stage_stream_stops_after_json():
+    """Test that fast-stage streaming stops once the JSON object closes"""
+    manager = make_manager([])
+    consumed = []
+    
+    async def stream(**kwargs):
+        for chunk in ['Вот анализ: {"task_type": "cod', 'ing", "approach": "use {braces}"', '} и ещё', " много текста"]:
+            consumed.append(chunk)
+            yield chunk
+    
+    manager.providers["ollama"].stream = stream
+    manager.generate = AsyncMock()
+    
+    analysis = await TwoStageProcessor(llm_manager=manager)._fast_preprocessing("task")
+    
+    assert analysis["task_type"] == "coding"
+    assert analysis["approach"] == "use {braces}"
+    assert len(consumed) == 3
+    manager.generate.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_identical_powerful_requests_coalesced():
+    """Test that concurrent identical powerful-stage requests share one LLM call"""
+    import asyncio
+    manager, calls = make_generating_manager('{"task_type": "coding", "complexity": "simple"}')
+    
+    processors = [TwoStageProcessor(llm_manager=manager) for _ in range(3)]
+    results = await asyncio.gather(*(p.process("Напиши функцию") for p in processors))
+    
+    assert all(r.stage.value == "completed" for r in results)
+    powerful_calls = [c for c in calls if c.startswith("На основе анализа")]
+    assert len(powerful_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_analysis_cached_by_task():
+    """Test that a repeated task skips the fast-stage LLM call"""
+    manager, calls = make_generating_manager('{"task_type": "coding", "complexity": "simple"}')
+    processor = TwoStageProcessor(llm_manager=manager)
+    
+    first = await processor._fast_preprocessing("Напиши  функцию ")
+    second = await processor._fast_preprocessing("Напиши функцию")
+    
+    assert first == second
+    assert first["task_type"] == "coding"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_analysis_parses_first_json_object():
+    """Test parsing of the first JSON object, ignoring trailing braces and bad JSON"""
+    manager, _ = make_generating_manager('Ответ: {"task_type": "analysis", "approach": "a}b"} см. {также}')
+    analysis = await TwoStageProcessor(llm_manager=manager)._fast_preprocessing("Проанализируй логи")
+    assert analysis["task_type"] == "analysis"
+    assert analysis["approach"] == "a}b"
+    
+    manager, _ = make_generating_manager('{"task_type": "analysis",')
+    analysis = await TwoStageProcessor(llm_manager=manager)._fast_preprocessing("Другая задача")
+    assert "error" not in analysis
+    assert analysis["task_type"] == "unknown"
+
+
+@pytest.mark.asyncio
+async def test_prompts_use_shared_system_messages():
+    """Test that both stages send the precomputed system messages"""
+    manager = make_manager([])
+    manager.generate = AsyncMock(return_value=MagicMock(content="{}"))
+    processor = TwoStageProcessor(llm_manager=manager)
+    
+    await processor.process("Задача с {фигурными} скобками")
+    
+    fast_messages, powerful_messages = (c.kwargs["messages"] for c in manager.generate.await_args_list)
+    assert fast_messages[0] is two_stage_processor._FAST_SYSTEM_MSG
+    assert "Задача: Задача с {фигурными} скобками" in fast_messages[1].content
+    assert powerful_messages[0] is two_stage_processor._POWERFUL_SYSTEM_MSG
+
+
+@pytest.mark.asyncio
+async def test_progress_callback_does_not_block_processing():
+    """Test that a slow progress callback runs in the background"""
+    manager, _ = make_generating_manager('{"task_type": "coding", "complexity": "simple"}')
+    delivered = []
+    release = asyncio.Event()
+    
+    async def callback(stage, data):
+        await release.wait()
+        delivered.append(stage)
+    
+    processor = TwoStageProcessor(llm_manager=manager, progress_callback=callback)
+    result = await processor.process("Напиши парсер")
+    
+    assert result.stage == ProcessingStage.COMPLETED
+    assert delivered == []
+    
+    release.set()
+    await processor.aclose()
+    assert delivered == [
+        ProcessingStage.FAST_PREPROCESSING,
+        ProcessingStage.POWERFUL_PROCESSING,
+        ProcessingStage.COMPLETED,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_progress_queue_coalesces_intermediate_events():
+    """Test that a backlog keeps only the latest event per stage plus terminal ones"""
+    delivered = []
+    processor = TwoStageProcessor(progress_callback=lambda stage, data: delivered.append((stage, data["n"])))
+    processor.PROGRESS_QUEUE_COALESCE_SIZE = 3
+    
+    for n in range(3):
+        await processor._notify_progress(ProcessingStage.FAST_PREPROCESSING, {"n": n})
+    await processor._notify_progress(ProcessingStage.ERROR, {"n": 3})
+    await processor._notify_progress(ProcessingStage.POWERFUL_PROCESSING, {"n": 4})
+    await processor.aclose()
+    
+    assert delivered == [
+        (ProcessingStage.FAST_PREPROCESSING, 2),
+        (ProcessingStage.ERROR, 3),
+        (ProcessingStage.POWERFUL_PROCESSING, 4),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_powerful_budget_follows_complexity():
+    """Test max_tokens per complexity and fast-tier routing of simple tasks"""
+    manager = make_manager(["qwen2.5:1.5b", "llama3.1:70b"])
+    manager.providers["openai"] = MagicMock()
+    seen = []
+    
+    async def generate(messages, **kwargs):
+        seen.append(kwargs)
+        return MagicMock(content="done")
+    
+    manager.generate = generate
+    processor = TwoStageProcessor(llm_manager=manager, fast_provider="ollama", powerful_provider="openai")
+    
+    await processor._powerful_processing("task", {"complexity": "complex"})
+    result = await processor._powerful_processing("task", {"complexity": "simple"})
+    
+    assert seen[0]["max_tokens"] == 2000
+    assert seen[0]["provider_name"] == "openai"
+    assert seen[1]["max_tokens"] == 400
+    assert seen[1]["provider_name"] == "ollama"
+    assert seen[1]["model"] == "qwen2.5:1.5b"
+    assert result["provider"] == "ollama"
+
+
+@pytest.mark.asyncio
+async def test_powerful_model_warmed_once():
+    """Test that the powerful Ollama model is warmed once and then used"""
+    manager = make_manager(["qwen2.5:1.5b", "llama3.1:70b"])
+    ollama = manager.providers["ollama"]
+    ollama.warm_model = AsyncMock(return_value=True)
+    seen = []
+    
+    async def generate(messages, **kwargs):
+        seen.append(kwargs)
+        return MagicMock(content='{"task_type": "coding", "complexity": "complex"}')
+    
+    manager.generate = generate
+    processors = [
+        TwoStageProcessor(llm_manager=manager, fast_provider="ollama", powerful_provider="ollama")
+        for _ in range(2)
+    ]
+    await asyncio.gather(*(p._warm_powerful_model() for p in processors))
+    await processors[0]._powerful_processing("task", {"complexity": "complex"})
+    
+    ollama.warm_model.assert_awaited_once_with("llama3.1:70b")
+    assert seen[-1]["model"] == "llama3.1:70b"
+
+
+@pytest.mark.asyncio
+async def test_warmup_task_referenced_until_done():
+    """Test that the background warm-up task is kept alive by the processor"""
+    manager, _ = make_generating_manager('{"task_type": "coding", "complexity": "complex"}')
+    manager.providers["ollama"].list_models.return_value = ["llama3.1:70b"]
+    warmed = asyncio.Event()
+    release = asyncio.Event()
+    
+    async def warm_model(model, keep_alive=None):
+        warmed.set()
+        await release.wait()
+        return True
+    
+    manager.providers["ollama"].warm_model = warm_model
+    processor = TwoStageProcessor(llm_manager=manager, fast_provider="ollama", powerful_provider="ollama")
+    
+    result = await processor.process("Напиши парсер")
+    await warmed.wait()
+    
+    assert result.stage.value == "completed"
+    assert len(processor._background_tasks) == 1
+    
+    release.set()
+    await asyncio.gather(*processor._background_tasks)
+    await asyncio.sleep(0)
+    assert not processor._background_tasks
+
+
+@pytest.mark.asyncio
+async def test_no_warmup_with_custom_powerful_step():
+    """Test that a custom powerful step doesn't load the pattern-matched model"""
+    manager, _ = make_generating_manager('{"task_type": "coding", "complexity": "complex"}')
+    manager.providers["ollama"].list_models.return_value = ["llama3.1:70b"]
+    manager.providers["ollama"].warm_model = AsyncMock(return_value=True)
+    processor = TwoStageProcessor(llm_manager=manager, fast_provider="ollama", powerful_provider="ollama")
+    
+    async def custom_powerful(task, analysis):
+        return {"result": "done"}
+    
+    result = await processor.process("Напиши парсер", powerful_processing=custom_powerful)
+    
+    assert result.stage.value == "completed"
+    assert not processor._background_tasks
+    manager.providers["ollama"].warm_model.assert_not_awaited()
+
+
+def test_select_providers_prefers_ollama():
+    """Test provider selection for both stages"""
+    manager = MagicMock()
+    manager.providers = {"openai": MagicMock(), "ollama": MagicMock()}
+    assert TwoStageProcessor(llm_manager=manager)._select_providers() == ("ollama", "ollama")
+    
+    manager.providers = {"anthropic": MagicMock(), "openai": MagicMock()}
+    processor = TwoStageProcessor(llm_manager=manager, powerful_provider="openai")
+    assert (processor.fast_provider, processor.powerful_provider) == ("anthropic", "openai")
+    
+    manager.providers = {}
+    assert TwoStageProcessor(llm_manager=manager).fast_provider is None
+
+
+@pytest.mark.asyncio
+async def test_powerful_stage_concurrency_is_bounded(monkeypatch):
+    """Test that concurrent powerful calls share the per-manager limit"""
+    monkeypatch.setattr(two_stage_processor, "MAX_PARALLEL_POWERFUL", 2)
+    manager = make_manager([])
+    active = peak = 0
+    
+    async def generate(messages, **kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return MagicMock(content="done")
+    
+    manager.generate = generate
+    processors = [TwoStageProcessor(llm_manager=manager) for _ in range(5)]
+    results = await asyncio.gather(*(
+        p._powerful_processing(f"task {i}", {"complexity": "complex"})
+        for i, p in enumerate(processors)
+    ))
+    
+    assert all(r["result"] == "done" for r in results)
+    assert peak == 2
+
+
+def test_powerful_pool_does_not_keep_manager_alive():
+    """Test that the per-manager pool is dropped once the manager is collected"""
+    import gc
+    import weakref
+    
+    manager = make_manager([])
+    manager_ref = weakref.ref(manager)
+    two_stage_processor._get_powerful_pool(manager)
+    
+    del manager
+    gc.collect()
+    
+    assert manager_ref() is None
+
+
+@pytest.mark.parametrize("orjson_available", [True, False])
+def test_parse_first_json_object(monkeypatch, orjson_available):
+    """Test JSON extraction with and without orjson"""
+    if orjson_available and not two_stage_processor.ORJSON_AVAILABLE:
+        pytest.skip("orjson not installed")
+    monkeypatch.setattr(two_stage_processor, "ORJSON_AVAILABLE", orjson_available)
+    parse = two_stage_processor._parse_first_json_object
+    
+    assert parse('Ответ: {"task_type": "coding"}') == {"task_type": "coding"}
+    assert parse('{"a": 1} и ещё {"b": 2}') == {"a": 1}
+    assert parse("без json") is None
+    assert parse('{"a": ') is None
+    assert parse('{"a": "}"} хвост {"b": "}"}') == {"a": "}"}
+    assert parse('{"a": {"b": 1}}', exact=True) == {"a": {"b": 1}}
+    assert parse('{"a": ', exact=True) is None
+
+
+@pytest.mark.asyncio
+async def test_powerful_prompt_from_template():
+    """Test powerful prompt rendering, including braces in the task and non-string requirements"""
+    manager = make_manager([])
+    prompts = []
+    
+    async def generate(messages, **kwargs):
+        prompts.append(messages[-1].content)
+        return MagicMock(content="done")
+    
+    manager.generate = generate
+    processor = TwoStageProcessor(llm_manager=manager)
+    await processor._powerful_processing(
+        "верни {x}", {"task_type": "coding", "complexity": "complex", "requirements": ["быстро", 2]}
+    )
+    
+    assert prompts[0].splitlines()[3:6] == ["- Тип: coding", "- Сложность: complex", "- Требования: быстро, 2"]
+    assert "Задача: верни {x}" in prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_progress_callback_kind_resolved_once(monkeypatch):
+    """Test that the callback kind is not re-inspected per event"""
+    delivered = []
+    
+    async def callback(stage, data):
+        delivered.append(stage)
+    
+    processor = TwoStageProcessor(progress_callback=callback)
+    assert processor._progress_is_async
+    assert not TwoStageProcessor(progress_callback=lambda stage, data: None)._progress_is_async
+    
+    inspect_calls = []
+    monkeypatch.setattr(asyncio, "iscoroutinefunction", lambda f: inspect_calls.append(f) or True)
+    await processor._notify_progress(ProcessingStage.FAST_PREPROCESSING, {})
+    await processor._notify_progress(ProcessingStage.COMPLETED, {})
+    await processor.aclose()
+    
+    assert delivered == [ProcessingStage.FAST_PREPROCESSING, ProcessingStage.COMPLETED]
+    assert inspect_calls == []
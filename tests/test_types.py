@@ -0,0 +1,86 @@
+"""
+Tests for shared backend types
+"""
+
+import dataclasses
+
+import pytest
+
+from backend.core.types import CostTier, ProviderInfo, RoutingPolicy, ModelSelection, ModelTier
+
+
+def test_routing_policy_frozen_and_hashable():
+    """Test that routing policies are immutable and usable as dict keys"""
+    policy = RoutingPolicy(allowed_providers=["ollama", "openai"])
+    
+    assert policy.allowed_providers == ("ollama", "openai")
+    assert policy.to_dict()["allowed_providers"] == ["ollama", "openai"]
+    assert {policy: 1}[RoutingPolicy(allowed_providers=("ollama", "openai"))] == 1
+    
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        policy.prefer_local = False
+
+
+def test_result_types_use_slots():
+    """Test that result types have no per-instance __dict__"""
+    selection = ModelSelection(model="llama3", provider="ollama", tier=ModelTier.FAST)
+    info = ProviderInfo(name="ollama", is_local=True, is_private=True, cost_tier=CostTier.FREE)
+    
+    assert not hasattr(selection, "__dict__")
+    assert hash(info) == hash(ProviderInfo(name="ollama", is_local=True, is_private=True, cost_tier=CostTier.FREE))
+
+
+def test_routing_policy_to_dict_cached():
+    """Test that to_dict is built once and callers get independent copies"""
+    policy = RoutingPolicy.cost_first()
+    
+    first = policy.to_dict()
+    first["prefer_cheap"] = False
+    second = policy.to_dict()
+    
+    assert second["prefer_cheap"] is True
+    assert second["max_cost_tier"] == CostTier.CHEAP.value
+    assert policy == RoutingPolicy.cost_first()
+
+
+def test_enums_compare_natively():
+    """Test that tiers compare as ints and levels serialize as plain strings"""
+    import json
+    from backend.core.types import ComplexityLevel, ComplexityResult
+    
+    assert CostTier.FREE < CostTier.PREMIUM
+    assert not RoutingPolicy.cost_first().allows_provider(
+        ProviderInfo(name="openai", is_local=False, is_private=False, cost_tier=CostTier.STANDARD)
+    )
+    
+    result = ComplexityResult(
+        level=ComplexityLevel.SIMPLE, score=2.0, estimated_minutes=0.5,
+        recommended_tier=ModelTier.FAST, recommended_temperature=0.3, recommended_max_tokens=512
+    )
+    data = json.loads(json.dumps(result.to_dict()))
+    assert data["level"] == "simple"
+    assert data["recommended_tier"] == "fast"
+
+
+def test_routing_policy_provider_sets():
+    """Test allow/block lists via frozenset lookups"""
+    local = ProviderInfo(name="ollama", is_local=True, is_private=True, cost_tier=CostTier.FREE)
+    cloud = ProviderInfo(name="openai", is_local=False, is_private=False, cost_tier=CostTier.FREE)
+    
+    policy = RoutingPolicy(allowed_providers=["ollama", "ollama"], blocked_providers=["openai"])
+    assert policy.allows_provider(local)
+    assert not policy.allows_provider(cloud)
+    assert policy.to_dict()["allowed_providers"] == ["ollama", "ollama"]
+    
+    # Пустой список не ограничивает
+    assert RoutingPolicy(allowed_providers=[]).allows_provider(cloud)
+
+
+def test_routing_policy_hashable_form():
+    """Test the canonical hashable form and the cached hash"""
+    policy = RoutingPolicy(max_cost_tier=CostTier.CHEAP, allowed_providers=["ollama"])
+    
+    assert policy.to_hashable() == (True, False, 2, False, 0.5, True, ("ollama",), None)
+    assert hash(policy) == hash(policy.to_hashable())
+    assert RoutingPolicy.__hash__ is not None and RoutingPolicy.__hash__.__qualname__ == "RoutingPolicy.__hash__"
+    assert {policy: 1}[RoutingPolicy(max_cost_tier=CostTier.CHEAP, allowed_providers=("ollama",))] == 1
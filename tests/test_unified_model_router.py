@@ -0,0 +1,386 @@
+"""
+Tests for UnifiedModelRouter
+"""
+
+import pytest
+
+from backend.core.types import CostTier, RoutingPolicy
+from backend.core.unified_model_router import PROVIDER_INFO, UnifiedModelRouter
+
+
+def make_router(providers=None, **llm):
+    """Router over a minimal config (no servers are contacted)"""
+    return UnifiedModelRouter({"llm": {"providers": providers or {}, **llm}})
+
+
+def test_provider_cost_tier_from_config():
+    """Test that a configured cost_tier overrides the provider default without touching PROVIDER_INFO"""
+    router = make_router({"openai": {"enabled": True, "cost_tier": 2}})
+    
+    assert router.get_provider_info("openai").cost_tier == CostTier.CHEAP
+    assert PROVIDER_INFO["openai"].cost_tier == CostTier.STANDARD
+
+
+def make_cloud_router():
+    """Router with only openai enabled and initialization skipped"""
+    router = make_router({"openai": {"enabled": True, "default_model": "gpt-4o"}})
+    router._initialized = True
+    return router
+
+
+@pytest.mark.asyncio
+async def test_select_model_cached_by_normalized_task(monkeypatch):
+    """Test that repeated tasks reuse the routed selection"""
+    router = make_cloud_router()
+    policy = RoutingPolicy(prefer_local=False, allowed_providers=["openai"])
+    calls = []
+    select_provider = router._select_provider_by_policy
+    monkeypatch.setattr(router, "_select_provider_by_policy", lambda *a: calls.append(a) or select_provider(*a))
+    
+    first = await router.select_model("Напиши  функцию сортировки", policy=policy)
+    first.fallback_models.append("mutated")
+    second = await router.select_model("напиши функцию   сортировки ", policy=policy)
+    
+    assert len(calls) == 1
+    assert second.model == first.model == "gpt-4o"
+    assert "mutated" not in second.fallback_models
+    
+    await router.select_model("Напиши функцию сортировки", policy=RoutingPolicy(prefer_local=False, prefer_cheap=True))
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("task, expected", [
+    ("Проанализируй этот код", "code"),
+    ("Объясни, что такое монада", "research"),
+    ("Сравни два подхода", "analysis"),
+    ("ПОЧЕМУ небо синее?", "reasoning"),
+    ("this is it", "simple_chat"),
+    ("Сколько будет 2+2", "general"),
+])
+def test_infer_task_type_priority(task, expected):
+    """Test that the single-pass regex keeps the per-type priority order"""
+    assert make_router()._infer_task_type(task) == expected
+
+
+def test_provider_order_cached_per_policy(monkeypatch):
+    """Test that provider ranking runs once per policy until invalidated"""
+    router = make_router({
+        "ollama": {"enabled": True},
+        "openai": {"enabled": True},
+        "anthropic": {"enabled": False},
+    })
+    calls = []
+    rank = router._rank_providers
+    monkeypatch.setattr(router, "_rank_providers", lambda policy: calls.append(policy) or rank(policy))
+    
+    assert router._select_provider_by_policy(RoutingPolicy(), "code")[0] == "ollama"
+    assert router._select_provider_by_policy(RoutingPolicy(), "chat")[0] == "ollama"
+    assert len(calls) == 1
+    
+    assert router._select_provider_by_policy(RoutingPolicy(prefer_local=False), "code")[0] == "openai"
+    router.invalidate_provider_cache()
+    router._select_provider_by_policy(RoutingPolicy(), "code")
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize("policy, complexity, expected", [
+    (RoutingPolicy(prefer_cheap=True), "simple", "gpt-4o-mini"),
+    (RoutingPolicy(prefer_cheap=True, max_cost_tier=CostTier.FREE), "simple", "gpt-4o"),
+    (RoutingPolicy(), "complex", "gpt-4"),
+    (RoutingPolicy(max_cost_tier=CostTier.STANDARD), "complex", "gpt-4o"),
+    (RoutingPolicy(prefer_cheap=True, prefer_quality=False), "complex", "gpt-4o-mini"),
+])
+def test_select_cloud_model_by_cost(policy, complexity, expected):
+    """Test cheapest / premium model choice over the cost-sorted model table"""
+    router = make_router({"openai": {"enabled": True, "default_model": "gpt-4o"}})
+    
+    model, _ = router._select_cloud_model("openai", policy, "code", complexity)
+    assert model == expected
+
+
+def test_cloud_model_indexes():
+    """Test the precomputed cheapest / strongest model indexes"""
+    router = make_router()
+    
+    assert router._cheapest_under[("anthropic", CostTier.CHEAP)] == "claude-3-haiku-20240307"
+    assert ("anthropic", CostTier.FREE) not in router._cheapest_under
+    assert router._strongest_under[("openai", CostTier.PREMIUM)] == "gpt-4"
+    assert router._strongest_under[("openai", CostTier.STANDARD)] == "gpt-4o"
+    assert ("openai", CostTier.FREE) not in router._strongest_under
+    assert not any(provider == "ollama" for provider, _ in router._cheapest_under)
+
+
+@pytest.mark.asyncio
+async def test_selection_is_frozen_and_to_dict_cached():
+    """Test that selections are immutable and serialize once"""
+    import dataclasses
+    
+    router = make_cloud_router()
+    selection = await router.select_model("Привет", policy=RoutingPolicy(prefer_local=False))
+    
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        selection.model = "other"
+    assert not hasattr(selection, "__dict__")
+    
+    first = selection.to_dict()
+    first["model"] = "changed"
+    assert selection.to_dict()["model"] == "gpt-4o"
+    assert selection.to_dict()["policy_applied"]["prefer_local"] is False
+
+
+@pytest.mark.asyncio
+async def test_preferred_model_short_circuits_scoring(monkeypatch):
+    """Test that an allowed preferred model is used without provider/model scoring"""
+    router = make_router({
+        "ollama": {"enabled": True},
+        "openai": {"enabled": True, "default_model": "gpt-4o"},
+    })
+    router._initialized = True
+    router.intelligent_router._servers = {
+        "gpu": {"is_available": True, "url": "http://gpu:11434", "models": ["llama3.1:70b"], "response_time_ms": 10},
+    }
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("scoring must be skipped")
+    
+    monkeypatch.setattr(router, "_select_provider_by_policy", fail)
+    
+    local = await router.select_model("Напиши парсер", preferred_model="llama3.1:70b")
+    assert (local.provider, local.model, local.server_url) == ("ollama", "llama3.1:70b", "http://gpu:11434")
+    assert local.tier == "powerful"
+    
+    cloud = await router.select_model("Напиши парсер", preferred_model="openai:gpt-4-turbo")
+    assert (cloud.provider, cloud.model, cloud.cost_tier) == ("openai", "gpt-4-turbo", CostTier.PREMIUM)
+    
+    # Политика запрещает облако - обычный выбор
+    with pytest.raises(AssertionError):
+        await router.select_model(
+            "Напиши парсер", preferred_model="openai:gpt-4", policy=RoutingPolicy.privacy_first()
+        )
+
+
+def test_complexity_analysis_cached_by_full_task(monkeypatch):
+    """Test that complexity results are memoized per full task text and task type"""
+    router = make_router()
+    calls = []
+    analyze = router.complexity_service.analyze
+    monkeypatch.setattr(
+        router.complexity_service, "analyze",
+        lambda task, **kwargs: calls.append((task, kwargs)) or analyze(task, **kwargs)
+    )
+    prefix = "x" * 100
+    
+    first = router._analyze_complexity(prefix + " привет", "chat")
+    assert router._analyze_complexity(prefix + " привет", "chat") is first
+    router._analyze_complexity(prefix + " напиши компилятор", "chat")
+    router._analyze_complexity(prefix + " привет", "code")
+    
+    assert len(calls) == 3
+    assert all(kwargs["use_cache"] is False for _, kwargs in calls)
+
+
+def test_provider_config_extracted_once():
+    """Test the flattened provider config lookups"""
+    router = make_router({"openai": {"enabled": True, "base_url": "https://api.example", "default_model": None}})
+    
+    assert router._provider_cfg("openai")["enabled"] is True
+    assert dict(router._provider_cfg("missing")) == {}
+    assert router._provider_urls == {"openai": "https://api.example"}
+    assert router._provider_default_model == {"openai": ""}
+    assert dict(UnifiedModelRouter({})._provider_cfg("ollama")) == {}
+
+
+@pytest.mark.asyncio
+async def test_selection_cost_from_model_table():
+    """Test that the selected model's cost comes from the flat model table"""
+    router = make_cloud_router()
+    assert router._model_costs[("openai", "gpt-4o-mini")] == CostTier.CHEAP
+    
+    cheap = await router.select_model("Привет", policy=RoutingPolicy(prefer_local=False, prefer_cheap=True))
+    assert (cheap.model, cheap.cost_tier) == ("gpt-4o-mini", CostTier.CHEAP)
+    
+    # Модель вне карты стоимости - стоимость провайдера
+    router._provider_default_model["openai"] = "gpt-unknown"
+    other = await router.select_model("Как дела?", policy=RoutingPolicy(prefer_local=False))
+    assert (other.model, other.cost_tier) == ("gpt-unknown", CostTier.STANDARD)
+
+
+@pytest.mark.asyncio
+async def test_explicit_complexity_skips_analysis(monkeypatch):
+    """Test that a given complexity is used as is, without analysis"""
+    router = make_cloud_router()
+    router._provider_urls["openai"] = "https://api.example"
+    monkeypatch.setattr(router, "_analyze_complexity", lambda *a: pytest.fail("analysis must be skipped"))
+    
+    selection = await router.select_model("Привет", complexity="extreme", policy=RoutingPolicy(prefer_local=False))
+    
+    assert selection.complexity_level == "extreme"
+    assert selection.recommended_max_tokens == 6000
+    assert selection.server_url == "https://api.example"
+
+
+@pytest.mark.asyncio
+async def test_initialize_probes_cloud_and_orders_fallback(monkeypatch):
+    """Test concurrent cloud probes at startup and health-aware cloud fallback"""
+    import httpx
+    from unittest.mock import AsyncMock
+    
+    router = make_router({
+        "ollama": {"enabled": True},
+        "openai": {"enabled": True, "base_url": "https://openai.example"},
+        "anthropic": {"enabled": True, "base_url": "https://anthropic.example"},
+    })
+    monkeypatch.setattr(router.intelligent_router, "discover_servers", AsyncMock())
+    
+    def handler(request):
+        if request.url.host == "openai.example":
+            raise httpx.ConnectError("down", request=request)
+        return httpx.Response(404)
+    
+    probe = router._probe_cloud
+    mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(router, "_probe_cloud", lambda name, client: probe(name, mock_client))
+    
+    await router.initialize()
+    await mock_client.aclose()
+    
+    assert router._is_provider_healthy("openai") is False
+    assert router._is_provider_healthy("anthropic") is True
+    assert router._is_provider_healthy("ollama") is None
+    assert router._get_fallback_cloud_provider(RoutingPolicy())[0] == "anthropic"
+
+
+@pytest.mark.asyncio
+async def test_fallbacks_cached_until_invalidated(monkeypatch):
+    """Test fallback list caching per (model, provider, task, complexity, policy)"""
+    router = make_router({"ollama": {"enabled": True}, "openai": {"enabled": True, "default_model": "gpt-4o"}})
+    calls = []
+    
+    def ranked(task_type):
+        calls.append(task_type)
+        return [{"model": "a"}, {"model": "b"}, {"model": "c"}]
+    
+    monkeypatch.setattr(router.intelligent_router, "get_all_models_ranked", ranked)
+    policy = RoutingPolicy()
+    
+    first = await router._find_fallbacks_with_policy("a", "ollama", "code", "simple", policy)
+    first.append("mutated")
+    second = await router._find_fallbacks_with_policy("a", "ollama", "code", "simple", policy)
+    
+    assert second == ["ollama:b", "ollama:c", "openai:gpt-4o"]
+    assert len(calls) == 1
+    
+    router.invalidate_fallbacks()
+    await router._find_fallbacks_with_policy("a", "ollama", "code", "simple", policy)
+    assert len(calls) == 2
+
+
+def test_route_cloud_returns_full_route():
+    """Test that the cloud route carries model, server and size in one call"""
+    router = make_cloud_router()
+    model, scores, url, server, size = router._route_cloud(
+        "openai", RoutingPolicy(prefer_local=False), "general", "medium"
+    )
+    assert model == router._select_cloud_model("openai", RoutingPolicy(prefer_local=False), "general", "medium")[0]
+    assert server == "openai"
+    assert url == router._provider_base_url("openai")
+    assert size == 100.0
+    assert scores["total"] > 0
+
+
+@pytest.mark.asyncio
+async def test_selection_log_uses_lazy_args():
+    """Test that the selection log line is formatted from positional args"""
+    from loguru import logger as loguru_logger
+    
+    router = make_cloud_router()
+    messages = []
+    sink_id = loguru_logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        selection = await router.select_model(
+            "Напиши функцию", policy=RoutingPolicy(prefer_local=False), complexity="medium"
+        )
+    finally:
+        loguru_logger.remove(sink_id)
+    
+    line = next(m for m in messages if "UnifiedModelRouter: selected" in m)
+    assert f"selected {selection.model} @ openai" in line
+    assert f"score: {selection.total_score:.2f}" in line
+
+
+@pytest.mark.asyncio
+async def test_concurrent_initialize_discovers_once(monkeypatch):
+    """Test that concurrent first callers share a single discovery pass"""
+    import asyncio
+    
+    router = make_router()
+    calls = []
+    
+    async def discover_servers():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+    
+    monkeypatch.setattr(router.intelligent_router, "discover_servers", discover_servers)
+    await asyncio.gather(*(router.initialize() for _ in range(5)))
+    
+    assert len(calls) == 1
+    assert router._initialized
+
+
+def test_get_unified_router_singleton(monkeypatch):
+    """Test that the singleton is built once and requires config on first use"""
+    from backend.core import unified_model_router as module
+    
+    monkeypatch.setattr(module, "_unified_router", None)
+    with pytest.raises(ValueError):
+        module.get_unified_router()
+    
+    router = module.get_unified_router({"llm": {"providers": {}}})
+    assert module.get_unified_router() is router
+
+
+@pytest.mark.asyncio
+async def test_discover_models_dedupes_in_server_order(monkeypatch):
+    """Test that duplicate models are dropped while keeping server order"""
+    router = make_router()
+    
+    async def discover_servers():
+        pass
+    
+    monkeypatch.setattr(router.intelligent_router, "discover_servers", discover_servers)
+    router.intelligent_router._servers = {
+        "a": {"is_available": True, "models": ["qwen:7b", "llama3:8b"]},
+        "b": {"is_available": False, "models": ["mistral:7b"]},
+        "c": {"is_available": True, "models": ["llama3:8b", "phi3:mini", "qwen:7b"]},
+    }
+    
+    assert await router.discover_models() == ["qwen:7b", "llama3:8b", "phi3:mini"]
+
+
+def test_cost_frontier_caps_default_model():
+    """Test that a default model above the policy cap is replaced by the best model within it"""
+    router = make_router({"openai": {"enabled": True, "default_model": "gpt-4"}})
+    
+    assert router._cost_frontier["openai"] == [
+        (CostTier.CHEAP, "gpt-4o-mini"),
+        (CostTier.STANDARD, "gpt-4o"),
+        (CostTier.PREMIUM, "gpt-4"),
+    ]
+    policy = RoutingPolicy(max_cost_tier=CostTier.STANDARD, prefer_quality=False)
+    assert router._select_cloud_model("openai", policy, "chat", "simple")[0] == "gpt-4o"
+    assert router._select_cloud_model("openai", RoutingPolicy(), "chat", "simple")[0] == "gpt-4"
+
+
+@pytest.mark.parametrize("task_type, complexity, expected", [
+    ("code", "complex", (0.1, 3000)),
+    ("creative", "extreme", (0.8, 6000)),
+    ("chat", "trivial", (0.7, 500)),
+    ("unknown", "medium", (0.7, 2000)),
+])
+def test_optimal_params_table(task_type, complexity, expected):
+    """Test the precomputed (temperature, max_tokens) table and its fallback"""
+    router = make_router()
+    
+    temperature, max_tokens = router._get_optimal_params(task_type, complexity)
+    assert temperature == pytest.approx(expected[0])
+    assert max_tokens == expected[1]